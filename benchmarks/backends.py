@@ -0,0 +1,99 @@
+"""
+Benchmark of the pyhf backends.
+
+Runs the maximum likelihood fit and a limit calculation of the example
+analyses in test/ with all installed pyhf backends, and compares their run
+time. For jax, the time of the JIT warm-up is shown separately.
+
+Run from the top-level directory of the repository with
+
+    python -m benchmarks.backends [--limit-method brent]
+"""
+
+import argparse
+import importlib.util
+import time
+
+import pyhf
+
+from common.misc.backend import BACKENDS, Backend
+from common.misc.helpers import get_analysis_workspace
+
+# modules required by each backend
+BACKEND_MODULES = {"numpy": "numpy", "pytorch": "torch", "jax": "jax"}
+
+
+def measure(analysis: str, backend: Backend, limit_method: str) -> tuple:
+    """
+    Returns warm-up, fit and limit setting time in seconds,
+    and the limit results. Fit and limit setting time and the limit results
+    are None if the fit failed, as limit setting is skipped then.
+    """
+    ws = get_analysis_workspace(analysis, {"mass": "1300"}, None)
+    ws.backend = backend
+    model, data = ws.model, ws._data
+    with backend.session():
+        start = time.perf_counter()
+        backend.warm_up(model, data)
+        warm_up_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        ws.fit_results()
+    except (pyhf.exceptions.FailedMinimization, ValueError):
+        # the pytorch backend raises a ValueError for invalid parameters
+        return warm_up_time, None, None, None
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    limit_results = ws.limit_results(limit_method, n_workers=1)
+    return (
+        warm_up_time,
+        fit_time,
+        time.perf_counter() - start,
+        limit_results,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--limit-method",
+        default="brent",
+        help="Limit setting method to measure (default: brent).",
+    )
+    args = parser.parse_args()
+
+    backends = []
+    for name in BACKENDS:
+        if importlib.util.find_spec(BACKEND_MODULES[name]) is None:
+            print(f"Skipping {name}, it is not installed.")
+            continue
+        backends.append(Backend(name, jit_warmup=name == "jax"))
+
+    print(
+        f"{'analysis':<10} {'backend':>8} {'warm-up [s]':>12} "
+        f"{'fit [s]':>8} {'limit [s]':>10} {'obs. limit':>11} "
+        f"{'exp. limit':>11}"
+    )
+    for analysis in ["analysis1", "analysis2"]:
+        for backend in backends:
+            warm_up_time, fit_time, limit_time, limit_results = measure(
+                analysis, backend, args.limit_method
+            )
+            if fit_time is None:
+                print(
+                    f"{analysis:<10} {backend.name:>8} {warm_up_time:>12.2f} "
+                    f"{'failed':>8}"
+                )
+                continue
+            print(
+                f"{analysis:<10} {backend.name:>8} {warm_up_time:>12.2f} "
+                f"{fit_time:>8.2f} {limit_time:>10.1f} "
+                f"{limit_results.observed_limit:>11.4f} "
+                f"{limit_results.expected_limit[2]:>11.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
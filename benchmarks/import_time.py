@@ -0,0 +1,109 @@
+"""
+Benchmark of the import time of combine.py.
+
+Measures the import time of combine.py with python -X importtime, lists the
+modules taking the longest to import, and measures the run time of
+combine.py --help, which only needs the command-line argument parsing.
+The results can be written to a JSON file, to track them over time.
+
+Run from the top-level directory of the repository with
+
+    python -m benchmarks.import_time [--repeat 5] [--top 10] [--output FILE]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """
+    Import a module in a new interpreter with python -X importtime.
+
+    Returns dictionary with self and cumulative import time in microseconds
+    of all imported modules, with the module name as key.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    # lines look like: import time:  self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        if not self_time.strip().isdigit():
+            continue  # header line
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def help_time() -> float:
+    """
+    Returns run time of combine.py --help in seconds.
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "combine.py", "--help"],
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of measurements, the fastest one is used (default: 5).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of slowest modules to list (default: 10).",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="JSON file to write the results to (default: None, no file).",
+    )
+    args = parser.parse_args()
+
+    measurements = [import_times("combine") for _ in range(args.repeat)]
+    times = min(measurements, key=lambda times: times["combine"][1])
+    total = times["combine"][1] / 1e6
+    help_seconds = min(help_time() for _ in range(args.repeat))
+
+    print(f"import combine: {total:.3f} s ({len(times)} modules)")
+    print(f"combine.py --help: {help_seconds:.3f} s")
+    print(f"\n{'module':<50} {'self [ms]':>10} {'cumulative [ms]':>16}")
+    slowest = sorted(times.items(), key=lambda item: -item[1][0])[: args.top]
+    for name, (self_time, cumulative) in slowest:
+        print(f"{name:<50} {self_time / 1e3:>10.1f} {cumulative / 1e3:>16.1f}")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "import_combine_s": total,
+                    "help_s": help_seconds,
+                    "n_modules": len(times),
+                    "slowest_modules_ms": {
+                        name: self_time / 1e3 for name, (self_time, _) in slowest
+                    },
+                },
+                f,
+                indent=4,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark of reading workspace input files.
+
+Scales up the example workspaces in test/ by replicating their channels,
+writes them uncompressed and compressed, and compares parse time and peak
+memory of all available JSON parsers for each format.
+
+Run from the top-level directory of the repository with
+
+    python -m benchmarks.json_parsing [--scale 1000] [--repeat 3]
+"""
+
+import argparse
+import copy
+import gzip
+import json
+import lzma
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+import common.misc.inputs
+
+
+def scaled_spec(spec: dict, scale: int) -> dict:
+    """
+    Replicate all channels and observations of a workspace specification.
+
+    Arguments:
+        spec (dict): workspace specification
+        scale (int): number of copies of each channel
+
+    Returns scaled-up workspace specification.
+    """
+    scaled = copy.deepcopy(spec)
+    scaled["channels"] = [
+        dict(copy.deepcopy(channel), name=f"{channel['name']}_{i}")
+        for i in range(scale)
+        for channel in spec["channels"]
+    ]
+    scaled["observations"] = [
+        dict(observation, name=f"{observation['name']}_{i}")
+        for i in range(scale)
+        for observation in spec["observations"]
+    ]
+    return scaled
+
+
+def write_inputs(spec: dict, folder: pathlib.Path) -> list[pathlib.Path]:
+    """
+    Write workspace specification uncompressed and in all
+    compressed formats available.
+    """
+    content = json.dumps(spec).encode()
+    writers = {".json": open, ".json.gz": gzip.open, ".json.xz": lzma.open}
+    try:
+        import zstandard
+
+        writers[".json.zst"] = zstandard.open
+    except ImportError:
+        pass
+
+    paths = []
+    for suffix, opener in writers.items():
+        path = folder / f"workspace{suffix}"
+        with opener(path, "wb") as f:
+            f.write(content)
+        paths.append(path)
+    return paths
+
+
+def measure(path: pathlib.Path, parser: str, repeat: int) -> tuple:
+    """
+    Returns minimum parse time in seconds and peak memory in MB.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        common.misc.inputs.load_json(path, parser=parser)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    common.misc.inputs.load_json(path, parser=parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1024**2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=1000,
+        help="Number of copies of each channel (default: 1000).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of repetitions for timing (default: 3).",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'input':<27} {'size [MB]':>10} {'parser':>8} "
+        f"{'time [s]':>9} {'peak [MB]':>10}"
+    )
+    for input_file in sorted(pathlib.Path("test").glob("analysis*.json")):
+        spec = scaled_spec(common.misc.inputs.load_json(input_file), args.scale)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for path in write_inputs(spec, pathlib.Path(tmp_dir)):
+                size = path.stat().st_size / 1024**2
+                for json_parser in common.misc.inputs.PARSERS:
+                    parse_time, peak = measure(path, json_parser, args.repeat)
+                    label = path.name.replace("workspace", input_file.stem)
+                    print(
+                        f"{label:<27} {size:>10.2f} {json_parser:>8} "
+                        f"{parse_time:>9.3f} {peak:>10.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of the limit setting methods.
+
+Runs all limit setting methods available in WorkspaceBase.limit_results
+for the example analyses in test/ and compares their run time and the
+resulting observed and expected limits.
+
+Run from the top-level directory of the repository with
+
+    python -m benchmarks.limit_methods [--workers 1] [--backend numpy]
+"""
+
+import argparse
+import time
+
+import pyhf
+
+from common.misc.backend import BACKENDS, Backend
+from common.misc.helpers import get_analysis_workspace
+
+METHODS = ["default", "bisect", "ksection", "asimov", "brent"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes for hypotests (default: 1).",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="numpy",
+        help="pyhf backend for fits and hypotests (default: numpy).",
+    )
+    args = parser.parse_args()
+
+    workspaces = {
+        analysis: get_analysis_workspace(analysis, {"mass": "1300"}, None)
+        for analysis in ["analysis1", "analysis2"]
+    }
+    for ws in workspaces.values():
+        ws.backend = Backend(args.backend)
+    # the fits are not included in the measurement, as their results are
+    # reused from the fit stage
+    for analysis, ws in list(workspaces.items()):
+        try:
+            ws.fit_results()
+        except pyhf.exceptions.FailedMinimization:
+            print(f"Skipping {analysis}, the fit to data failed.")
+            del workspaces[analysis]
+
+    results = {}
+    for method in METHODS:
+        for analysis, ws in workspaces.items():
+            start = time.perf_counter()
+            limit_results = ws.limit_results(method, n_workers=args.workers)
+            results[analysis, method] = (
+                time.perf_counter() - start,
+                limit_results,
+            )
+
+    print(
+        f"{'analysis':<10} {'method':>9} {'time [s]':>9} {'obs.':>7} "
+        f"{'-2σ':>7} {'-1σ':>7} {'exp.':>7} {'+1σ':>7} {'+2σ':>7}"
+    )
+    for analysis in workspaces:
+        for method in METHODS:
+            run_time, limit_results = results[analysis, method]
+            limits = " ".join(
+                f"{limit:>7.4f}" for limit in limit_results.expected_limit
+            )
+            print(
+                f"{analysis:<10} {method:>9} {run_time:>9.1f} "
+                f"{limit_results.observed_limit:>7.4f} {limits}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Benchmark suite running synthetic workspaces through all steps of a
+combination.
+
+Generates synthetic workspaces with benchmarks.synthetic, and times
+reading them, _modify_workspace, building the CombinedWorkspace and its
+model, the fit, each limit setting method and the ranking. The timings,
+the counters of common.misc.instrumentation and the size of the model are
+written to a JSON file. With --compare, the timings are compared to such a
+file from a previous run, and the benchmark fails if any step got slower
+than the given tolerance, so scaling regressions are found early.
+
+Run from the top-level directory of the repository with
+
+    python -m benchmarks.suite [--analyses 2] [--channels 3] [--bins 5]
+        [--samples 4] [--modifiers 10] [--limit-methods brent,asimov]
+        [--ranking-mode hybrid] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+
+import pyhf
+
+import common.misc.inputs
+import common.misc.instrumentation
+from benchmarks.synthetic import (
+    SyntheticAnalysis,
+    SyntheticCombination,
+    write_synthetic_analyses,
+)
+from common.workspaces import CombinedWorkspace, Workspace
+
+# increase whenever the steps or the output format change
+SUITE_VERSION = 1
+
+LIMIT_METHODS = ["default", "bisect", "ksection", "asimov", "brent"]
+
+
+class Timer:
+    """
+    Collects the run time of named steps.
+    """
+
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+
+    def __call__(self, name: str, function, *args, **kwargs):
+        """
+        Run function, adding its run time to the step name.
+        Returns result of function.
+        """
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+
+def run_suite(args, work_dir: str) -> dict:
+    """
+    Run all steps for synthetic workspaces written to work_dir.
+
+    Returns dictionary with settings, timings, counters and model size.
+    """
+    sizes = {
+        "n_channels": args.channels,
+        "n_bins": args.bins,
+        "n_samples": args.samples,
+        "n_modifiers": args.modifiers,
+    }
+    filenames = write_synthetic_analyses(
+        work_dir, args.analyses, seed=args.seed, **sizes
+    )
+    analysis_names = [f"synthetic{i}" for i in range(args.analyses)]
+    combination = SyntheticCombination(
+        "synthetic",
+        analysis_names=analysis_names,
+        n_modifiers=args.modifiers,
+    )
+
+    timer = Timer()
+    common.misc.instrumentation.enable()
+    workspaces = []
+    for analysis_name, filename in zip(analysis_names, filenames):
+        analysis = SyntheticAnalysis(analysis_name, {"filename": filename})
+        spec = timer("load", common.misc.inputs.load_json, filename)
+        workspace = timer(
+            "load", lambda: Workspace(analysis_name, pyhf.Workspace(spec))
+        )
+        workspaces.append(
+            timer(
+                "modify_workspace",
+                analysis._modify_workspace,
+                workspace,
+                combination,
+            )
+        )
+    combined_ws = timer("combine", CombinedWorkspace, "Combined", workspaces)
+    model = timer("build_model", lambda: combined_ws.model)
+
+    failed = []
+    try:
+        timer("fit", combined_ws.fit_results)
+    except pyhf.exceptions.FailedMinimization:
+        print("Fit failed, skipping limits and ranking.")
+        failed.append("fit")
+    if not failed:
+        for method in args.limit_methods.split(","):
+            try:
+                timer(
+                    f"limit_{method}",
+                    combined_ws.limit_results,
+                    method,
+                    n_workers=args.workers,
+                )
+            except RuntimeError as e:
+                print(f"Limit setting with method {method} failed: {e}")
+                failed.append(f"limit_{method}")
+        try:
+            timer(
+                f"ranking_{args.ranking_mode}",
+                combined_ws.ranking_results,
+                args.ranking_mode,
+                n_workers=args.workers,
+                n_refit=args.ranking_refits,
+            )
+        except (RuntimeError, pyhf.exceptions.FailedMinimization) as e:
+            print(f"Ranking with mode {args.ranking_mode} failed: {e}")
+            failed.append(f"ranking_{args.ranking_mode}")
+    common.misc.instrumentation.disable()
+
+    return {
+        "version": SUITE_VERSION,
+        "settings": {"n_analyses": args.analyses, "seed": args.seed, **sizes},
+        "environment": {
+            "python": platform.python_version(),
+            "pyhf": pyhf.__version__,
+            "machine": platform.machine(),
+        },
+        "model": {
+            "n_parameters": model.config.npars,
+            "n_bins": model.config.nmaindata,
+        },
+        "timings": timer.timings,
+        "counters": common.misc.instrumentation.counters(),
+        "failed": failed,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, tolerance: float, min_slowdown: float
+) -> list[str]:
+    """
+    Print timings of results and of a baseline side by side.
+
+    Returns list of steps which are slower than tolerance times the
+    baseline timing, and at least min_slowdown seconds slower than it,
+    so that the noise of steps taking only milliseconds is ignored.
+    """
+    if results["settings"] != baseline["settings"]:
+        print(
+            "Warning: the baseline was run with different settings "
+            f"{baseline['settings']}."
+        )
+    print(
+        f"\n{'step':<30} {'baseline [s]':>12} {'current [s]':>12} "
+        f"{'ratio':>7}"
+    )
+    regressions = []
+    for name, current in results["timings"].items():
+        previous = baseline["timings"].get(name)
+        if previous is None:
+            print(f"{name:<30} {'-':>12} {current:>12.3f}")
+            continue
+        ratio = current / previous if previous > 0 else float("inf")
+        flag = ""
+        if ratio > tolerance and current - previous >= min_slowdown:
+            regressions.append(name)
+            flag = " slower"
+        print(
+            f"{name:<30} {previous:>12.3f} {current:>12.3f} "
+            f"{ratio:>7.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--analyses",
+        type=int,
+        default=2,
+        help="Number of synthetic analyses (default: 2).",
+    )
+    parser.add_argument(
+        "--channels",
+        type=int,
+        default=3,
+        help="Number of channels per analysis (default: 3).",
+    )
+    parser.add_argument(
+        "--bins",
+        type=int,
+        default=5,
+        help="Number of bins per channel (default: 5).",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=4,
+        help="Number of background samples per channel (default: 4).",
+    )
+    parser.add_argument(
+        "--modifiers",
+        type=int,
+        default=10,
+        help="Number of systematic modifiers per sample (default: 10).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the workspace generator (default: 0).",
+    )
+    parser.add_argument(
+        "--limit-methods",
+        default=",".join(LIMIT_METHODS),
+        help="Comma-separated list of limit setting methods to measure \
+                (default: all methods).",
+    )
+    parser.add_argument(
+        "--ranking-mode",
+        choices=["approx", "full", "hybrid"],
+        default="hybrid",
+        help="Ranking mode to measure (default: hybrid).",
+    )
+    parser.add_argument(
+        "--ranking-refits",
+        type=int,
+        default=20,
+        help="Number of refitted parameters in the hybrid ranking \
+                (default: 20).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes for hypotests and ranking fits \
+                (default: 1).",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="JSON file to write the results to (default: None, no file).",
+    )
+    parser.add_argument(
+        "--compare",
+        default=None,
+        help="JSON file with results of a previous run to compare to \
+                (default: None, no comparison).",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="Maximum ratio of current to previous run time of each step \
+                before it is reported as regression with --compare \
+                (default: 1.5).",
+    )
+    parser.add_argument(
+        "--min-slowdown",
+        type=float,
+        default=0.01,
+        help="Minimum increase of the run time of a step in seconds \
+                before it is reported as regression with --compare \
+                (default: 0.01).",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_suite(args, work_dir)
+    print(
+        f"Model with {results['model']['n_parameters']} parameters "
+        f"and {results['model']['n_bins']} bins.\n"
+    )
+    print(f"{'step':<30} {'time [s]':>10}")
+    for name, timing in results["timings"].items():
+        print(f"{name:<30} {timing:>10.3f}")
+    for name, value in results["counters"].items():
+        print(f"{name:<30} {value:>10}")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(
+            results, baseline, args.tolerance, args.min_slowdown
+        )
+        if regressions:
+            print(f"Steps slower than the baseline: {regressions}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
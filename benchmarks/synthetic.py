@@ -0,0 +1,220 @@
+"""
+Generator of synthetic pyhf workspaces for benchmarks.
+
+Workspaces have a tunable number of channels, bins, background samples
+and systematic modifiers, and come with analysis and combination
+configuration classes, so they can be run through the same steps as the
+workspaces of real analyses.
+"""
+
+import dataclasses
+import json
+import pathlib
+
+import numpy as np
+
+from common.analysisbase import AnalysisBase
+from common.combinationbase import CombinationBase
+
+POI_NAME = "mu"
+SIGNAL_NAME = "signal"
+
+
+def synthetic_spec(
+    n_channels: int = 3,
+    n_bins: int = 5,
+    n_samples: int = 4,
+    n_modifiers: int = 10,
+    seed: int = 0,
+) -> dict:
+    """
+    Generate a workspace specification.
+
+    Every channel contains a signal sample scaled by the POI 'mu' and
+    n_samples background samples. Each background sample has statistical
+    uncertainties, a luminosity uncertainty and n_modifiers systematic
+    uncertainties 'syst0', 'syst1', ..., alternating between normsys and
+    histosys modifiers and shared between all samples and channels.
+    The first background sample is normalised by a free normfactor.
+    The observed data is the background plus signal expectation with
+    Poisson fluctuations.
+
+    Arguments:
+        n_channels (int): number of channels (default: 3)
+        n_bins (int): number of bins per channel (default: 5)
+        n_samples (int): number of background samples (default: 4)
+        n_modifiers (int):
+            number of systematic modifiers per background sample
+            (default: 10)
+        seed (int): seed of random number generator (default: 0)
+
+    Returns workspace specification as dict.
+    """
+    rng = np.random.default_rng(seed)
+    channels = []
+    observations = []
+    for i_channel in range(n_channels):
+        # the first channel is most sensitive to the signal
+        name = "SR" if i_channel == 0 else f"CR{i_channel}"
+        signal = rng.uniform(5.0, 20.0, n_bins) / (1 + 5 * i_channel)
+        samples = [
+            {
+                "name": SIGNAL_NAME,
+                "data": signal.tolist(),
+                "modifiers": [
+                    {"name": POI_NAME, "type": "normfactor", "data": None},
+                    {"name": "lumi", "type": "lumi", "data": None},
+                ],
+            }
+        ]
+        expected = signal.copy()
+        for i_sample in range(n_samples):
+            nominal = rng.uniform(20.0, 200.0, n_bins)
+            expected += nominal
+            modifiers = [
+                {"name": "lumi", "type": "lumi", "data": None},
+                {
+                    "name": f"staterror_{name}",
+                    "type": "staterror",
+                    "data": (nominal * rng.uniform(0.02, 0.1, n_bins)).tolist(),
+                },
+            ]
+            if i_sample == 0:
+                modifiers.append(
+                    {"name": "norm_bkg0", "type": "normfactor", "data": None}
+                )
+            for i_modifier in range(n_modifiers):
+                size = rng.uniform(0.01, 0.1)
+                if i_modifier % 2 == 0:
+                    modifiers.append(
+                        {
+                            "name": f"syst{i_modifier}",
+                            "type": "normsys",
+                            "data": {"hi": 1 + size, "lo": 1 - size},
+                        }
+                    )
+                    continue
+                shape = rng.uniform(0.5, 1.5, n_bins) * size
+                modifiers.append(
+                    {
+                        "name": f"syst{i_modifier}",
+                        "type": "histosys",
+                        "data": {
+                            "hi_data": (nominal * (1 + shape)).tolist(),
+                            "lo_data": (nominal * (1 - shape)).tolist(),
+                        },
+                    }
+                )
+            samples.append(
+                {
+                    "name": f"background{i_sample}",
+                    "data": nominal.tolist(),
+                    "modifiers": modifiers,
+                }
+            )
+        channels.append({"name": name, "samples": samples})
+        observations.append(
+            {"name": name, "data": rng.poisson(expected).astype(float).tolist()}
+        )
+
+    return {
+        "channels": channels,
+        "observations": observations,
+        "measurements": [
+            {
+                "name": "Search",
+                "config": {
+                    "poi": POI_NAME,
+                    "parameters": [
+                        {
+                            "name": "lumi",
+                            "auxdata": [1.0],
+                            "sigmas": [0.02],
+                            "bounds": [[0.9, 1.1]],
+                            "inits": [1.0],
+                        },
+                        {
+                            "name": POI_NAME,
+                            "bounds": [[0.0, 10.0]],
+                            "inits": [1.0],
+                        },
+                    ],
+                },
+            }
+        ],
+        "version": "1.0.0",
+    }
+
+
+def write_synthetic_analyses(
+    output_dir: str | pathlib.Path,
+    n_analyses: int = 2,
+    seed: int = 0,
+    **kwargs,
+) -> list[str]:
+    """
+    Generate workspaces with synthetic_spec and write them to JSON files
+    <output_dir>/synthetic<i>.json.
+
+    Arguments:
+        output_dir (str | pathlib.Path): directory to write files to
+        n_analyses (int): number of workspaces (default: 2)
+        seed (int):
+            seed of random number generator of the first workspace,
+            increased by one for each further workspace (default: 0)
+        **kwargs: further arguments of synthetic_spec
+
+    Returns list of file names.
+    """
+    filenames = []
+    for i_analysis in range(n_analyses):
+        filename = pathlib.Path(output_dir) / f"synthetic{i_analysis}.json"
+        with open(filename, "w") as f:
+            json.dump(synthetic_spec(seed=seed + i_analysis, **kwargs), f)
+        filenames.append(str(filename))
+    return filenames
+
+
+class SyntheticAnalysis(AnalysisBase):
+    """
+    Configuration of a synthetic analysis, reading the workspace from
+    the file given in parameters['filename'].
+    The modifier 'syst0' of the first background sample is pruned.
+    """
+
+    @property
+    def modifiers_to_prune(self) -> dict[str, list[str]]:
+        return {"background0": ["syst0"]}
+
+    def filename(self) -> str:
+        return self.parameters["filename"]
+
+    def signalname(self) -> str:
+        return SIGNAL_NAME
+
+
+@dataclasses.dataclass
+class SyntheticCombination(CombinationBase):
+    """
+    Combination of synthetic analyses, correlating the luminosity and
+    all systematic modifiers but the normfactors across analyses.
+    """
+
+    analysis_names: list[str] = dataclasses.field(default_factory=list)
+    n_modifiers: int = 10
+
+    @property
+    def measurement_parameters(self):
+        return {
+            "SigXsecOverSM": {"bounds": [[0, 10]], "inits": [1.0]},
+        }
+
+    @property
+    def correlated_NPs(self):
+        return {
+            f"syst{i_modifier}": {
+                analysis_name: f"syst{i_modifier}"
+                for analysis_name in self.analysis_names
+            }
+            for i_modifier in range(self.n_modifiers)
+        }
@@ -0,0 +1,69 @@
+"""
+Benchmark of warm-started hypotests in limit setting.
+
+Runs the 'bisect' limit setting for the example analyses in test/ with all
+fits starting from the default initial parameter values, and with fits
+warm-started from the best-fit parameters and from the fitted parameters of
+the closest POI value tested before. Compares the number of likelihood
+evaluations by the minimizer, the run time and the resulting limits.
+
+Run from the top-level directory of the repository with
+
+    python -m benchmarks.warm_start
+"""
+
+import time
+
+import pyhf
+
+from common.misc.helpers import get_analysis_workspace
+from common.misc.instrumentation import LogpdfCounter
+
+
+def measure(ws, warm_start: bool) -> tuple:
+    """
+    Returns number of likelihood evaluations, run time in seconds
+    and limit results.
+    """
+    start = time.perf_counter()
+    with LogpdfCounter(ws.model) as counter:
+        limit_results = ws.limit_results(
+            "bisect", n_workers=1, warm_start=warm_start
+        )
+    return counter.calls, time.perf_counter() - start, limit_results
+
+
+def main():
+    workspaces = {
+        analysis: get_analysis_workspace(analysis, {"mass": "1300"}, None)
+        for analysis in ["analysis1", "analysis2"]
+    }
+    # the fits are not included in the measurement, as their results are
+    # reused from the fit stage
+    for analysis, ws in list(workspaces.items()):
+        try:
+            ws.fit_results()
+        except pyhf.exceptions.FailedMinimization:
+            print(f"Skipping {analysis}, the fit to data failed.")
+            del workspaces[analysis]
+
+    print(
+        f"{'analysis':<10} {'warm start':>10} {'evaluations':>12} "
+        f"{'reduction':>10} {'time [s]':>9} {'obs. limit':>11} "
+        f"{'exp. limit':>11}"
+    )
+    for analysis, ws in workspaces.items():
+        cold_calls = None
+        for warm_start in [False, True]:
+            calls, run_time, limit_results = measure(ws, warm_start)
+            cold_calls = cold_calls or calls
+            print(
+                f"{analysis:<10} {str(warm_start):>10} {calls:>12} "
+                f"{1 - calls / cold_calls:>10.1%} {run_time:>9.1f} "
+                f"{limit_results.observed_limit:>11.4f} "
+                f"{limit_results.expected_limit[2]:>11.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,125 +1,645 @@
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import copy
+import multiprocessing
+import os
 import pathlib
 import sys
+from typing import TYPE_CHECKING
 
-from common.workspaces import CombinedWorkspace
-import common.misc.helpers
-import common.plotting
+import common.misc.backend
+import common.misc.cache
+import common.misc.instrumentation
+import common.misc.logger
 import common.misc.utils
 from common.misc.logger import logger
+from common.misc.scheduler import Scheduler, Stage
+from common.plotting.sink import PlotSink
 
+# pyhf, cabinetry and the workspaces are imported when they are needed,
+# so that e.g. --help does not have to wait for them
+if TYPE_CHECKING:
+    from common.workspaces import CombinedWorkspace, Workspace, WorkspaceBase
 
-def main():
-    """
-    Combine pyhf workspaces and run statistical evaluations.
+
+def get_output_folder(output_dir: str, parameters: dict) -> pathlib.Path:
     """
+    Create output directory based on given parameters.
 
-    args = common.misc.utils.parse_arguments()
-    parameters = common.misc.utils.parse_parameters(args.parameters)
+    Arguments:
+        output_dir (str): top-level directory to store output in
+        parameters (dict): parameters of the current parameter point
 
-    # create output directory based on given parameters
+    Returns path to output directory.
+    """
     parameter_string = "_".join(
         [k + v.replace(".", "p") for k, v in parameters.items()]
     )
-    output_folder = pathlib.Path(args.output_dir) / parameter_string
+    output_folder = pathlib.Path(output_dir) / parameter_string
     if not output_folder.exists():
         output_folder.mkdir(parents=True)
     elif not output_folder.is_dir():
         raise ValueError(
-            "Provided path {args.output_dir} is not a folder. \
+            f"Provided path {output_folder} is not a folder. \
                 Cannot create directory."
         )
+    return output_folder
 
-    # configure logger
+
+def configure_logger(
+    output_dir: str, combination_name: str | None, output_level: int
+) -> None:
+    """
+    Configure logger to print to stdout and to a log file in output_dir.
+    """
     file_handler = logger.FileHandler(
-        f"{args.output_dir}/{args.combination_name}_output.log"
+        f"{output_dir}/{combination_name}_output.log"
     )
     stream_handler = logger.StreamHandler(sys.stdout)
     formatter = logger.Formatter(
-        "%(asctime)s [%(levelname)4s]: %(message)s", "%H:%M:%S"
+        common.misc.logger.FORMAT, common.misc.logger.DATE_FORMAT
     )
     stream_handler.setFormatter(formatter)
     file_handler.setFormatter(formatter)
+    # force replaces the default handler the logging module installs
+    # when messages are logged before this function is called
     logger.basicConfig(
-        handlers=[file_handler, stream_handler], level=args.output_level
+        handlers=[file_handler, stream_handler], level=output_level, force=True
     )
 
-    # now we can finally do the actual combination
-    # start by obtaining the combination settings
-    # and the individual workspaces
-    combination = common.misc.helpers.get_combination(args.combination_name)
-    workspaces = [
-        common.misc.helpers.get_analysis_workspace(
-            analysis_name=analysis_name,
-            parameters=parameters,
-            combination=combination,
-        )
-        for analysis_name in args.analysis_names
-    ]
 
-    figure_folder = output_folder / "figures"
-    if not figure_folder.exists():
-        figure_folder.mkdir()
+def get_hypotest_cache(args) -> common.misc.cache.HypotestCache | None:
+    """
+    Returns on-disk cache for hypotest results in args.cache_dir,
+    None if caching is disabled.
+    """
+    if args.cache_dir is None:
+        return None
+    return common.misc.cache.HypotestCache(
+        args.cache_dir, max_size=args.cache_max_size
+    )
 
-    combined_ws = CombinedWorkspace(name="Combined", workspaces=workspaces)
-    common.plotting.modifier_grid(
-        model=combined_ws.model, figure_folder=figure_folder
+
+def fit_and_limit(
+    ws: WorkspaceBase,
+    args,
+    hypotest_cache: common.misc.cache.HypotestCache | None,
+    n_workers: int | None,
+) -> tuple:
+    """
+    Run fit and limit setting for a workspace, evaluating hypotests
+    in n_workers worker processes (None: number of CPUs).
+
+    Returns fit results and limit results.
+    """
+    fit_results = ws.fit_results()
+    limit_results = ws.limit_results(
+        args.limit_method,
+        n_workers=n_workers,
+        hypotest_cache=hypotest_cache,
     )
-    combined_fit_results = combined_ws.fit_results()
-    with open(output_folder / "fit_results.txt", "w") as f:
-        for label, bestfit, uncertainty in zip(
-            combined_fit_results.labels,
-            combined_fit_results.bestfit,
-            combined_fit_results.uncertainty,
-        ):
-            np = f"{label}: {bestfit} +/- {uncertainty}"
-            logger.debug(np)
-            f.write(f"{np}\n")
-
-    fit_results = [combined_fit_results]
-    if args.fit_comparisons:
-        for workspace in workspaces:
-            fit_results.append(workspace.fit_results())
+    return fit_results, limit_results
+
 
-    logger.debug("Creating pull plot.")
-    common.plotting.pull_plot(
-        fit_results=combined_fit_results, figure_folder=figure_folder
+def _init_comparison_worker(output_level: int) -> None:
+    logger.basicConfig(
+        level=output_level,
+        format=common.misc.logger.FORMAT,
+        datefmt=common.misc.logger.DATE_FORMAT,
     )
-    logger.debug("Creating correlation matrix.")
-    common.plotting.correlation_matrix(
-        fit_results=combined_fit_results,
-        figure_folder=figure_folder,
-        pruning_threshold=0.1,
+
+
+def _fit_and_limit_worker(
+    name: str,
+    spec: dict,
+    backend: common.misc.backend.Backend,
+    args,
+    n_workers: int,
+    recording_settings: dict | None,
+) -> tuple:
+    """
+    Run fit and limit setting for a workspace in a worker process.
+
+    Returns tuple of fit results, limit results and the numbers of hits and
+    misses of the hypotest cache of the worker process, and the spans and
+    counters recorded in the worker process.
+    """
+    import pyhf
+
+    from common.workspaces import Workspace
+
+    ws = Workspace(name=name, ws=pyhf.Workspace(spec, validate=False))
+    ws.backend = backend
+    hypotest_cache = get_hypotest_cache(args)
+    (fit_results, limit_results), records = (
+        common.misc.instrumentation.call_recorded(
+            recording_settings,
+            fit_and_limit,
+            ws,
+            args,
+            hypotest_cache,
+            n_workers,
+        )
+    )
+    if hypotest_cache is None:
+        return (fit_results, limit_results, 0, 0), records
+    hypotest_cache.close()
+    return (
+        fit_results,
+        limit_results,
+        hypotest_cache.hits,
+        hypotest_cache.misses,
+    ), records
+
+
+def run_comparisons(
+    args,
+    workspaces: list[Workspace],
+    backend: common.misc.backend.Backend,
+    hypotest_cache: common.misc.cache.HypotestCache | None,
+) -> list[tuple]:
+    """
+    Run fits and limit setting for the individual analyses,
+    in worker processes if args.jobs is larger than 1.
+    The hypotest workers (args.limit_workers, by default the number of
+    CPUs) are then split between the worker processes, so that together
+    they do not start more processes than the limits of the combined
+    workspace, which are evaluated at the same time.
+
+    Returns list of (fit results, limit results, hypotest cache hits,
+    hypotest cache misses) tuples, in the order of workspaces.
+    Cache hits and misses are only counted for worker processes.
+    """
+    if args.jobs <= 1:
+        return [
+            (*fit_and_limit(ws, args, hypotest_cache, args.limit_workers), 0, 0)
+            for ws in workspaces
+        ]
+    n_jobs = min(args.jobs, len(workspaces))
+    n_limit_workers = max(
+        1, (args.limit_workers or os.cpu_count() or 1) // n_jobs
     )
-    logger.debug("Creating normalisation factor plot.")
-    # this requires a patch for cabinetry to store the modifier type in the FitResults object
+    logger.info(
+        f"Running fits and limits of {len(workspaces)} analyses \
+            using {n_jobs} worker processes \
+            with {n_limit_workers} hypotest workers each."
+    )
+    # the stage runs in a thread of the pipeline, next to other stages,
+    # so the workers are started from a fresh interpreter instead of forking
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_comparison_worker,
+        initargs=(args.output_level,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _fit_and_limit_worker,
+                ws.name,
+                dict(ws.ws),
+                backend,
+                args,
+                n_limit_workers,
+                common.misc.instrumentation.settings(),
+            )
+            for ws in workspaces
+        ]
+        results = []
+        for future in futures:
+            result, records = future.result()
+            common.misc.instrumentation.merge(records)
+            results.append(result)
+        return results
+
+
+# stages only creating figures, skipped with --no-plots,
+# no other stage depends on them
+PLOT_STAGES = [
+    "modifier_grid",
+    "pulls",
+    "correlation_matrix",
+    "normfactors",
+    "limit_comparison",
+    # the ranking fits are only used for the ranking plot
+    "ranking",
+]
+
+
+def get_stages(
+    args,
+    combined_ws: CombinedWorkspace,
+    workspaces: list[Workspace],
+    output_folder: pathlib.Path,
+    hypotest_cache: common.misc.cache.HypotestCache | None,
+    plot_sink: PlotSink | None,
+) -> list[Stage]:
+    """
+    Stages of the evaluation of a combination.
+
+    Stages evaluating the likelihood in the current process share the
+    'pyhf' resource, as they change the global pyhf backend.
+    Figures are queued in the plot sink, and not created without sink.
+
+    Arguments:
+        args (argparse.Namespace): parsed command-line arguments
+        combined_ws (CombinedWorkspace): combined workspace
+        workspaces (list[Workspace]): workspaces of individual analyses
+        output_folder (pathlib.Path): directory to store output in
+        hypotest_cache (Optional[common.misc.cache.HypotestCache]):
+            on-disk cache for hypotest results
+        plot_sink (Optional[PlotSink]):
+            background process creating figures
+
+    Returns list of stages.
+    """
+    figure_folder = output_folder / "figures"
     model_names = [combined_ws.name]
     model_names.extend([analysis_name for analysis_name in args.analysis_names])
-    common.plotting.norm_factors(
-        fit_results=fit_results,
-        figure_folder=figure_folder,
-        model_names=model_names,
-    )
 
-    logger.debug("Evaluating exclusion limits.")
-    combined_limit_results = combined_ws.limit_results(args.limit_method)
-    limit_results = [combined_limit_results]
-    if args.fit_comparisons:
-        limit_results.extend(
-            [ws.limit_results(args.limit_method) for ws in workspaces]
+    def plot(name: str, **kwargs) -> None:
+        if plot_sink is None:
+            logger.debug(f"Skipping figure {name}.")
+            return
+        plot_sink.submit(name, figure_folder=figure_folder, **kwargs)
+
+    def write_fit_results(fit_results) -> None:
+        lines = [
+            f"{label}: {bestfit} +/- {uncertainty}"
+            for label, bestfit, uncertainty in zip(
+                fit_results.labels,
+                fit_results.bestfit,
+                fit_results.uncertainty,
+            )
+        ]
+        logger.debug("\n".join(lines))
+        with open(output_folder / "fit_results.txt", "w") as f:
+            f.write("".join(f"{line}\n" for line in lines))
+
+    def write_results(fit_results, limit_results, comparisons=()) -> None:
+        import common.misc.results
+
+        names = [combined_ws.name, *[ws.name for ws in workspaces]]
+        common.misc.results.write_results(
+            output_folder,
+            dict(zip(names, [fit_results, *[c[0] for c in comparisons]])),
+            dict(zip(names, [limit_results, *[c[1] for c in comparisons]])),
         )
-        common.plotting.limit_comparison(
-            limit_results=limit_results,
-            figure_folder=figure_folder,
+
+    def norm_factors(fit_results, comparisons=()) -> None:
+        # the modifier types are added to the fit results by WorkspaceBase
+        plot(
+            "norm_factors",
+            fit_results=[
+                fit_results,
+                *[comparison[0] for comparison in comparisons],
+            ],
             model_names=model_names,
         )
 
-    if args.ranking:
-        logger.debug("Creating ranking plot.")
-        common.plotting.ranking(
-            ranking_results=combined_ws.ranking_results(),
-            figure_folder=figure_folder,
+    def limit_comparison(limit_results, comparisons) -> None:
+        plot(
+            "limit_comparison",
+            limit_results=[
+                limit_results,
+                *[comparison[1] for comparison in comparisons],
+            ],
+            model_names=model_names,
+        )
+
+    def ranking(_) -> None:
+        plot(
+            "ranking",
+            ranking_results=combined_ws.ranking_results(
+                args.ranking_mode,
+                n_workers=args.ranking_workers,
+                n_refit=args.ranking_refits,
+            ),
+        )
+
+    # fits of individual analyses in worker processes
+    # do not use the pyhf backend of the current process
+    comparison_resources = ("pyhf",) if args.jobs <= 1 else ()
+    norm_factors_dependencies = ("fit",)
+    results_dependencies = ("fit", "limits")
+    if args.fit_comparisons:
+        norm_factors_dependencies = ("fit", "comparisons")
+        results_dependencies = ("fit", "limits", "comparisons")
+    return [
+        Stage(
+            "modifier_grid",
+            lambda: plot("modifier_grid", model=combined_ws.model),
+        ),
+        Stage("fit", combined_ws.fit_results, resources=("pyhf",)),
+        Stage("fit_results", write_fit_results, ("fit",)),
+        Stage(
+            "pulls",
+            lambda fit_results: plot("pull_plot", fit_results=fit_results),
+            ("fit",),
+        ),
+        Stage(
+            "correlation_matrix",
+            lambda fit_results: plot(
+                "correlation_matrix",
+                fit_results=fit_results,
+                pruning_threshold=0.1,
+            ),
+            ("fit",),
+        ),
+        Stage("normfactors", norm_factors, norm_factors_dependencies),
+        Stage(
+            "limits",
+            # the fit is needed for the warm start of the hypotests
+            lambda _: combined_ws.limit_results(
+                args.limit_method,
+                n_workers=args.limit_workers,
+                hypotest_cache=hypotest_cache,
+            ),
+            ("fit",),
+            ("pyhf",),
+        ),
+        Stage(
+            "comparisons",
+            lambda: run_comparisons(
+                args, workspaces, combined_ws.backend, hypotest_cache
+            ),
+            resources=comparison_resources,
+        ),
+        Stage(
+            "limit_comparison",
+            limit_comparison,
+            ("limits", "comparisons"),
+        ),
+        Stage("results", write_results, results_dependencies),
+        Stage("ranking", ranking, ("fit",), ("pyhf",)),
+    ]
+
+
+def get_requested_stages(args) -> list[str]:
+    """
+    Returns names of stages requested with --stages, or by default
+    all stages enabled by the command-line flags.
+    Stages only creating figures, including the ranking,
+    are left out with --no-plots.
+    """
+    if args.stages is not None:
+        stages = list(args.stages)
+    else:
+        stages = [
+            "modifier_grid",
+            "fit",
+            "fit_results",
+            "pulls",
+            "correlation_matrix",
+            "normfactors",
+            "limits",
+            "results",
+        ]
+        if args.fit_comparisons:
+            stages.append("limit_comparison")
+        if args.ranking:
+            stages.append("ranking")
+    if args.no_plots:
+        if "ranking" in stages:
+            logger.warning("Skipping the ranking, as figures are disabled.")
+        stages = [stage for stage in stages if stage not in PLOT_STAGES]
+    return stages
+
+
+def run_combination(args, parameters: dict, combination):
+    """
+    Combine pyhf workspaces and run statistical evaluations
+    for a single set of parameters.
+
+    Arguments:
+        args (argparse.Namespace): parsed command-line arguments
+        parameters (dict): parameters of the current parameter point
+        combination (Optional[CombinationBase]):
+            instance of combination configuration class
+
+    Returns limit results of the combined workspace,
+    None if the limits were not requested.
+    """
+    from common.misc.helpers import get_analysis_workspaces
+    from common.workspaces import CombinedWorkspace
+
+    output_folder = get_output_folder(args.output_dir, parameters)
+    profile = args.profile or args.trace or args.profile_memory
+    if profile:
+        common.misc.instrumentation.enable(memory=args.profile_memory)
+
+    # obtain the individual workspaces
+    workspaces = get_analysis_workspaces(
+        analysis_names=args.analysis_names,
+        parameters=parameters,
+        combination=combination,
+        cache_dir=args.cache_dir,
+        n_jobs=args.jobs,
+    )
+
+    combined_ws = CombinedWorkspace(name="Combined", workspaces=workspaces)
+    backend = common.misc.backend.Backend(
+        args.backend, args.optimizer, args.precision, args.jit_warmup
+    )
+    for ws in [combined_ws, *workspaces]:
+        ws.backend = backend
+    # build the model before the stages using it run in parallel
+    combined_ws.model
+    hypotest_cache = get_hypotest_cache(args)
+
+    # the plot sink and the figure folder are only needed for figures
+    stages = get_requested_stages(args)
+    plot_sink = None
+    if any(stage in PLOT_STAGES for stage in stages):
+        (output_folder / "figures").mkdir(exist_ok=True)
+        plot_sink = PlotSink(args.output_level)
+    with plot_sink or contextlib.nullcontext():
+        scheduler = Scheduler(
+            get_stages(
+                args,
+                combined_ws,
+                workspaces,
+                output_folder,
+                hypotest_cache,
+                plot_sink,
+            )
+        )
+        results = scheduler.run(stages)
+        logger.debug("Waiting for figures.")
+
+    for ws in [combined_ws, *workspaces]:
+        logger.debug(f"Built {ws.model_builds} models for workspace {ws.name}.")
+    if hypotest_cache is not None:
+        for _, _, hits, misses in results.get("comparisons", []):
+            hypotest_cache.hits += hits
+            hypotest_cache.misses += misses
+        hypotest_cache.close()
+        logger.info(
+            f"Hypotest cache: {hypotest_cache.hits} hits, \
+                {hypotest_cache.misses} misses."
         )
 
+    if profile:
+        common.misc.instrumentation.disable()
+        if args.profile or args.trace:
+            logger.info(
+                "Profile of combination:\n"
+                + common.misc.instrumentation.summary()
+            )
+        if args.profile_memory:
+            memory_summary = common.misc.instrumentation.memory_summary()
+            logger.info(f"Memory usage of combination:\n{memory_summary}")
+            with open(output_folder / "memory.txt", "w") as f:
+                f.write(memory_summary + "\n")
+        if args.trace:
+            common.misc.instrumentation.write_trace(
+                output_folder / "trace.json"
+            )
+            logger.info(f"Written trace to {output_folder / 'trace.json'}.")
+
+    return results.get("limits")
+
+
+# combination configuration of a scan worker process,
+# loaded once per process by _init_scan_worker
+_scan_combination = None
+
+
+def _init_scan_worker(combination_name: str | None) -> None:
+    from common.misc.helpers import get_combination
+
+    global _scan_combination
+    _scan_combination = get_combination(combination_name)
+
+
+def _run_scan_point(args, parameters: dict):
+    return run_combination(args, parameters, _scan_combination)
+
+
+def run_scan(args, parameter_points: list[dict]) -> list[tuple]:
+    """
+    Run the combination for several parameter points in a pool
+    of worker processes, each loading the combination settings once.
+    Unless given explicitly, the CPUs are split between the scan workers
+    for their pools of hypotest and ranking workers.
+
+    Arguments:
+        args (argparse.Namespace): parsed command-line arguments
+        parameter_points (list[dict]): parameters of all points to run
+
+    Returns list of (parameters, limit results) tuples
+    for all successful parameter points, in the order of parameter_points.
+
+    Raises:
+        RuntimeError:
+            if the combination failed for any of the parameter points
+    """
+    n_scan_workers = min(
+        args.scan_workers or os.cpu_count() or 1, len(parameter_points)
+    )
+    n_nested_workers = max(1, (os.cpu_count() or 1) // n_scan_workers)
+    point_args = copy.copy(args)
+    if args.limit_workers is None:
+        point_args.limit_workers = n_nested_workers
+    if args.ranking_workers is None:
+        point_args.ranking_workers = n_nested_workers
+    logger.info(
+        f"Scanning {len(parameter_points)} parameter points \
+            using {n_scan_workers} worker processes \
+            with {point_args.limit_workers} hypotest workers \
+            and {point_args.ranking_workers} ranking workers each."
+    )
+    results = []
+    failed_points = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_scan_workers,
+        initializer=_init_scan_worker,
+        initargs=(args.combination_name,),
+    ) as executor:
+        futures = [
+            executor.submit(_run_scan_point, point_args, parameters)
+            for parameters in parameter_points
+        ]
+        for parameters, future in zip(parameter_points, futures):
+            try:
+                results.append((parameters, future.result()))
+            except Exception as e:
+                logger.error(f"Combination failed for {parameters}: {e}")
+                failed_points.append(parameters)
+
+    write_limit_table(args.output_dir, results)
+    if failed_points:
+        raise RuntimeError(
+            f"Combination failed for {len(failed_points)} \
+                parameter points: {failed_points}"
+        )
+    return results
+
+
+def write_limit_table(output_dir: str, results: list[tuple]) -> None:
+    """
+    Write observed and expected limits of all parameter points
+    into a whitespace-separated table in <output_dir>/limits.txt.
+
+    Arguments:
+        output_dir (str): top-level directory to store output in
+        results (list[tuple]): list of (parameters, limit results) tuples
+    """
+    # limits are not calculated if they were not requested with --stages
+    results = [
+        (parameters, limit_results)
+        for parameters, limit_results in results
+        if limit_results is not None
+    ]
+    if not results:
+        return
+    parameter_names = list(results[0][0].keys())
+    columns = parameter_names + [
+        "observed",
+        "expected_minus2sigma",
+        "expected_minus1sigma",
+        "expected",
+        "expected_plus1sigma",
+        "expected_plus2sigma",
+    ]
+    with open(pathlib.Path(output_dir) / "limits.txt", "w") as f:
+        f.write("# " + " ".join(columns) + "\n")
+        for parameters, limit_results in results:
+            row = [parameters[name] for name in parameter_names]
+            row.append(f"{limit_results.observed_limit:.6g}")
+            row.extend(f"{limit:.6g}" for limit in limit_results.expected_limit)
+            f.write(" ".join(row) + "\n")
+    logger.info(f"Written limits of {len(results)} parameter points.")
+
+
+def main():
+    """
+    Combine pyhf workspaces and run statistical evaluations
+    for one or several parameter points.
+    """
+
+    args = common.misc.utils.parse_arguments()
+    parameter_points = common.misc.utils.parse_parameter_scan(args.parameters)
+
+    output_dir = pathlib.Path(args.output_dir)
+    if not output_dir.exists():
+        output_dir.mkdir(parents=True)
+    configure_logger(args.output_dir, args.combination_name, args.output_level)
+
+    if len(parameter_points) > 1:
+        run_scan(args, parameter_points)
+        return
+
+    from common.misc.helpers import get_combination
+
+    # now we can finally do the actual combination
+    # start by obtaining the combination settings
+    combination = get_combination(args.combination_name)
+    parameters = parameter_points[0]
+    limit_results = run_combination(args, parameters, combination)
+    write_limit_table(args.output_dir, [(parameters, limit_results)])
+
 
 if __name__ == "__main__":
     main()
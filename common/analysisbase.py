@@ -4,8 +4,11 @@ import json
 
 import pyhf
 
-from common.workspaces import Workspace
+from common.workspaces import Workspace, TransformationPlan
 from common.combinationbase import CombinationBase
+import common.misc.cache
+import common.misc.inputs
+import common.misc.instrumentation
 
 from typing import Optional
 
@@ -117,31 +120,63 @@ class AnalysisBase(ABC):
         Do not override.
         """
         logger.info(f"Modify workspace for analysis {self.name}.")
-        workspace.rename_measurement()
-        workspace.rename_poi()
-        workspace.prune_modifiers(self.modifiers_to_prune)
+        # all modifications are collected first and then applied
+        # in a single pass over the workspace
+        plan = TransformationPlan()
+        plan.rename_measurement()
+        plan.rename_poi()
+        plan.prune_modifiers(self.modifiers_to_prune)
 
         if combination is not None:
             logger.info(f"Apply settings for combination {combination.name}.")
             if combination.channels is not None:
-                workspace.prune_regions(combination.channels[self.name].keys())
-            workspace.set_measurement_parameters(
-                combination.measurement_parameters
-            )
+                plan.prune_regions(combination.channels[self.name].keys())
+            plan.set_measurement_parameters(combination.measurement_parameters)
             # rename signal process to common name for combined workspaces
-            workspace.rename_samples(
-                {self.signalname(): combination.signalname}
-            )
+            plan.rename_samples({self.signalname(): combination.signalname})
 
-        workspace.mark_regions()
-        workspace.mark_modifiers()
+        plan.mark_regions(self.name)
+        plan.mark_modifiers(self.name)
         if combination is not None:
-            workspace.correlate_NPs(combination.correlated_NPs)
+            plan.correlate_NPs(combination.correlated_NPs, self.name)
 
+        workspace.apply(plan)
         return workspace
 
+    def _cache_key(self, combination: Optional[CombinationBase] = None) -> str:
+        """
+        Key of the cache entry for the modified workspace, obtained from
+        the hash of the input file and all settings in analysis
+        and combination configuration classes used in _modify_workspace.
+
+        Do not override.
+        """
+        analysis_settings = {
+            "name": self.name,
+            "signalname": self.signalname(),
+            "modifiers_to_prune": self.modifiers_to_prune,
+            "samples_to_rename": self.samples_to_rename,
+            "modifiers_to_rename": self.modifiers_to_rename,
+        }
+        combination_settings = None
+        if combination is not None:
+            combination_settings = {
+                "name": combination.name,
+                "signalname": combination.signalname,
+                "channels": combination.channels,
+                "measurement_parameters": combination.measurement_parameters,
+                "correlated_NPs": combination.correlated_NPs,
+            }
+        return common.misc.cache.settings_hash(
+            common.misc.cache.file_hash(self.filename()),
+            analysis_settings,
+            combination_settings,
+        )
+
     def workspace(
-        self, combination: Optional[CombinationBase] = None
+        self,
+        combination: Optional[CombinationBase] = None,
+        cache_dir: Optional[str] = None,
     ) -> Workspace:
         """
         Read pyhf.Workspace from input file and modify it according
@@ -151,6 +186,11 @@ class AnalysisBase(ABC):
             combination (Optional[CombinationBase]):
                 Instance of given combination configuration class
                 inheriting from CombinationBase (default: None)
+            cache_dir (Optional[str]):
+                Directory of on-disk cache for modified workspaces.
+                If given, the modified workspace is loaded from the cache
+                if available and stored in the cache otherwise
+                (default: None, no caching)
 
         Returns Workspace object after applying modifications
 
@@ -158,15 +198,38 @@ class AnalysisBase(ABC):
         """
         filename = self.filename()
 
-        with open(filename, "r") as f:
-            try:
-                spec = json.load(f)
-            except json.decoder.JSONDecodeError:
-                raise ValueError(
-                    f"Input file {filename} for analysis \
-                        {self.name} is not valid JSON."
+        cache_key = None
+        if cache_dir is not None:
+            cache_key = self._cache_key(combination)
+            with common.misc.instrumentation.span("load cached workspace"):
+                spec = common.misc.cache.load_workspace_spec(
+                    cache_dir, cache_key
+                )
+            if spec is not None:
+                logger.info(
+                    f"Loaded modified workspace for analysis {self.name} \
+                        from cache."
                 )
+                # cached specifications have been validated before storing
+                return Workspace(
+                    name=self.name, ws=pyhf.Workspace(spec, validate=False)
+                )
+
+        try:
+            with common.misc.instrumentation.span("parse JSON"):
+                spec = common.misc.inputs.load_json(filename)
+        except json.decoder.JSONDecodeError:
+            raise ValueError(
+                f"Input file {filename} for analysis \
+                    {self.name} is not valid JSON."
+            )
 
-        workspace = Workspace(name=self.name, ws=pyhf.Workspace(spec))
-        workspace = self._modify_workspace(workspace, combination)
+        with common.misc.instrumentation.span("validate workspace"):
+            workspace = Workspace(name=self.name, ws=pyhf.Workspace(spec))
+        with common.misc.instrumentation.span("modify workspace"):
+            workspace = self._modify_workspace(workspace, combination)
+        if cache_key is not None:
+            common.misc.cache.store_workspace_spec(
+                cache_dir, cache_key, dict(workspace.ws)
+            )
         return workspace
@@ -1,8 +1,12 @@
 import numpy as np
+import scipy.optimize
+import scipy.stats
 
 import cabinetry
 import pyhf
 
+import common.misc.cache
+from common.limitsetting.evaluator import HypotestEvaluator
 from common.misc.logger import logger
 
 
@@ -10,11 +14,7 @@ def GetObsLimitBisection(
     poi_bracket_init,
     tolerance,
     maxiter,
-    data,
-    model,
-    par_bounds,
-    init_pars,
-    fix_pars,
+    evaluator,
 ):
     cls_obs_exp = []
     poi_bracket = poi_bracket_init.copy()
@@ -22,17 +22,7 @@ def GetObsLimitBisection(
     for poi in poi_bracket:
         pois_all.append(poi)
         logger.debug(f"Limit Bisection: testing POI {poi}")
-        cls_obs_exp.append(
-            pyhf.infer.hypotest(
-                poi,
-                data,
-                model,
-                test_stat="qtilde",
-                return_expected_set=True,
-                par_bounds=par_bounds,
-                fixed_params=fix_pars,
-            )
-        )
+        cls_obs_exp.extend(evaluator([poi]))
     cls_obs_low = cls_obs_exp[0][0]
     cls_obs_high = cls_obs_exp[1][0]
     if (cls_obs_low - 0.05) * (cls_obs_high - 0.05) > 0.0:
@@ -48,16 +38,7 @@ def GetObsLimitBisection(
         logger.debug(
             f"Limit Bisection (iteration {niter}): using POI value of {poi_mean}."
         )
-        cls_obs_exp_new = pyhf.infer.hypotest(
-            poi_mean,
-            data,
-            model,
-            test_stat="qtilde",
-            return_expected_set=True,
-            par_bounds=par_bounds,
-            init_pars=init_pars,
-            fixed_params=fix_pars,
-        )
+        cls_obs_exp_new = evaluator([poi_mean])[0]
         pois_all.append(poi_mean)
         cls_obs_exp.append(cls_obs_exp_new)
         cls_poiMean = cls_obs_exp_new[0]
@@ -69,6 +50,131 @@ def GetObsLimitBisection(
     return cls_obs_exp, pois_all
 
 
+def GetObsLimitKSection(
+    poi_bracket_init,
+    tolerance,
+    maxiter,
+    evaluator,
+    n_points,
+):
+    """
+    Determine the observed limit by k-section. In each iteration,
+    CLs values are evaluated for n_points equidistant POI values
+    inside the bracket in parallel, which shrinks the bracket
+    by a factor of n_points + 1. For n_points = 1, this is a bisection.
+    """
+    poi_bracket = poi_bracket_init.copy()
+    logger.debug(f"Limit k-section: testing POI bracket {poi_bracket}")
+    cls_obs_exp = evaluator(poi_bracket)
+    pois_all = poi_bracket.copy()
+    cls_obs_low = cls_obs_exp[0][0]
+    cls_obs_high = cls_obs_exp[1][0]
+    if (cls_obs_low - 0.05) * (cls_obs_high - 0.05) > 0.0:
+        raise ValueError("Limit computation poi bracket inappropriate.")
+    niter = 1
+    while (poi_bracket[1] - poi_bracket[0]) / (
+        0.5 * (poi_bracket[1] + poi_bracket[0])
+    ) > tolerance:
+        niter += 1
+        if niter > maxiter:
+            raise ValueError("Reached max. iterations in limit computation.")
+        step = (poi_bracket[1] - poi_bracket[0]) / (n_points + 1)
+        pois = [poi_bracket[0] + step * (i + 1) for i in range(n_points)]
+        logger.debug(
+            f"Limit k-section (iteration {niter}): using POI values of {pois}."
+        )
+        cls_obs_exp_new = evaluator(pois)
+        pois_all.extend(pois)
+        cls_obs_exp.extend(cls_obs_exp_new)
+        # the new bracket ends at the first POI value
+        # for which CLs is on the other side of 0.05
+        for poi, cls_obs_exp_poi in zip(pois, cls_obs_exp_new):
+            if (cls_obs_exp_poi[0] - 0.05) * (cls_obs_low - 0.05) < 0.0:
+                poi_bracket[1] = poi
+                break
+            poi_bracket[0] = poi
+            cls_obs_low = cls_obs_exp_poi[0]
+    return cls_obs_exp, pois_all
+
+
+def GetLimitsBrent(
+    poi_bracket_init,
+    tolerance,
+    maxiter,
+    evaluator,
+):
+    """
+    Determine the observed limit and the five expected limits with Brent's
+    method, one root finding of CLs - 0.05 after the other. All CLs values
+    are cached, and every root finding starts from the tightest bracket
+    found in the CLs values of all POI values tested before.
+    """
+    cls_cache = {}
+
+    def cls_values(poi):
+        if poi not in cls_cache:
+            logger.debug(f"Limit Brent: testing POI {poi}")
+            cls_obs, cls_exp = evaluator([poi])[0]
+            cls_cache[poi] = [cls_obs, *cls_exp]
+        return cls_cache[poi]
+
+    for poi in poi_bracket_init:
+        cls_values(poi)
+    limits = []
+    for i_cls in range(6):
+        # assumes CLs values falling monotonically with the POI
+        pois_below = [p for p, cls in cls_cache.items() if cls[i_cls] > 0.05]
+        pois_above = [p for p, cls in cls_cache.items() if cls[i_cls] < 0.05]
+        if not pois_below or not pois_above:
+            raise ValueError("Limit computation poi bracket inappropriate.")
+        limit, result = scipy.optimize.brentq(
+            lambda poi: cls_values(poi)[i_cls] - 0.05,
+            max(pois_below),
+            min(pois_above),
+            rtol=tolerance,
+            maxiter=maxiter,
+            full_output=True,
+            disp=False,
+        )
+        if not result.converged:
+            raise ValueError("Reached max. iterations in limit computation.")
+        limits.append(limit)
+    pois_all = sorted(cls_cache)
+    return limits, [cls_cache[poi] for poi in pois_all], pois_all
+
+
+def _limit_settings(
+    model: pyhf.pdf.Model,
+    par_bounds: list[tuple[float, float]] | None,
+    bracket: list[float] | tuple[float, float] | None,
+) -> tuple:
+    """
+    Return the parameter bounds for limit setting,
+    with the lower POI bound at 0 by default, and the initial POI bracket.
+    """
+    if model.config.poi_index is None:
+        raise RuntimeError("Could not retrieve POI index.")
+    if not par_bounds:
+        par_bounds = model.config.suggested_bounds()
+        if par_bounds is None:
+            raise RuntimeError("Could not retrieve list of parameter bounds.")
+        par_bounds[model.config.poi_index] = (
+            0,
+            par_bounds[model.config.poi_index][1],
+        )
+
+    # set default bracket to (0.1, upper POI bound in measurement) if needed
+    bracket_left_default = 0.1
+    bracket_right_default = par_bounds[model.config.poi_index][1]
+    if bracket is None:
+        bracket = (bracket_left_default, bracket_right_default)
+    elif bracket[0] == bracket[1]:
+        raise ValueError(
+            f"the two bracket values must not be the same: " f"{bracket}"
+        )
+    return par_bounds, bracket
+
+
 def limit_customScan(
     model: pyhf.pdf.Model,
     data: list[float],
@@ -79,6 +185,10 @@ def limit_customScan(
     init_pars: list[float] | None = None,
     par_bounds: list[tuple[float, float]] | None = None,
     fix_pars: list[bool] | None = None,
+    obs_method: str = "bisect",
+    n_workers: int = 1,
+    warm_start: bool = True,
+    cache: common.misc.cache.HypotestCache | None = None,
 ) -> cabinetry.fit.LimitResults:
     """
     Calculates observed and expected 95% confidence level
@@ -104,9 +214,25 @@ def limit_customScan(
         maxiter (int, optional):
             maximum number of steps for limit finding,
             defaults to 100
+        obs_method (str, optional):
+            method to determine the observed limit, 'bisect' or 'ksection',
+            defaults to 'bisect'
+        n_workers (int, optional):
+            number of worker processes evaluating hypotests in parallel,
+            the 'ksection' method tests n_workers POI values per iteration,
+            the expected limit scan is distributed over all workers,
+            defaults to 1
+        warm_start (bool, optional):
+            start the fits for each POI value from the fitted parameters
+            of the closest POI value tested before, the first fits start
+            from init_pars, defaults to True
+        cache (common.misc.cache.HypotestCache, optional):
+            on-disk cache for hypotest results, defaults to None (no caching)
     Raises:
         ValueError:
             if lower and upper bracket value are the same
+        RuntimeError:
+            if a hypotest fails in the expected limit scan
     Returns:
         LimitResults:
             observed and expected limits, CLs values, and scanned points
@@ -119,83 +245,71 @@ def limit_customScan(
     #
     ###########################################################################
 
-    pyhf.set_backend(
-        "pytorch", precision="64b"
-    )  # much faster to run than numpy
-    if model.config.poi_index is None:
-        raise RuntimeError("Could not retrieve POI index.")
-    if not par_bounds:
-        par_bounds = model.config.suggested_bounds()
-        if par_bounds is None:
-            raise RuntimeError("Could not retrieve list of parameter bounds.")
-        par_bounds[model.config.poi_index] = (
-            0,
-            par_bounds[model.config.poi_index][1],
-        )
-
-    # set default bracket to (0.1, upper POI bound in measurement) if needed
-    bracket_left_default = 0.1
-    bracket_right_default = par_bounds[model.config.poi_index][1]
-    if bracket is None:
-        bracket = (bracket_left_default, bracket_right_default)
-    elif bracket[0] == bracket[1]:
-        raise ValueError(
-            f"the two bracket values must not be the same: " f"{bracket}"
-        )
-
+    par_bounds, bracket = _limit_settings(model, par_bounds, bracket)
     poi_bracket = [bracket[0], bracket[1]]
 
-    results_obs, poi_values_obs = GetObsLimitBisection(
-        poi_bracket,
-        toleranceObs,
-        maxiterObs,
-        data,
+    evaluator = HypotestEvaluator(
         model,
-        par_bounds,
-        init_pars,
-        fix_pars,
+        data,
+        par_bounds=par_bounds,
+        init_pars=init_pars,
+        fix_pars=fix_pars,
+        n_workers=n_workers,
+        warm_start=warm_start,
+        cache=cache,
     )
-    cls_obs_indices = np.argsort(np.array(poi_values_obs))
-    list_of_observed = []
-    list_of_expected_minus2sigma = []
-    list_of_expected_plus2sigma = []
-    for i_cls_obs in cls_obs_indices:
-        list_of_observed.append(results_obs[i_cls_obs][0])
-        list_of_expected_minus2sigma.append(results_obs[i_cls_obs][1][0])
-        list_of_expected_plus2sigma.append(results_obs[i_cls_obs][1][4])
-    poi_values_obs.sort()
-    observed = np.asarray(list_of_observed).ravel()
+    # the worker processes are kept for the observed and the expected limits,
+    # so each of them builds the model only once
+    with evaluator:
+        if obs_method == "ksection":
+            results_obs, poi_values_obs = GetObsLimitKSection(
+                poi_bracket,
+                toleranceObs,
+                maxiterObs,
+                evaluator,
+                n_points=max(n_workers, 1),
+            )
+        else:
+            results_obs, poi_values_obs = GetObsLimitBisection(
+                poi_bracket, toleranceObs, maxiterObs, evaluator
+            )
+        cls_obs_indices = np.argsort(np.array(poi_values_obs))
+        list_of_observed = []
+        list_of_expected_minus2sigma = []
+        list_of_expected_plus2sigma = []
+        for i_cls_obs in cls_obs_indices:
+            list_of_observed.append(results_obs[i_cls_obs][0])
+            list_of_expected_minus2sigma.append(results_obs[i_cls_obs][1][0])
+            list_of_expected_plus2sigma.append(results_obs[i_cls_obs][1][4])
+        poi_values_obs.sort()
+        observed = np.asarray(list_of_observed).ravel()
 
-    #
-    # Determine the poi range for expected limits
-    # including +/1 and +/-2 sigma bands
-    #
-    poi_bracket_exp = poi_bracket
-    for iPoi, poi in enumerate(poi_values_obs):
-        if list_of_expected_minus2sigma[iPoi] > 0.05:
-            poi_bracket_exp[0] = poi
-        if list_of_expected_plus2sigma[iPoi] < 0.05:
-            poi_bracket_exp[1] = poi
-            break
-    scan_lowerBound = poi_bracket_exp[0]
-    scan_upperBound = poi_bracket_exp[1]
-    scan_resolution = (scan_upperBound - scan_lowerBound) / nIterExp
-    poi_values_exp = np.arange(
-        scan_lowerBound, scan_upperBound + scan_resolution, scan_resolution
-    )
-    logger.debug(f"poi_values_exp = {poi_values_exp}")
-    results_exp = [
-        pyhf.infer.hypotest(
-            poi,
-            data,
-            model,
-            test_stat="qtilde",
-            return_expected_set=True,
-            par_bounds=par_bounds,
-            fixed_params=fix_pars,
+        #
+        # Determine the poi range for expected limits
+        # including +/1 and +/-2 sigma bands
+        #
+        poi_bracket_exp = poi_bracket
+        for iPoi, poi in enumerate(poi_values_obs):
+            if list_of_expected_minus2sigma[iPoi] > 0.05:
+                poi_bracket_exp[0] = poi
+            if list_of_expected_plus2sigma[iPoi] < 0.05:
+                poi_bracket_exp[1] = poi
+                break
+        scan_lowerBound = poi_bracket_exp[0]
+        scan_upperBound = poi_bracket_exp[1]
+        scan_resolution = (scan_upperBound - scan_lowerBound) / nIterExp
+        poi_values_exp = np.arange(
+            scan_lowerBound, scan_upperBound + scan_resolution, scan_resolution
         )
-        for poi in poi_values_exp
-    ]
+        logger.debug(f"poi_values_exp = {poi_values_exp}")
+        # hypotests are independent and distributed over all workers, results
+        # are returned in the order of poi_values_exp as needed for np.interp
+        results_exp = evaluator(poi_values_exp)
+    logger.info(
+        f"Limit setting ran {evaluator.n_hypotests} hypotests with \
+            {evaluator.n_logpdf_calls} likelihood evaluations \
+            (warm start: {warm_start})."
+    )
 
     expected_minus2sigma = np.asarray([h[1][0] for h in results_exp]).ravel()
     expected_minus1sigma = np.asarray([h[1][1] for h in results_exp]).ravel()
@@ -234,13 +348,215 @@ def limit_customScan(
     logger.info(f"Upper limit (expplus1sigma): μ = {all_limits[4]}")
     logger.info(f"Upper limit (expplus2sigma): μ = {all_limits[5]}")
 
+    # observed and expected CLs values of the POI values tested for the
+    # observed limit, in the layout of cabinetry.fit.LimitResults
+    expected_obs = np.asarray(
+        [results_obs[i_cls_obs][1] for i_cls_obs in cls_obs_indices]
+    )
     limit_results = cabinetry.fit.LimitResults(
         float(all_limits[0]),
         np.asarray(all_limits[1:]),
-        results_obs,
-        results_exp,
-        poi_values_obs,
-        # poi_values_exp,
+        observed,
+        expected_obs,
+        np.asarray(poi_values_obs),
         0.95,
     )
     return limit_results
+
+
+def limit_asimov(
+    model: pyhf.pdf.Model,
+    data: list[float],
+    bracket: list[float] | tuple[float, float] | None = None,
+    toleranceObs: float = 0.05,
+    maxiterObs: int = 50,
+    nIterSigma: int = 2,
+    init_pars: list[float] | None = None,
+    par_bounds: list[tuple[float, float]] | None = None,
+    fix_pars: list[bool] | None = None,
+    warm_start: bool = True,
+    cache: common.misc.cache.HypotestCache | None = None,
+) -> cabinetry.fit.LimitResults:
+    """
+    Calculates observed and expected 95% confidence level
+    upper parameter limits.
+    The observed limit is determined by bisection as in limit_customScan.
+    The expected limit and its bands are calculated in the asymptotic
+    approximation, without a scan of POI values, from the uncertainty sigma
+    of the POI obtained from the background-only Asimov dataset
+    (arXiv:1007.1727):
+        mu_N = sigma(mu_N) * (Phi^-1(1 - 0.05 * Phi(N)) + N),
+        sigma(mu)^2 = mu^2 / q_mu,A.
+    As sigma depends on mu, the equation for each band is solved iteratively.
+    Args:
+        model (pyhf.pdf.Model):
+            model to use in fits
+        data (List[float]):
+            data (including auxdata) the model is fit to
+        bracket (Optional[Union[List[float], Tuple[float, float]]], optional):
+            the two POI values used to start the observed limit determination,
+            defaults to None (then uses ``0.1`` as default lower value,
+            and the upper POI bound specified in the measurement
+            as default upper value)
+        toleranceObs (float, optional):
+            rel. tolerance in POI value for convergence to
+            CLs=0.05 - observed limit, defaults to 0.05
+        maxiterObs (int, optional):
+            maximum number of steps for observed limit finding,
+            defaults to 50
+        nIterSigma (int, optional):
+            number of iterations evaluating sigma for each expected limit,
+            defaults to 2
+        warm_start (bool, optional):
+            start the fits for each POI value from the fitted parameters
+            of the closest POI value tested before, the first fits start
+            from init_pars, defaults to True
+        cache (common.misc.cache.HypotestCache, optional):
+            on-disk cache for hypotest results, defaults to None (no caching)
+    Raises:
+        ValueError:
+            if lower and upper bracket value are the same
+    Returns:
+        LimitResults:
+            observed and expected limits, CLs values, and scanned points
+    """
+    par_bounds, bracket = _limit_settings(model, par_bounds, bracket)
+    poi_bracket = [bracket[0], bracket[1]]
+
+    with HypotestEvaluator(
+        model,
+        data,
+        par_bounds=par_bounds,
+        init_pars=init_pars,
+        fix_pars=fix_pars,
+        warm_start=warm_start,
+        cache=cache,
+    ) as evaluator:
+        results_obs, poi_values_obs = GetObsLimitBisection(
+            poi_bracket, toleranceObs, maxiterObs, evaluator
+        )
+        cls_obs_indices = np.argsort(np.array(poi_values_obs))
+        poi_values = np.asarray(poi_values_obs)[cls_obs_indices]
+        observed = np.asarray([results_obs[i][0] for i in cls_obs_indices])
+        expected = np.asarray([results_obs[i][1] for i in cls_obs_indices])
+        observed_limit = np.interp(0.05, observed[::-1], poi_values[::-1])
+
+        # start at the POI value closest to the median expected limit
+        poi_start = poi_values[np.argmin(np.abs(expected[:, 2] - 0.05))]
+        sigma_start = evaluator.asimov_sigma(poi_start)
+        expected_limits = []
+        for n_sigma in [-2, -1, 0, 1, 2]:
+            factor = (
+                scipy.stats.norm.ppf(1 - 0.05 * scipy.stats.norm.cdf(n_sigma))
+                + n_sigma
+            )
+            expected_limit = sigma_start * factor
+            for _ in range(nIterSigma):
+                expected_limit = evaluator.asimov_sigma(expected_limit) * factor
+            expected_limits.append(expected_limit)
+    logger.info(
+        f"Limit setting ran {evaluator.n_hypotests} hypotests with \
+            {evaluator.n_logpdf_calls} likelihood evaluations."
+    )
+
+    logger.info(f"Upper limit (obs): μ = {observed_limit}")
+    logger.info(f"Upper limit (expminus2sigma): μ = {expected_limits[0]}")
+    logger.info(f"Upper limit (expminus1sigma): μ = {expected_limits[1]}")
+    logger.info(f"Upper limit (exp): μ = {expected_limits[2]}")
+    logger.info(f"Upper limit (expplus1sigma): μ = {expected_limits[3]}")
+    logger.info(f"Upper limit (expplus2sigma): μ = {expected_limits[4]}")
+
+    return cabinetry.fit.LimitResults(
+        float(observed_limit),
+        np.asarray(expected_limits),
+        observed,
+        expected,
+        poi_values,
+        0.95,
+    )
+
+
+def limit_brent(
+    model: pyhf.pdf.Model,
+    data: list[float],
+    bracket: list[float] | tuple[float, float] | None = None,
+    tolerance: float = 0.01,
+    maxiter: int = 100,
+    init_pars: list[float] | None = None,
+    par_bounds: list[tuple[float, float]] | None = None,
+    fix_pars: list[bool] | None = None,
+    warm_start: bool = True,
+    cache: common.misc.cache.HypotestCache | None = None,
+) -> cabinetry.fit.LimitResults:
+    """
+    Calculates observed and expected 95% confidence level
+    upper parameter limits.
+    The observed limit and each of the expected limits are determined
+    by separate root findings with Brent's method, which share all CLs values
+    calculated, as every hypotest returns the observed and expected CLs.
+    Args:
+        model (pyhf.pdf.Model):
+            model to use in fits
+        data (List[float]):
+            data (including auxdata) the model is fit to
+        bracket (Optional[Union[List[float], Tuple[float, float]]], optional):
+            the two POI values used to start the limit determination,
+            all limits must lie between these values,
+            defaults to None (then uses ``0.1`` as default lower value,
+            and the upper POI bound specified in the measurement
+            as default upper value)
+        tolerance (float, optional):
+            rel. tolerance in POI value for convergence to CLs=0.05,
+            defaults to 0.01
+        maxiter (int, optional):
+            maximum number of steps for each root finding,
+            defaults to 100
+        warm_start (bool, optional):
+            start the fits for each POI value from the fitted parameters
+            of the closest POI value tested before, the first fits start
+            from init_pars, defaults to True
+        cache (common.misc.cache.HypotestCache, optional):
+            on-disk cache for hypotest results, defaults to None (no caching)
+    Raises:
+        ValueError:
+            if lower and upper bracket value are the same,
+            or if a limit does not lie between them
+    Returns:
+        LimitResults:
+            observed and expected limits, CLs values, and scanned points
+    """
+    par_bounds, bracket = _limit_settings(model, par_bounds, bracket)
+
+    with HypotestEvaluator(
+        model,
+        data,
+        par_bounds=par_bounds,
+        init_pars=init_pars,
+        fix_pars=fix_pars,
+        warm_start=warm_start,
+        cache=cache,
+    ) as evaluator:
+        all_limits, cls_values, poi_values = GetLimitsBrent(
+            [bracket[0], bracket[1]], tolerance, maxiter, evaluator
+        )
+    logger.info(
+        f"Limit setting ran {evaluator.n_hypotests} hypotests with \
+            {evaluator.n_logpdf_calls} likelihood evaluations."
+    )
+
+    logger.info(f"Upper limit (obs): μ = {all_limits[0]}")
+    logger.info(f"Upper limit (expminus2sigma): μ = {all_limits[1]}")
+    logger.info(f"Upper limit (expminus1sigma): μ = {all_limits[2]}")
+    logger.info(f"Upper limit (exp): μ = {all_limits[3]}")
+    logger.info(f"Upper limit (expplus1sigma): μ = {all_limits[4]}")
+    logger.info(f"Upper limit (expplus2sigma): μ = {all_limits[5]}")
+
+    cls_values = np.asarray(cls_values)
+    return cabinetry.fit.LimitResults(
+        float(all_limits[0]),
+        np.asarray(all_limits[1:]),
+        cls_values[:, 0],
+        cls_values[:, 1:],
+        np.asarray(poi_values),
+        0.95,
+    )
@@ -0,0 +1,512 @@
+import concurrent.futures
+import multiprocessing
+
+import pyhf
+
+import common.misc.cache
+import common.misc.instrumentation
+from common.misc.instrumentation import LogpdfCounter
+from common.misc.logger import logger
+
+# model, data and hypotest settings of a worker process,
+# set once per process by _init_worker
+_worker_state: dict = {}
+
+
+class _WarmStartCalculator(pyhf.infer.calculators.AsymptoticCalculator):
+    """
+    Asymptotic calculator for the qtilde test statistic, which runs the fits
+    not depending on the tested POI value (the fit generating the Asimov
+    dataset and the unconditional fits to data and to the Asimov dataset)
+    only once, and starts the conditional fits from given parameters.
+    """
+
+    def __init__(
+        self,
+        data,
+        pdf: pyhf.pdf.Model,
+        init_pars: list[float] | None = None,
+        par_bounds: list[tuple[float, float]] | None = None,
+        fixed_params: list[bool] | None = None,
+    ):
+        super().__init__(
+            data, pdf, init_pars, par_bounds, fixed_params, test_stat="qtilde"
+        )
+        # initial parameters of the conditional fits to data and to Asimov data
+        self.conditional_init_pars = (self.init_pars, self.init_pars)
+        self._unconditional_fits = None
+
+    def _fit_unconditional(self) -> tuple:
+        if self._unconditional_fits is None:
+            asimov_data, asimov_pars = (
+                pyhf.infer.calculators.generate_asimov_data(
+                    0.0,
+                    self.data,
+                    self.pdf,
+                    self.init_pars,
+                    self.par_bounds,
+                    self.fixed_params,
+                    return_fitted_pars=True,
+                )
+            )
+            fits = [
+                pyhf.infer.mle.fit(
+                    data,
+                    self.pdf,
+                    self.init_pars,
+                    self.par_bounds,
+                    self.fixed_params,
+                    return_fitted_val=True,
+                )
+                for data in [self.data, asimov_data]
+            ]
+            self._unconditional_fits = asimov_data, asimov_pars, fits
+        return self._unconditional_fits
+
+    def _qmu_tilde(self, poi_test, data, init_pars, free_fit) -> tuple:
+        tensorlib, _ = pyhf.get_backend()
+        free_pars, free_twice_nll = free_fit
+        fixed_pars, fixed_twice_nll = pyhf.infer.mle.fixed_poi_fit(
+            poi_test,
+            data,
+            self.pdf,
+            init_pars,
+            self.par_bounds,
+            self.fixed_params,
+            return_fitted_val=True,
+        )
+        tmu = tensorlib.astensor(
+            tensorlib.clip(
+                fixed_twice_nll - free_twice_nll, 0.0, max_value=None
+            )
+        )
+        qmu = tensorlib.where(
+            free_pars[self.pdf.config.poi_index] > poi_test,
+            tensorlib.astensor(0.0),
+            tmu,
+        )
+        return qmu, fixed_pars
+
+    def asimov_sigma(
+        self, poi_test: float, init_pars: list[float] | None = None
+    ) -> tuple[float, list[float]]:
+        """
+        Returns uncertainty of the POI from the Asimov dataset,
+        sigma^2 = poi_test^2 / q_poi_test,A, and the fitted parameters of
+        the conditional fit to the Asimov dataset.
+        """
+        tensorlib, _ = pyhf.get_backend()
+        asimov_data, _, (_, free_fit_A) = self._fit_unconditional()
+        qmuA_v, fixed_pars_A = self._qmu_tilde(
+            poi_test,
+            asimov_data,
+            init_pars or self.conditional_init_pars[1],
+            free_fit_A,
+        )
+        sigma = poi_test / float(tensorlib.sqrt(qmuA_v))
+        return sigma, tensorlib.tolist(fixed_pars_A)
+
+    def teststatistic(self, poi_test):
+        tensorlib, _ = pyhf.get_backend()
+        asimov_data, asimov_pars, (free_fit, free_fit_A) = (
+            self._fit_unconditional()
+        )
+        init_pars, init_pars_A = self.conditional_init_pars
+        qmu_v, fixed_pars = self._qmu_tilde(
+            poi_test, self.data, init_pars, free_fit
+        )
+        qmuA_v, fixed_pars_A = self._qmu_tilde(
+            poi_test, asimov_data, init_pars_A, free_fit_A
+        )
+        sqrtqmu_v = tensorlib.sqrt(qmu_v)
+        self.sqrtqmuA_v = tensorlib.sqrt(qmuA_v)
+        self.fitted_pars = pyhf.infer.calculators.HypoTestFitResults(
+            asimov_pars=asimov_pars,
+            free_fit_to_data=free_fit[0],
+            free_fit_to_asimov=free_fit_A[0],
+            fixed_poi_fit_to_data=fixed_pars,
+            fixed_poi_fit_to_asimov=fixed_pars_A,
+        )
+
+        # same as pyhf.infer.calculators.AsymptoticCalculator for qtilde
+        def _true_case():
+            return sqrtqmu_v - self.sqrtqmuA_v
+
+        def _false_case():
+            return (qmu_v - qmuA_v) / (2 * self.sqrtqmuA_v)
+
+        teststat = tensorlib.conditional(
+            (sqrtqmu_v <= self.sqrtqmuA_v), _true_case, _false_case
+        )
+        return tensorlib.astensor(teststat)
+
+
+def _init_worker(
+    model_spec: dict,
+    poi_name: str,
+    data: list[float],
+    hypotest_kwargs: dict,
+    warm_start: bool,
+    backend: tuple[str, str, str],
+) -> None:
+    tensorlib_name, precision, optimizer_name = backend
+    pyhf.set_backend(tensorlib_name, optimizer_name, precision=precision)
+    model = pyhf.pdf.Model(model_spec, poi_name=poi_name)
+    _worker_state["model"] = model
+    _worker_state["data"] = data
+    _worker_state["hypotest_kwargs"] = hypotest_kwargs
+    _worker_state["calculator"] = (
+        _WarmStartCalculator(data, model, **hypotest_kwargs)
+        if warm_start
+        else None
+    )
+
+
+def _hypotests(
+    pois: list[float],
+    init_pars: tuple | None,
+    model,
+    data,
+    hypotest_kwargs: dict,
+    calculator: _WarmStartCalculator | None,
+) -> list[tuple]:
+    """
+    Run hypotests for POI values one after the other.
+
+    Without calculator, every hypotest runs all fits with pyhf.infer.hypotest.
+    With calculator, its unconditional fits are reused, and the conditional
+    fits for each POI value start from the fitted parameters of the previous
+    POI value, or from init_pars for the first one.
+
+    Returns list of (observed CLs, list of 5 expected CLs,
+    parameters of conditional fits to data and to Asimov data,
+    number of likelihood evaluations) tuples, in the order of pois.
+    """
+    results = []
+    for poi in pois:
+        try:
+            with LogpdfCounter(model) as counter:
+                if calculator is None:
+                    cls_obs, cls_exp = pyhf.infer.hypotest(
+                        poi,
+                        data,
+                        model,
+                        test_stat="qtilde",
+                        return_expected_set=True,
+                        **hypotest_kwargs,
+                    )
+                    fitted_pars = None
+                else:
+                    if init_pars is not None:
+                        calculator.conditional_init_pars = init_pars
+                    teststat = calculator.teststatistic(poi)
+                    distributions = calculator.distributions(poi)
+                    _, _, cls_obs = calculator.pvalues(teststat, *distributions)
+                    _, _, cls_exp = calculator.expected_pvalues(*distributions)
+                    fitted_pars = tuple(
+                        pyhf.tensorlib.tolist(pars)
+                        for pars in [
+                            calculator.fitted_pars.fixed_poi_fit_to_data,
+                            calculator.fitted_pars.fixed_poi_fit_to_asimov,
+                        ]
+                    )
+                    init_pars = fitted_pars
+        except Exception as e:
+            raise RuntimeError(f"Hypotest failed for POI value {poi}.") from e
+        results.append(
+            (
+                float(cls_obs),
+                [float(cls) for cls in cls_exp],
+                fitted_pars,
+                counter.calls,
+            )
+        )
+    return results
+
+
+def _worker_hypotests(
+    pois: list[float], init_pars: tuple | None
+) -> list[tuple]:
+    return _hypotests(
+        pois,
+        init_pars,
+        _worker_state["model"],
+        _worker_state["data"],
+        _worker_state["hypotest_kwargs"],
+        _worker_state["calculator"],
+    )
+
+
+class HypotestEvaluator:
+    """
+    Evaluates observed and expected CLs values for a list of POI values,
+    either in the current process or in a pool of worker processes.
+    Each worker builds the model once when it is started.
+
+    Use as a context manager to shut down the worker processes
+    once all evaluations are done.
+    """
+
+    def __init__(
+        self,
+        model: pyhf.pdf.Model,
+        data: list[float],
+        par_bounds: list[tuple[float, float]] | None = None,
+        init_pars: list[float] | None = None,
+        fix_pars: list[bool] | None = None,
+        n_workers: int = 1,
+        warm_start: bool = True,
+        cache: common.misc.cache.HypotestCache | None = None,
+    ):
+        """
+        Arguments:
+            model (pyhf.pdf.Model): model to use in fits
+            data (list[float]):
+                data (including auxdata) the model is fit to
+            par_bounds (Optional[list[tuple[float, float]]]):
+                parameter bounds for fits (default: None, pyhf suggestion)
+            init_pars (Optional[list[float]]):
+                initial parameter values for fits, e.g. the best-fit
+                parameters of a fit to data (default: None, pyhf suggestion)
+            fix_pars (Optional[list[bool]]):
+                parameters held constant in fits
+                (default: None, pyhf suggestion)
+            n_workers (int):
+                number of worker processes
+                (default: 1, evaluate in current process)
+            warm_start (bool):
+                run the fits not depending on the POI value only once,
+                and start the conditional fits for each POI value from the
+                fitted parameters of the closest POI value evaluated before
+                (default: True)
+            cache (Optional[common.misc.cache.HypotestCache]):
+                on-disk cache for hypotest results, keyed by model, data,
+                POI value and settings, but not by initial parameter values
+                (default: None, no caching)
+        """
+        self.model = model
+        self.data = data
+        if init_pars is not None and par_bounds is not None:
+            # best-fit parameters might lie outside of bounds used here
+            init_pars = [
+                min(max(par, bounds[0]), bounds[1])
+                for par, bounds in zip(init_pars, par_bounds)
+            ]
+        self.hypotest_kwargs = {
+            "init_pars": init_pars,
+            "par_bounds": par_bounds,
+            "fixed_params": fix_pars,
+        }
+        self.n_workers = n_workers
+        self.warm_start = warm_start
+        self.cache = cache
+        # backend the evaluator is created in, also used by the workers
+        self._backend = (
+            pyhf.tensorlib.name,
+            pyhf.tensorlib.precision,
+            pyhf.optimizer.name,
+        )
+        self._cache_key = None
+        if cache is not None:
+            self._cache_key = common.misc.cache.settings_hash(
+                model.spec,
+                model.config.poi_name,
+                [float(d) for d in data],
+                par_bounds,
+                fix_pars,
+                "qtilde",
+                self._backend,
+            )
+        # used for hypotests with warm start and for Asimov uncertainties
+        self._calculator = _WarmStartCalculator(
+            data, model, **self.hypotest_kwargs
+        )
+        # parameters of the conditional fits to data and to Asimov data,
+        # by POI value
+        self._fitted_pars: dict[float, tuple] = {}
+        # parameters of conditional fits to Asimov data from asimov_sigma
+        self._asimov_fitted_pars: dict[float, list[float]] = {}
+        self.n_hypotests = 0
+        self.n_logpdf_calls = 0
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shut down worker processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            logger.debug(
+                f"Starting {self.n_workers} worker processes for hypotests."
+            )
+            # workers are started from a fresh interpreter, as forking
+            # is unsafe once jax or the threads of the pipeline are running
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    self.model.spec,
+                    self.model.config.poi_name,
+                    [float(d) for d in self.data],
+                    self.hypotest_kwargs,
+                    self.warm_start,
+                    self._backend,
+                ),
+            )
+        return self._executor
+
+    def _init_pars(self, poi: float) -> tuple | None:
+        """
+        Initial parameter values for the conditional fits to data and
+        to Asimov data of the given POI value, None to use init_pars.
+        """
+        if not self._fitted_pars:
+            return None
+        closest_poi = min(self._fitted_pars, key=lambda p: abs(p - poi))
+        return self._fitted_pars[closest_poi]
+
+    def __call__(self, pois: list[float]) -> list[tuple]:
+        """
+        Evaluate CLs values for all given POI values.
+
+        The POI values are split into one contiguous chunk per worker,
+        which are evaluated one after the other, with warm starts
+        within each chunk.
+        The result therefore only depends on the POI values and on
+        the number of workers, not on the order in which workers finish.
+        Results for different numbers of workers agree within the
+        tolerance of the minimizer, as the warm starts differ.
+        Results for POI values found in the cache are not evaluated again.
+
+        Arguments:
+            pois (list[float]): POI values to test
+
+        Returns list of (observed CLs, list of 5 expected CLs) tuples,
+        in the order of pois.
+
+        Raises:
+            RuntimeError:
+                if the hypotest fails for any of the POI values
+        """
+        pois = [float(poi) for poi in pois]
+        results = [None] * len(pois)
+        if self.cache is not None:
+            keys = [
+                common.misc.cache.settings_hash(self._cache_key, poi)
+                for poi in pois
+            ]
+            for i_poi, key in enumerate(keys):
+                cached = self.cache.load(key)
+                if cached is None:
+                    continue
+                cls_obs, cls_exp, fitted_pars = cached
+                if fitted_pars is not None:
+                    # cached results can serve as starting points
+                    self._fitted_pars[pois[i_poi]] = tuple(fitted_pars)
+                results[i_poi] = (cls_obs, cls_exp, fitted_pars, 0)
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        with common.misc.instrumentation.span("hypotests"):
+            evaluated = self._evaluate([pois[i_poi] for i_poi in missing])
+        for i_poi, result in zip(missing, evaluated):
+            results[i_poi] = result
+            cls_obs, cls_exp, fitted_pars, logpdf_calls = result
+            if fitted_pars is not None:
+                self._fitted_pars[pois[i_poi]] = fitted_pars
+            self.n_hypotests += 1
+            self.n_logpdf_calls += logpdf_calls
+            common.misc.instrumentation.count("hypotests")
+            common.misc.instrumentation.count(
+                "likelihood evaluations", logpdf_calls
+            )
+            if self.cache is not None:
+                self.cache.store(keys[i_poi], [cls_obs, cls_exp, fitted_pars])
+        return [(cls_obs, cls_exp) for cls_obs, cls_exp, _, _ in results]
+
+    def _evaluate(self, pois: list[float]) -> list[tuple]:
+        """
+        Run hypotests for POI values, in the current process or split into
+        chunks for the worker processes. Returns results of _hypotests.
+        """
+        if not pois:
+            return []
+        n_chunks = max(min(self.n_workers, len(pois)), 1)
+        chunk_size = -(-len(pois) // n_chunks)
+        chunks = [
+            pois[i : i + chunk_size] for i in range(0, len(pois), chunk_size)
+        ]
+        init_pars = [self._init_pars(chunk[0]) for chunk in chunks]
+
+        if n_chunks == 1:
+            results = _hypotests(
+                pois,
+                init_pars[0],
+                self.model,
+                self.data,
+                self.hypotest_kwargs,
+                self._calculator if self.warm_start else None,
+            )
+        else:
+            executor = self._get_executor()
+            futures = [
+                executor.submit(_worker_hypotests, chunk, chunk_init_pars)
+                for chunk, chunk_init_pars in zip(chunks, init_pars)
+            ]
+            results = []
+            for chunk, future in zip(chunks, futures):
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    for remaining in futures:
+                        remaining.cancel()
+                    if isinstance(e, concurrent.futures.BrokenExecutor):
+                        raise RuntimeError(
+                            f"Worker process terminated while evaluating \
+                                hypotests for POI values {chunk}."
+                        ) from e
+                    raise
+
+        return results
+
+    def asimov_sigma(self, poi: float) -> float:
+        """
+        Uncertainty of the POI from the background-only Asimov dataset,
+        sigma^2 = poi^2 / q_poi,A, evaluated in the current process.
+        The conditional fit to the Asimov dataset starts from the fitted
+        parameters of the closest POI value evaluated before.
+
+        Arguments:
+            poi (float): POI value to evaluate uncertainty for
+
+        Returns uncertainty of the POI.
+        """
+        poi = float(poi)
+        asimov_fitted_pars = {
+            fitted_poi: fitted_pars[1]
+            for fitted_poi, fitted_pars in self._fitted_pars.items()
+        }
+        asimov_fitted_pars.update(self._asimov_fitted_pars)
+        init_pars = None
+        if asimov_fitted_pars:
+            closest_poi = min(asimov_fitted_pars, key=lambda p: abs(p - poi))
+            init_pars = asimov_fitted_pars[closest_poi]
+        with LogpdfCounter(self.model) as counter:
+            sigma, self._asimov_fitted_pars[poi] = (
+                self._calculator.asimov_sigma(poi, init_pars)
+            )
+        self.n_logpdf_calls += counter.calls
+        common.misc.instrumentation.count(
+            "likelihood evaluations", counter.calls
+        )
+        return sigma
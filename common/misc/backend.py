@@ -0,0 +1,112 @@
+"""
+Scoped selection of the pyhf tensor backend and optimizer.
+Instead of setting the backend globally, fits and limit setting run
+inside a backend session, which restores the previous backend when it ends.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from common.misc.logger import logger
+
+# pyhf is only imported when a backend is used,
+# the options are needed to parse the command-line arguments
+if TYPE_CHECKING:
+    import pyhf
+
+BACKENDS = ["numpy", "pytorch", "jax"]
+OPTIMIZERS = ["scipy", "minuit"]
+PRECISIONS = ["64b", "32b"]
+
+
+@dataclass(frozen=True)
+class Backend:
+    """
+    pyhf tensor backend, optimizer and precision used for fits.
+
+    Arguments:
+        name (str): name of tensor backend, one of BACKENDS
+            (default: 'numpy')
+        optimizer (str): name of optimizer, one of OPTIMIZERS
+            (default: 'scipy')
+        precision (str): floating point precision, one of PRECISIONS
+            (default: '64b')
+        jit_warmup (bool): for the jax backend, compile the likelihood of
+            a model with a fit before it is used (default: False)
+    """
+
+    name: str = "numpy"
+    optimizer: str = "scipy"
+    precision: str = "64b"
+    jit_warmup: bool = False
+
+    def __post_init__(self):
+        for value, options in [
+            (self.name, BACKENDS),
+            (self.optimizer, OPTIMIZERS),
+            (self.precision, PRECISIONS),
+        ]:
+            if value not in options:
+                raise ValueError(
+                    f"'{value}' is not a valid backend setting. \
+                        Available options are {options}."
+                )
+
+    @contextlib.contextmanager
+    def session(self):
+        """
+        Context manager using this backend, optimizer and precision.
+        The previous backend and optimizer are restored when leaving it.
+        """
+        import pyhf
+
+        previous = pyhf.get_backend()
+        if self.is_active():
+            yield
+            return
+        pyhf.set_backend(self.name, self.optimizer, precision=self.precision)
+        try:
+            yield
+        finally:
+            pyhf.set_backend(*previous)
+
+    def is_active(self) -> bool:
+        """
+        Returns whether this backend, optimizer and precision are in use.
+        """
+        import pyhf
+
+        return (
+            pyhf.tensorlib.name == self.name
+            and pyhf.optimizer.name == self.optimizer
+            and pyhf.tensorlib.precision == self.precision
+        )
+
+    def warm_up(self, model: pyhf.pdf.Model, data: list[float]) -> None:
+        """
+        Compile the likelihood of a model with the jax backend
+        by running an unconditional and a conditional fit,
+        if jit_warmup is enabled.
+        Subsequent fits of the model use the compiled likelihoods.
+        Has to be called inside a session.
+
+        Arguments:
+            model (pyhf.pdf.Model): model to compile likelihood for
+            data (list[float]): data (including auxdata) the model is fit to
+        """
+        if not self.jit_warmup or self.name != "jax":
+            return
+        import pyhf
+
+        start = time.perf_counter()
+        # the compiled likelihood depends on the set of fixed parameters
+        pyhf.infer.mle.fit(data, model)
+        pyhf.infer.mle.fixed_poi_fit(1.0, data, model)
+        logger.info(
+            f"JIT warm-up of likelihood took \
+                {time.perf_counter() - start:.1f} s."
+        )
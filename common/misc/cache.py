@@ -0,0 +1,196 @@
+"""
+Content-addressed on-disk cache for modified workspace specifications
+and for hypotest results.
+Cache entries are keyed by a hash of the input file and of all settings
+that influence the modifications applied to the workspace, or of the model,
+data and settings of the hypotest,
+so they are invalidated automatically whenever any input changes.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+
+from common.misc.logger import logger
+
+# increase whenever the modifications applied to workspaces change
+# in a way not captured by the analysis and combination settings
+CACHE_VERSION = 1
+
+
+def file_hash(filename: str | pathlib.Path) -> str:
+    """
+    Calculate SHA-256 hash of the content of a file.
+
+    Arguments:
+        filename (str | pathlib.Path): path to file
+
+    Returns hexadecimal digest as str.
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_hash(*settings) -> str:
+    """
+    Calculate SHA-256 hash of JSON-serialisable settings.
+
+    Arguments:
+        settings: any number of JSON-serialisable objects,
+            objects which are not serialisable are converted to str
+
+    Returns hexadecimal digest as str.
+    """
+    serialised = json.dumps(
+        [CACHE_VERSION, *settings], sort_keys=True, default=str
+    )
+    return hashlib.sha256(serialised.encode()).hexdigest()
+
+
+def _workspace_path(cache_dir: str | pathlib.Path, key: str) -> pathlib.Path:
+    return pathlib.Path(cache_dir) / "workspaces" / f"{key}.json"
+
+
+def load_workspace_spec(cache_dir: str | pathlib.Path, key: str) -> dict | None:
+    """
+    Load workspace specification from cache.
+
+    Arguments:
+        cache_dir (str | pathlib.Path): directory containing the cache
+        key (str): key of cache entry
+
+    Returns workspace specification as dict.
+    Returns None if there is no valid cache entry for key.
+    """
+    path = _workspace_path(cache_dir, key)
+    if not path.exists():
+        logger.debug(f"No cached workspace found for key {key}.")
+        return None
+    with open(path, "r") as f:
+        try:
+            spec = json.load(f)
+        except json.decoder.JSONDecodeError:
+            logger.warning(f"Ignoring corrupt cache entry {path}.")
+            return None
+    logger.debug(f"Loaded cached workspace from {path}.")
+    return spec
+
+
+def store_workspace_spec(
+    cache_dir: str | pathlib.Path, key: str, spec: dict
+) -> None:
+    """
+    Store workspace specification in cache.
+    The file is written to a temporary location first and then moved,
+    so concurrent processes never read incomplete cache entries.
+
+    Arguments:
+        cache_dir (str | pathlib.Path): directory containing the cache
+        key (str): key of cache entry
+        spec (dict): workspace specification to store
+    """
+    path = _workspace_path(cache_dir, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(spec, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.debug(f"Stored workspace in cache {path}.")
+
+
+class HypotestCache:
+    """
+    On-disk cache of hypotest results, with one file per result in
+    <cache_dir>/hypotests. Whenever the cache is closed, the least recently
+    used entries are removed until its total size is below max_size.
+    Counts cache hits and misses.
+    """
+
+    def __init__(self, cache_dir: str | pathlib.Path, max_size: int = 100):
+        """
+        Arguments:
+            cache_dir (str | pathlib.Path): directory containing the cache
+            max_size (int): maximum total size of cached results in MB
+                (default: 100)
+        """
+        self.path = pathlib.Path(cache_dir) / "hypotests"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.path / f"{key}.json"
+
+    def load(self, key: str) -> list | None:
+        """
+        Load hypotest result from cache.
+
+        Arguments:
+            key (str): key of cache entry
+
+        Returns hypotest result, None if there is no valid cache entry for key.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "r") as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            self.misses += 1
+            return None
+        # modification time tracks last use for eviction
+        path.touch()
+        self.hits += 1
+        return result
+
+    def store(self, key: str, result: list) -> None:
+        """
+        Store hypotest result in cache, via a temporary file
+        as in store_workspace_spec.
+
+        Arguments:
+            key (str): key of cache entry
+            result (list): JSON-serialisable hypotest result
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def close(self) -> None:
+        """
+        Remove least recently used entries until the total size
+        of the cache is below its maximum size.
+        """
+        entries = []
+        for path in self.path.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # removed by a concurrent process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        max_size = self.max_size * 1024**2
+        n_removed = 0
+        for _, size, path in sorted(entries):
+            if total_size <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+            n_removed += 1
+        if n_removed:
+            logger.debug(f"Removed {n_removed} entries from hypotest cache.")
@@ -1,6 +1,10 @@
+import concurrent.futures
 import importlib
 import inspect
 
+import pyhf
+
+import common.misc.instrumentation
 from common.combinationbase import CombinationBase
 from common.workspaces import Workspace
 
@@ -49,7 +53,10 @@ def get_combination(
 
 
 def get_analysis_workspace(
-    analysis_name: str, parameters: dict, combination: CombinationBase | None
+    analysis_name: str,
+    parameters: dict,
+    combination: CombinationBase | None,
+    cache_dir: str | None = None,
 ) -> Workspace:
     """
     Retrieve analysis workspace modified according to settings
@@ -62,6 +69,9 @@ def get_analysis_workspace(
             dictionary containing parameters to propagate to analysis settings
         combination (Optional[CombinationBase]):
             instance of combination configuration class
+        cache_dir (Optional[str]):
+            directory of on-disk cache for modified workspaces
+            (default: None, no caching)
 
     Returns modified pyhf.Workspace
 
@@ -85,4 +95,90 @@ def get_analysis_workspace(
     # now we can finally create an instance of the Analysis class
     analysis = analysis_module.Analysis(analysis_name, parameters)
     logger.info(f"Loaded configuration for analysis {analysis_name}.")
-    return analysis.workspace(combination)
+    return analysis.workspace(combination, cache_dir=cache_dir)
+
+
+def _load_analysis_spec(
+    analysis_name: str,
+    parameters: dict,
+    combination: CombinationBase | None,
+    cache_dir: str | None,
+    recording_settings: dict | None,
+) -> tuple[dict, dict | None]:
+    """
+    Load and modify analysis workspace in a worker process
+    and return the modified specification to the parent process,
+    together with the spans and counters recorded while doing so.
+    """
+    workspace, records = common.misc.instrumentation.call_recorded(
+        recording_settings,
+        get_analysis_workspace,
+        analysis_name,
+        parameters,
+        combination,
+        cache_dir=cache_dir,
+    )
+    return dict(workspace.ws), records
+
+
+def get_analysis_workspaces(
+    analysis_names: list[str],
+    parameters: dict,
+    combination: CombinationBase | None,
+    cache_dir: str | None = None,
+    n_jobs: int = 1,
+) -> list[Workspace]:
+    """
+    Retrieve workspaces of several analyses modified according to
+    settings in their configuration classes.
+
+    Arguments:
+        analysis_names (list[str]):
+            names of analyses
+        parameters (dict):
+            dictionary containing parameters to propagate to analysis settings
+        combination (Optional[CombinationBase]):
+            instance of combination configuration class
+        cache_dir (Optional[str]):
+            directory of on-disk cache for modified workspaces
+            (default: None, no caching)
+        n_jobs (int):
+            number of worker processes loading and modifying workspaces
+            concurrently (default: 1, load workspaces one after another)
+
+    Returns list of modified Workspaces in the order of analysis_names.
+    """
+    if n_jobs <= 1 or len(analysis_names) == 1:
+        return [
+            get_analysis_workspace(
+                analysis_name, parameters, combination, cache_dir=cache_dir
+            )
+            for analysis_name in analysis_names
+        ]
+
+    n_jobs = min(n_jobs, len(analysis_names))
+    logger.info(
+        f"Loading {len(analysis_names)} workspaces \
+            using {n_jobs} worker processes."
+    )
+    recording_settings = common.misc.instrumentation.settings()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        results = list(
+            executor.map(
+                _load_analysis_spec,
+                analysis_names,
+                [parameters] * len(analysis_names),
+                [combination] * len(analysis_names),
+                [cache_dir] * len(analysis_names),
+                [recording_settings] * len(analysis_names),
+            )
+        )
+    specs = []
+    for spec, records in results:
+        common.misc.instrumentation.merge(records)
+        specs.append(spec)
+    # specifications have been validated in the worker processes already
+    return [
+        Workspace(name=analysis_name, ws=pyhf.Workspace(spec, validate=False))
+        for analysis_name, spec in zip(analysis_names, specs)
+    ]
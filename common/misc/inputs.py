@@ -0,0 +1,92 @@
+"""
+Reading of (compressed) JSON input files.
+Compression is detected from the file extension, and the JSON is parsed
+with orjson if it is installed, falling back to the standard library.
+"""
+
+import bz2
+import gzip
+import json
+import lzma
+import pathlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from common.misc.logger import logger
+
+
+def _open_zstd(filename: str | pathlib.Path, mode: str = "rb"):
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            f"Reading zstd-compressed file {filename} requires \
+                the zstandard package. Install it with \
+                'pip install zstandard'."
+        )
+    return zstandard.open(filename, mode)
+
+
+# functions opening files for binary reading, by file extension
+OPENERS = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".lzma": lzma.open,
+    ".bz2": bz2.open,
+    ".zst": _open_zstd,
+    ".zstd": _open_zstd,
+}
+
+PARSERS = ["orjson", "json"] if orjson is not None else ["json"]
+
+
+def open_input(filename: str | pathlib.Path):
+    """
+    Open file for binary reading,
+    transparently decompressing it based on its file extension.
+
+    Arguments:
+        filename (str | pathlib.Path): path to file
+
+    Returns file object.
+    """
+    opener = OPENERS.get(pathlib.Path(filename).suffix.lower(), open)
+    return opener(filename, "rb")
+
+
+def load_json(
+    filename: str | pathlib.Path, parser: str | None = None
+) -> dict | list:
+    """
+    Read and parse (compressed) JSON file.
+
+    Arguments:
+        filename (str | pathlib.Path): path to file
+        parser (Optional[str]):
+            JSON parser to use, 'orjson' or 'json'
+            (default: None, use orjson if it is installed)
+
+    Returns parsed content of file.
+
+    Raises:
+        json.decoder.JSONDecodeError:
+            if the content of the file is not valid JSON
+        ValueError:
+            if the requested parser is not available
+    """
+    parser = parser or PARSERS[0]
+    if parser not in PARSERS:
+        raise ValueError(
+            f"JSON parser '{parser}' is not available. \
+                Available parsers are {PARSERS}."
+        )
+    with open_input(filename) as f:
+        content = f.read()
+    logger.debug(f"Parsing {filename} using {parser}.")
+    if parser == "orjson":
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return orjson.loads(content)
+    return json.loads(content)
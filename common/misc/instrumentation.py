@@ -0,0 +1,457 @@
+"""
+Timing and call counting of the steps of a combination.
+Steps are timed with span, and events like model builds, hypotests and
+likelihood evaluations are counted with count. Both are only recorded
+after enable was called, otherwise they return immediately.
+Spans and counters recorded in worker processes with call_recorded are
+added to those of the main process with merge.
+The recorded spans and counters are summarised in a table with summary,
+and can be exported as a Chrome trace with write_trace, which can be
+viewed e.g. in chrome://tracing or https://ui.perfetto.dev.
+If enabled with memory=True, spans also record the peak of the memory
+allocated by Python (tracemalloc) and the growth of the peak resident set
+size (RSS) of the process, summarised with memory_summary.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Any, Callable
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+if TYPE_CHECKING:
+    import pyhf
+
+_enabled = False
+_memory = False
+_started_tracemalloc = False
+_lock = threading.Lock()
+# (name, start time in s since the epoch, duration in s, process id,
+# thread id, memory usage or None) of all spans, where memory usage is
+# (peak of traced memory, growth of peak RSS, peak RSS) in bytes
+_spans: list[tuple[str, float, float, int, int, tuple | None]] = []
+_counters: collections.Counter = collections.Counter()
+# (name, time in s since the epoch, value) of every change of a counter
+_counter_events: list[tuple[str, float, int]] = []
+
+
+def enable(memory: bool = False) -> None:
+    """
+    Start recording spans and counters, discarding previous records.
+
+    Arguments:
+        memory (bool):
+            also record memory usage of spans, tracing all memory
+            allocations with tracemalloc, which slows down the
+            combination considerably (default: False)
+    """
+    global _enabled, _memory, _started_tracemalloc
+    reset()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    _memory = memory
+    _enabled = True
+
+
+def disable() -> None:
+    """
+    Stop recording spans and counters.
+    """
+    global _enabled, _memory, _started_tracemalloc
+    _enabled = False
+    _memory = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Discard all recorded spans and counters.
+    """
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _counter_events.clear()
+
+
+def record(
+    name: str,
+    start: float,
+    duration: float,
+    pid: int | None = None,
+    tid: int | None = None,
+    memory: tuple[int, int, int] | None = None,
+) -> None:
+    """
+    Record a span measured elsewhere, e.g. in another process.
+
+    Arguments:
+        name (str): name of span
+        start (float): start time in seconds since the epoch
+        duration (float): duration in seconds
+        pid (Optional[int]):
+            id of process the span ran in (default: None, current process)
+        tid (Optional[int]):
+            id of thread the span ran in (default: None, current thread)
+        memory (Optional[tuple[int, int, int]]):
+            peak of traced memory, growth of peak RSS and peak RSS in bytes
+            (default: None, memory usage not measured)
+    """
+    if not _enabled:
+        return
+    _spans.append(
+        (
+            name,
+            start,
+            duration,
+            os.getpid() if pid is None else pid,
+            threading.get_ident() if tid is None else tid,
+            memory,
+        )
+    )
+
+
+def _max_rss(who: int | None = None) -> int:
+    """
+    Returns peak resident set size of the current process
+    (or of its terminated child processes) in bytes, 0 if not available.
+    """
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(
+        resource.RUSAGE_SELF if who is None else who
+    ).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class _Peak:
+    # peak of traced memory during an active span
+    def __init__(self, value: int):
+        self.value = value
+
+
+# peaks of all spans currently running in any thread
+_active_peaks: list[_Peak] = []
+
+
+def _update_peaks() -> None:
+    # the peak of traced memory is global to the process, so the peak
+    # since the last update is attributed to all spans running now,
+    # and reset for the next update
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for active_peak in _active_peaks:
+        active_peak.value = max(active_peak.value, peak)
+
+
+@contextlib.contextmanager
+def _span(name: str):
+    start = time.time()
+    start_counter = time.perf_counter()
+    peak = None
+    if _memory:
+        with _lock:
+            _update_peaks()
+            peak = _Peak(tracemalloc.get_traced_memory()[0])
+            _active_peaks.append(peak)
+        start_max_rss = _max_rss()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start_counter
+        memory = None
+        if peak is not None:
+            with _lock:
+                _update_peaks()
+                _active_peaks.remove(peak)
+            max_rss = _max_rss()
+            memory = (peak.value, max_rss - start_max_rss, max_rss)
+        record(name, start, duration, memory=memory)
+
+
+def span(name: str):
+    """
+    Context manager timing the code run inside it, if recording is enabled.
+
+    Arguments:
+        name (str): name of span, spans with the same name are summarised
+    """
+    if not _enabled:
+        return contextlib.nullcontext()
+    return _span(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    """
+    Increase a counter, if recording is enabled.
+
+    Arguments:
+        name (str): name of counter
+        n (int): increment (default: 1)
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+        _counter_events.append((name, time.time(), _counters[name]))
+
+
+def counters() -> dict[str, int]:
+    """
+    Returns current value of all counters, with the counter name as key.
+    """
+    with _lock:
+        return dict(_counters)
+
+
+def settings() -> dict | None:
+    """
+    Returns arguments of enable to record spans and counters
+    in worker processes in the same way, None if recording is disabled.
+    """
+    if not _enabled:
+        return None
+    return {"memory": _memory}
+
+
+def call_recorded(
+    recording_settings: dict | None, function: Callable, *args, **kwargs
+) -> tuple[Any, dict | None]:
+    """
+    Call function, recording spans and counters inside it,
+    e.g. in a worker process.
+
+    Arguments:
+        recording_settings (Optional[dict]):
+            arguments of enable returned by settings,
+            None to call function without recording
+        function (Callable): function to call
+        *args, **kwargs: arguments of function
+
+    Returns result of function and the spans and counters recorded while it
+    ran, to be passed to merge, or None if recording_settings is None.
+    """
+    if recording_settings is None:
+        return function(*args, **kwargs), None
+    enable(**recording_settings)
+    try:
+        result = function(*args, **kwargs)
+        with _lock:
+            records = {"spans": list(_spans), "counters": dict(_counters)}
+    finally:
+        disable()
+    return result, records
+
+
+def merge(records: dict | None) -> None:
+    """
+    Add spans and counters returned by call_recorded, if recording is enabled.
+
+    Arguments:
+        records (Optional[dict]):
+            spans and counters recorded in another process,
+            None if they were not recorded
+    """
+    if records is None:
+        return
+    for recorded_span in records["spans"]:
+        record(*recorded_span)
+    for name, value in records["counters"].items():
+        count(name, value)
+
+
+class _CountingLogpdf:
+    # a class instead of a closure, so models can be pickled while counting
+    def __init__(self, logpdf, counter: LogpdfCounter):
+        self.logpdf = logpdf
+        self.counter = counter
+
+    def __call__(self, *args, **kwargs):
+        self.counter.calls += 1
+        return self.logpdf(*args, **kwargs)
+
+
+class LogpdfCounter:
+    """
+    Counts evaluations of the likelihood of a model,
+    i.e. calls of the objective function by the minimizer.
+    With the jax backend, the compiled likelihood is not counted.
+    """
+
+    def __init__(self, model: pyhf.pdf.Model):
+        self.model = model
+        self.calls = 0
+
+    def __enter__(self):
+        # counters can be nested, the innermost one is called first
+        self._previous = self.model.__dict__.get("logpdf")
+        self.model.logpdf = _CountingLogpdf(self.model.logpdf, self)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._previous is None:
+            del self.model.logpdf
+        else:
+            self.model.logpdf = self._previous
+
+    def __getstate__(self):
+        # copies in other processes do not count into this counter
+        return {"calls": self.calls}
+
+
+@contextlib.contextmanager
+def likelihood_evaluations(model: pyhf.pdf.Model):
+    """
+    Context manager counting the evaluations of the likelihood of a model
+    inside it in the counter 'likelihood evaluations',
+    if recording is enabled.
+
+    Arguments:
+        model (pyhf.pdf.Model): model to count likelihood evaluations of
+    """
+    if not _enabled:
+        yield
+        return
+    with LogpdfCounter(model) as counter:
+        try:
+            yield
+        finally:
+            count("likelihood evaluations", counter.calls)
+
+
+def summary() -> str:
+    """
+    Returns table of the number of calls, total, mean and maximum duration
+    of all spans, ordered by total duration, and of all counters.
+    """
+    with _lock:
+        spans = list(_spans)
+        counter_values = dict(_counters)
+    durations: dict[str, list[float]] = collections.defaultdict(list)
+    for name, _, duration, _, _, _ in spans:
+        durations[name].append(duration)
+
+    lines = [
+        f"{'span':<40} {'calls':>7} {'total [s]':>10} "
+        f"{'mean [s]':>9} {'max [s]':>8}"
+    ]
+    for name, values in sorted(durations.items(), key=lambda x: -sum(x[1])):
+        lines.append(
+            f"{name:<40} {len(values):>7} {sum(values):>10.3f} "
+            f"{sum(values) / len(values):>9.3f} {max(values):>8.3f}"
+        )
+    if counter_values:
+        lines.append("")
+        lines.append(f"{'counter':<40} {'value':>7}")
+        for name, value in sorted(counter_values.items()):
+            lines.append(f"{name:<40} {value:>7}")
+    return "\n".join(lines)
+
+
+def memory_summary() -> str:
+    """
+    Returns table of the number of calls, the maximum peak of traced
+    memory, the total growth of the peak RSS and the peak RSS at the end
+    of all spans with memory usage, ordered by peak of traced memory,
+    followed by the peak RSS of the process and of its child processes.
+    Peaks are those of the whole process while a span was running,
+    including other spans running at the same time.
+    """
+    with _lock:
+        spans = [span for span in _spans if span[5] is not None]
+    usage: dict[str, list[int]] = {}
+    calls: collections.Counter = collections.Counter()
+    for name, _, _, _, _, (peak, rss_growth, max_rss) in spans:
+        previous = usage.get(name, [0, 0, 0])
+        usage[name] = [
+            max(previous[0], peak),
+            previous[1] + rss_growth,
+            max(previous[2], max_rss),
+        ]
+        calls[name] += 1
+
+    megabyte = 1024**2
+    lines = [
+        f"{'span':<40} {'calls':>7} {'peak traced [MB]':>17} "
+        f"{'RSS growth [MB]':>16} {'peak RSS [MB]':>14}"
+    ]
+    for name, (peak, rss_growth, max_rss) in sorted(
+        usage.items(), key=lambda x: -x[1][0]
+    ):
+        lines.append(
+            f"{name:<40} {calls[name]:>7} {peak / megabyte:>17.1f} "
+            f"{rss_growth / megabyte:>16.1f} {max_rss / megabyte:>14.1f}"
+        )
+    lines.append("")
+    lines.append(f"peak RSS of process [MB]: {_max_rss() / megabyte:.1f}")
+    if resource is not None:
+        children = _max_rss(resource.RUSAGE_CHILDREN)
+        lines.append(
+            f"peak RSS of child processes [MB]: {children / megabyte:.1f}"
+        )
+    return "\n".join(lines)
+
+
+def write_trace(filename: str | pathlib.Path) -> None:
+    """
+    Write all recorded spans and counters to a file
+    in the Chrome trace event format.
+
+    Arguments:
+        filename (str | pathlib.Path): path of output file
+    """
+    with _lock:
+        spans = list(_spans)
+        counter_events = list(_counter_events)
+    pid = os.getpid()
+    events = [
+        {
+            "name": name,
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": duration * 1e6,
+            "pid": span_pid,
+            "tid": tid,
+            "args": (
+                {}
+                if memory is None
+                else {
+                    "peak_traced_bytes": memory[0],
+                    "rss_growth_bytes": memory[1],
+                    "peak_rss_bytes": memory[2],
+                }
+            ),
+        }
+        for name, start, duration, span_pid, tid, memory in spans
+    ]
+    events.extend(
+        {
+            "name": name,
+            "ph": "C",
+            "ts": timestamp * 1e6,
+            "pid": pid,
+            "args": {name: value},
+        }
+        for name, timestamp, value in counter_events
+    )
+    with open(filename, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
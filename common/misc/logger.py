@@ -6,3 +6,7 @@ The settings are actually done in 'main' in combine.py.
 import logging
 
 logger = logging
+
+# format of logging messages
+FORMAT = "%(asctime)s [%(levelname)4s]: %(message)s"
+DATE_FORMAT = "%H:%M:%S"
@@ -0,0 +1,140 @@
+"""
+Structured bundle of the fit and limit results of all models.
+The arrays of all models are stored in a single .npz file, and labels,
+parameter types and scalar results in a JSON manifest next to it.
+Both are written in one go, and can be loaded with numpy only,
+without importing pyhf or cabinetry.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import tempfile
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from common.misc.logger import logger
+
+if TYPE_CHECKING:
+    import cabinetry
+
+# increase whenever the layout of the bundle changes
+RESULTS_VERSION = 1
+
+FIT_ARRAYS = ["bestfit", "uncertainty", "corr_mat"]
+LIMIT_ARRAYS = ["expected_limit", "observed_CLs", "expected_CLs", "poi_values"]
+
+
+def _write_atomic(path: pathlib.Path, write) -> None:
+    # the file is written to a temporary location first and then moved,
+    # so readers never see incomplete files
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_results(
+    output_folder: str | pathlib.Path,
+    fit_results: dict[str, cabinetry.fit.FitResults],
+    limit_results: dict[str, cabinetry.fit.LimitResults | None],
+    name: str = "results",
+) -> None:
+    """
+    Write fit and limit results of several models
+    into <output_folder>/<name>.npz and <output_folder>/<name>.json.
+
+    Arguments:
+        output_folder (str | pathlib.Path): directory to store results in
+        fit_results (dict[str, cabinetry.fit.FitResults]):
+            fit results, with the model name as key
+        limit_results (dict[str, Optional[cabinetry.fit.LimitResults]]):
+            limit results, with the model name as key,
+            models without limit results can be missing or None
+        name (str): name of the files without suffix (default: 'results')
+    """
+    output_folder = pathlib.Path(output_folder)
+    arrays: dict[str, np.ndarray] = {}
+    manifest: dict = {"version": RESULTS_VERSION, "models": {}}
+    for model in dict.fromkeys([*fit_results, *limit_results]):
+        entry: dict = {"fit": None, "limit": None}
+        fit = fit_results.get(model)
+        if fit is not None:
+            for field in FIT_ARRAYS:
+                arrays[f"{model}/{field}"] = np.asarray(getattr(fit, field))
+            entry["fit"] = {
+                "labels": list(fit.labels),
+                # filled by WorkspaceBase.fit_results from the model
+                "types": list(fit.types),
+                "best_twice_nll": float(fit.best_twice_nll),
+                "goodness_of_fit": float(fit.goodness_of_fit),
+            }
+        limit = limit_results.get(model)
+        if limit is not None:
+            for field in LIMIT_ARRAYS:
+                arrays[f"{model}/{field}"] = np.asarray(getattr(limit, field))
+            entry["limit"] = {
+                "observed_limit": float(limit.observed_limit),
+                "confidence_level": float(limit.confidence_level),
+            }
+        manifest["models"][model] = entry
+
+    # the manifest is written last, so a manifest always comes with arrays
+    _write_atomic(
+        output_folder / f"{name}.npz", lambda f: np.savez(f, **arrays)
+    )
+    _write_atomic(
+        output_folder / f"{name}.json",
+        lambda f: f.write(json.dumps(manifest, indent=4).encode()),
+    )
+    logger.info(
+        f"Written results of {len(manifest['models'])} models \
+            to {output_folder / name}.npz."
+    )
+
+
+def load_results(
+    output_folder: str | pathlib.Path, name: str = "results"
+) -> dict[str, dict]:
+    """
+    Load fit and limit results written with write_results.
+
+    Arguments:
+        output_folder (str | pathlib.Path): directory containing the results
+        name (str): name of the files without suffix (default: 'results')
+
+    Returns dictionary with the model name as key, and a dictionary with
+    keys 'fit' and 'limit' as value. Both contain the fields of
+    cabinetry.fit.FitResults and cabinetry.fit.LimitResults respectively,
+    or are None if the results of the model were not written.
+
+    Raises:
+        ValueError: if the results were written with a different layout
+    """
+    output_folder = pathlib.Path(output_folder)
+    with open(output_folder / f"{name}.json", "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != RESULTS_VERSION:
+        raise ValueError(
+            f"Results in {output_folder / name}.json have version \
+                {manifest.get('version')}, expected {RESULTS_VERSION}."
+        )
+    results = {}
+    with np.load(output_folder / f"{name}.npz") as arrays:
+        for model, entry in manifest["models"].items():
+            result: dict = {"fit": None, "limit": None}
+            for key, fields in [("fit", FIT_ARRAYS), ("limit", LIMIT_ARRAYS)]:
+                if entry[key] is None:
+                    continue
+                result[key] = dict(entry[key])
+                for field in fields:
+                    result[key][field] = arrays[f"{model}/{field}"]
+            results[model] = result
+    return results
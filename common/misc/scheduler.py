@@ -0,0 +1,173 @@
+"""
+Execution of a pipeline expressed as named stages with dependencies.
+Stages whose dependencies are done run in parallel threads, unless they
+need the same resource, e.g. the global pyhf backend or matplotlib.
+"""
+
+import concurrent.futures
+import dataclasses
+from typing import Any, Callable
+
+import common.misc.instrumentation
+from common.misc.logger import logger
+
+
+@dataclasses.dataclass(frozen=True)
+class Stage:
+    """
+    Named step of a pipeline.
+
+    Arguments:
+        name (str): name of stage
+        run (Callable):
+            function running the stage, called with the results of
+            the dependencies in the order they are listed
+        dependencies (tuple[str, ...]):
+            names of stages which have to finish before this stage
+            (default: (), no dependencies)
+        resources (tuple[str, ...]):
+            names of resources used by the stage, stages using the same
+            resource never run at the same time (default: (), no resources)
+    """
+
+    name: str
+    run: Callable[..., Any]
+    dependencies: tuple[str, ...] = ()
+    resources: tuple[str, ...] = ()
+
+
+def _run_stage(stage: Stage, *results) -> Any:
+    with common.misc.instrumentation.span(f"stage {stage.name}"):
+        return stage.run(*results)
+
+
+class Scheduler:
+    """
+    Runs stages of a pipeline in parallel threads,
+    respecting their dependencies and resources.
+
+    Arguments:
+        stages (list[Stage]): all stages of the pipeline
+
+    Raises:
+        ValueError:
+            if names of stages are not unique, or if a stage
+            depends on an unknown stage
+    """
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Names of stages have to be unique.")
+        for stage in stages:
+            for dependency in stage.dependencies:
+                if dependency not in self.stages:
+                    raise ValueError(
+                        f"Stage {stage.name} depends on \
+                            unknown stage {dependency}."
+                    )
+
+    def resolve(self, names: list[str] | None = None) -> list[str]:
+        """
+        Find stages to run for the requested stages.
+
+        Arguments:
+            names (Optional[list[str]]):
+                names of requested stages (default: None, all stages)
+
+        Returns names of the requested stages and all stages they depend on,
+        in an order in which they can be run one after the other.
+
+        Raises:
+            ValueError:
+                if a requested stage is unknown,
+                or if the dependencies of the stages contain a cycle
+        """
+        if names is None:
+            names = list(self.stages)
+        for name in names:
+            if name not in self.stages:
+                raise ValueError(
+                    f"Stage '{name}' is not valid. \
+                        Available stages are {list(self.stages)}."
+                )
+
+        order: list[str] = []
+        visiting: set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependencies of stage {name} are cyclic.")
+            visiting.add(name)
+            for dependency in self.stages[name].dependencies:
+                visit(dependency)
+            visiting.remove(name)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def run(self, names: list[str] | None = None) -> dict[str, Any]:
+        """
+        Run the requested stages and all stages they depend on.
+
+        Stages are started as soon as their dependencies are done and
+        none of their resources is in use, in the order they were given in.
+        If a stage fails, no further stages are started, and the error
+        is raised once the running stages have finished.
+
+        Arguments:
+            names (Optional[list[str]]):
+                names of requested stages (default: None, all stages)
+
+        Returns dictionary of results, with the stage name as key.
+        """
+        requested = set(self.resolve(names))
+        pending = [name for name in self.stages if name in requested]
+        logger.debug(f"Running stages {pending}.")
+        results: dict[str, Any] = {}
+        running: dict[concurrent.futures.Future, Stage] = {}
+        error = None
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, len(pending))
+        ) as executor:
+            while running or (pending and error is None):
+                busy = {
+                    resource
+                    for stage in running.values()
+                    for resource in stage.resources
+                }
+                for name in list(pending) if error is None else []:
+                    stage = self.stages[name]
+                    if any(dep not in results for dep in stage.dependencies):
+                        continue
+                    if busy.intersection(stage.resources):
+                        continue
+                    logger.debug(f"Starting stage {name}.")
+                    future = executor.submit(
+                        _run_stage,
+                        stage,
+                        *[results[dep] for dep in stage.dependencies],
+                    )
+                    running[future] = stage
+                    busy.update(stage.resources)
+                    pending.remove(name)
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        results[stage.name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Stage {stage.name} failed: {e}")
+                        error = error or e
+                    else:
+                        logger.debug(f"Finished stage {stage.name}.")
+        if error is not None:
+            raise error
+        return results
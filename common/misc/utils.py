@@ -1,7 +1,25 @@
 import argparse
+import decimal
+import itertools
 
+import common.misc.backend
 from common.misc.logger import logger
 
+# names of the stages of a combination, see get_stages in combine.py
+STAGES = [
+    "modifier_grid",
+    "fit",
+    "fit_results",
+    "pulls",
+    "correlation_matrix",
+    "normfactors",
+    "limits",
+    "comparisons",
+    "limit_comparison",
+    "results",
+    "ranking",
+]
+
 
 def parse_parameters(parameter_list: list[str] | None) -> dict:
     """
@@ -29,6 +47,75 @@ def parse_parameters(parameter_list: list[str] | None) -> dict:
     return parameter_dict
 
 
+def expand_parameter_values(value: str) -> list[str]:
+    """
+    Expand the value of a single parameter into the list of values to scan.
+
+    Supported formats are a single value ('1300'),
+    a comma-separated list of values ('1000,1300,1600'),
+    and an inclusive range with step size ('1000:2000:100').
+
+    Arguments:
+        value (str): value of parameter as provided on the command-line
+
+    Returns list of values as strings.
+
+    Raises:
+        ValueError:
+            if the range is not given as start:stop:step
+            or if the step size is not positive
+    """
+    if "," in value:
+        return [v for v in value.split(",") if v]
+    if ":" not in value:
+        return [value]
+
+    try:
+        start, stop, step = (decimal.Decimal(v) for v in value.split(":"))
+    except (ValueError, decimal.InvalidOperation):
+        raise ValueError(
+            f"Cannot parse parameter range '{value}'. \
+                Expected format is start:stop:step."
+        )
+    if step <= 0:
+        raise ValueError(
+            f"Step size in parameter range '{value}' must be positive."
+        )
+
+    values = []
+    current = start
+    while current <= stop:
+        values.append(str(current))
+        current += step
+    return values
+
+
+def parse_parameter_scan(parameter_list: list[str] | None) -> list[dict]:
+    """
+    Split parameters provided as a list of strings representing
+    key-value pairs separated by an equal-sign, where values can
+    be ranges or lists (see expand_parameter_values), and build
+    all combinations of parameter values.
+
+    Arguments:
+        parameter_list (Optional[list[str]]):
+            list of strings containing key-value pairs separated by =
+
+    Returns:
+        list of parameter dictionaries, one for each point of the scan,
+            with the name as key and the value as value.
+        a list containing an empty dictionary if parameter_list is None.
+    """
+    parameter_dict = parse_parameters(parameter_list)
+    values = [expand_parameter_values(v) for v in parameter_dict.values()]
+    points = [
+        dict(zip(parameter_dict.keys(), point))
+        for point in itertools.product(*values)
+    ]
+    logger.debug(f"Expanded parameters into {len(points)} scan points.")
+    return points
+
+
 def get_parameter_index_in_measurement(
     measurement: dict, parameter_name: str
 ) -> int:
@@ -54,6 +141,28 @@ def get_parameter_index_in_measurement(
     raise ValueError("Could not find parameter with name {parameter_name}.")
 
 
+def parse_stages(value: str) -> list[str]:
+    """
+    Split comma-separated list of stage names and check that they are valid,
+    so that misspelled stages are found before any workspace is loaded.
+
+    Arguments:
+        value (str): comma-separated list of stage names
+
+    Returns list of stage names.
+
+    Raises:
+        argparse.ArgumentTypeError: if any of the stages is not in STAGES
+    """
+    stages = [stage for stage in value.split(",") if stage]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"Unknown stages {unknown}. Available stages are {STAGES}."
+        )
+    return stages
+
+
 def parse_arguments() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
 
@@ -71,7 +180,17 @@ def parse_arguments() -> argparse.Namespace:
         nargs="+",
         dest="parameters",
         help="Whitespace-separated list of key-value pairs \
-                to be used as parameters.",
+                to be used as parameters. Values can be given as \
+                comma-separated lists or as ranges start:stop:step \
+                to scan several parameter points.",
+    )
+    parser.add_argument(
+        "--scan-workers",
+        dest="scan_workers",
+        type=int,
+        default=None,
+        help="Number of worker processes used when scanning \
+                several parameter points (default: number of CPUs).",
     )
     parser.add_argument(
         "-c",
@@ -86,6 +205,53 @@ def parse_arguments() -> argparse.Namespace:
         default="output",
         help="Directory to store output in.",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to load and modify \
+                the workspaces of the analyses concurrently, and to run \
+                their fits and limits with --fit-comparisons while the \
+                combined workspace is evaluated (default: 1).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        default=None,
+        help="Directory of on-disk cache for modified workspaces \
+                and hypotest results. Caching is disabled if not provided.",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        dest="cache_max_size",
+        type=int,
+        default=100,
+        help="Maximum size of cached hypotest results in MB. \
+                Least recently used results are removed first \
+                (default: 100).",
+    )
+    parser.add_argument(
+        "--stages",
+        dest="stages",
+        type=parse_stages,
+        default=None,
+        help="Comma-separated list of stages to run, e.g. 'fit,limits'. \
+                Stages they depend on are run as well. Available stages \
+                are modifier_grid, fit, fit_results, pulls, \
+                correlation_matrix, normfactors, limits, comparisons, \
+                limit_comparison, results and ranking (default: all stages \
+                enabled by the other options).",
+    )
+    parser.add_argument(
+        "--no-plots",
+        dest="no_plots",
+        action="store_true",
+        help="Set flag to skip all figures, including the ranking, \
+                which is only used for its figure. \
+                matplotlib is not used then.",
+    )
     parser.add_argument(
         "--output-level",
         dest="output_level",
@@ -101,6 +267,35 @@ def parse_arguments() -> argparse.Namespace:
         action="store_true",
         help="Set flag to obtain ranking plot.",
     )
+    parser.add_argument(
+        "--ranking-mode",
+        dest="ranking_mode",
+        choices=["approx", "full", "hybrid"],
+        default="full",
+        help="Method to calculate the impacts for the ranking. \
+                'full' runs fits for all parameters, 'approx' approximates \
+                the impacts from the correlation matrix without fits, \
+                'hybrid' runs fits for the parameters with the largest \
+                approximate impacts (default: 'full').",
+    )
+    parser.add_argument(
+        "--ranking-refits",
+        dest="ranking_refits",
+        type=int,
+        default=20,
+        help="Number of parameters with the largest approximate impacts \
+                for which fits are run with '--ranking-mode hybrid' \
+                (default: 20).",
+    )
+    parser.add_argument(
+        "--ranking-workers",
+        dest="ranking_workers",
+        type=int,
+        default=None,
+        help="Number of worker processes running the fits \
+                for the ranking (default: number of CPUs, divided by \
+                the number of scan workers when scanning parameters).",
+    )
     parser.add_argument(
         "--fit-comparisons",
         dest="fit_comparisons",
@@ -111,11 +306,79 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument(
         "--limit-method",
         dest="limit_method",
-        choices=["bisect", "default"],
+        choices=["asimov", "bisect", "brent", "default", "ksection"],
         default="default",
         help="Method to use for limit setting. \
-                Options are 'default' and 'bisect'. \
-                Default choice is 'default'.",
+                Options are 'default', 'bisect', 'ksection', 'asimov' \
+                and 'brent'. Default choice is 'default'.",
+    )
+    parser.add_argument(
+        "--limit-workers",
+        dest="limit_workers",
+        type=int,
+        default=None,
+        help="Number of worker processes evaluating hypotests in parallel \
+                for limit setting with the 'bisect' and 'ksection' methods. \
+                The expected limit scan is distributed over all workers, \
+                the 'ksection' method also tests this number of POI values \
+                per iteration for the observed limit. Limits obtained with \
+                different numbers of workers agree within the tolerance \
+                of the minimizer (default: number of CPUs, divided by \
+                the number of scan workers when scanning parameters).",
+    )
+    parser.add_argument(
+        "--backend",
+        dest="backend",
+        choices=common.misc.backend.BACKENDS,
+        default="numpy",
+        help="pyhf tensor backend used for fits and limit setting \
+                (default: numpy).",
+    )
+    parser.add_argument(
+        "--optimizer",
+        dest="optimizer",
+        choices=common.misc.backend.OPTIMIZERS,
+        default="scipy",
+        help="pyhf optimizer used for limit setting. Fits and rankings \
+                always use minuit (default: scipy).",
+    )
+    parser.add_argument(
+        "--precision",
+        dest="precision",
+        choices=common.misc.backend.PRECISIONS,
+        default="64b",
+        help="Floating point precision of the backend (default: 64b).",
+    )
+    parser.add_argument(
+        "--jit-warmup",
+        dest="jit_warmup",
+        action="store_true",
+        help="Set flag to compile the likelihoods before they are used \
+                with the jax backend.",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        help="Set flag to time the steps of the combination and count \
+                model builds, hypotests and likelihood evaluations. \
+                A summary table is logged at the end of each parameter \
+                point.",
+    )
+    parser.add_argument(
+        "--trace",
+        dest="trace",
+        action="store_true",
+        help="Set flag to profile like --profile and additionally write \
+                the timeline to trace.json in the Chrome trace format.",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        dest="profile_memory",
+        action="store_true",
+        help="Set flag to record the peak memory usage of each stage and \
+                each workspace modification and write it to memory.txt. \
+                Tracing memory allocations slows down the combination.",
     )
 
     args = parser.parse_args()
@@ -1,15 +1,24 @@
-import pathlib
+"""
+Figures of fit and limit results.
+cabinetry and the modules using matplotlib are only imported
+when a figure is created.
+"""
+
+from __future__ import annotations
 
-import cabinetry
-import pyhf
+import pathlib
+from typing import TYPE_CHECKING
 
-import common.plotting.normalisation
-import common.plotting.limits
+if TYPE_CHECKING:
+    import cabinetry
+    import pyhf
 
 
 def modifier_grid(
     model: pyhf.pdf.Model, figure_folder: str | pathlib.Path = ""
 ) -> None:
+    import cabinetry
+
     cabinetry.visualize.modifier_grid(model=model, figure_folder=figure_folder)
 
 
@@ -18,6 +27,8 @@ def norm_factors(
     figure_folder: str | pathlib.Path = "",
     model_names: list[str] | None = None,
 ) -> None:
+    import common.plotting.normalisation
+
     common.plotting.normalisation.norm_factors(
         fit_results=fit_results,
         figure_folder=figure_folder,
@@ -29,6 +40,8 @@ def pull_plot(
     fit_results: cabinetry.fit.FitResults,
     figure_folder: str | pathlib.Path = "",
 ) -> None:
+    import cabinetry
+
     cabinetry.visualize.pulls(
         fit_results=fit_results, figure_folder=figure_folder
     )
@@ -39,6 +52,8 @@ def correlation_matrix(
     figure_folder: str | pathlib.Path = "",
     pruning_threshold=0.1,
 ) -> None:
+    import cabinetry
+
     cabinetry.visualize.correlation_matrix(
         fit_results=fit_results,
         figure_folder=figure_folder,
@@ -50,6 +65,8 @@ def ranking(
     ranking_results: cabinetry.fit.RankingResults,
     figure_folder: str | pathlib.Path = "",
 ) -> None:
+    import cabinetry
+
     cabinetry.visualize.ranking(
         ranking_results=ranking_results, figure_folder=figure_folder
     )
@@ -60,6 +77,8 @@ def limit_comparison(
     figure_folder: str | pathlib.Path = "",
     model_names: list[str] | None = None,
 ) -> None:
+    import common.plotting.limits
+
     common.plotting.limits.limit_comparison(
         limit_results=limit_results,
         figure_folder=figure_folder,
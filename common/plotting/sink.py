@@ -0,0 +1,104 @@
+"""
+Background process creating figures.
+Figures are queued by the pipeline and created one after the other in a
+separate process using the non-interactive Agg backend of matplotlib,
+while the fits continue in the main process.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+import common.misc.instrumentation
+from common.misc.logger import logger
+
+
+def _init_plotting(output_level: int) -> None:
+    import matplotlib
+
+    import common.misc.logger
+
+    matplotlib.use("Agg")
+    logger.basicConfig(
+        level=output_level,
+        format=common.misc.logger.FORMAT,
+        datefmt=common.misc.logger.DATE_FORMAT,
+    )
+
+
+def _plot(name: str, kwargs: dict) -> tuple[float, float, int]:
+    """
+    Create a figure.
+
+    Returns start time in seconds since the epoch, duration in seconds
+    and id of the process, to record the figure creation as a span.
+    """
+    import common.plotting
+
+    start = time.time()
+    start_counter = time.perf_counter()
+    getattr(common.plotting, name)(**kwargs)
+    return start, time.perf_counter() - start_counter, os.getpid()
+
+
+class PlotSink:
+    """
+    Queue of figures created in a background process.
+
+    Arguments:
+        output_level (int):
+            output level for logging messages of the background process
+            (default: 20, INFO)
+    """
+
+    def __init__(self, output_level: int = 20):
+        # the process is started from a fresh interpreter, as the pipeline
+        # runs several threads when the first figure is queued
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_plotting,
+            initargs=(output_level,),
+        )
+        self._futures: list[tuple[str, concurrent.futures.Future]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None:
+            self._executor.shutdown(cancel_futures=True)
+            return
+        self.close()
+
+    def submit(self, name: str, **kwargs) -> None:
+        """
+        Queue a figure.
+
+        Arguments:
+            name (str): name of function in common.plotting creating it
+            **kwargs: arguments of the function, which have to be picklable
+        """
+        logger.debug(f"Queueing figure {name}.")
+        self._futures.append((name, self._executor.submit(_plot, name, kwargs)))
+
+    def close(self) -> None:
+        """
+        Wait until all queued figures are created
+        and shut down the background process.
+
+        Raises:
+            RuntimeError: if any of the figures could not be created
+        """
+        try:
+            for name, future in self._futures:
+                try:
+                    start, duration, pid = future.result()
+                except Exception as e:
+                    raise RuntimeError(f"Creating figure {name} failed.") from e
+                common.misc.instrumentation.record(
+                    f"figure {name}", start, duration, pid=pid, tid=0
+                )
+        finally:
+            self._executor.shutdown(cancel_futures=True)
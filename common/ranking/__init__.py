@@ -0,0 +1,363 @@
+"""
+Ranking of nuisance parameters by their impact on the POI.
+The fits with each nuisance parameter held constant are independent of
+each other and are distributed over a pool of worker processes.
+"""
+
+import concurrent.futures
+import multiprocessing
+
+import cabinetry
+import numpy as np
+import pyhf
+
+import common.misc.instrumentation
+from common.misc.backend import Backend
+from common.misc.logger import logger
+
+# model, data and fit settings of a worker process,
+# set once per process by _init_worker
+_worker_state: dict = {}
+
+
+def _fit_backend() -> Backend:
+    # the nominal fit of cabinetry uses minuit,
+    # the impact fits use the same optimizer
+    return Backend(pyhf.tensorlib.name, "minuit", pyhf.tensorlib.precision)
+
+
+def _impact_fit(
+    task: tuple[int, float],
+    model: pyhf.pdf.Model,
+    data: list[float],
+    fit_kwargs: dict,
+) -> float:
+    """
+    Fit the model with one parameter held constant at the given value.
+    The fit starts from the best-fit parameters of the nominal fit.
+
+    Returns fitted value of the POI.
+    """
+    i_par, value = task
+    init_pars = list(fit_kwargs["init_pars"])
+    init_pars[i_par] = value
+    fixed_params = list(fit_kwargs["fixed_params"])
+    fixed_params[i_par] = True
+    try:
+        bestfit = pyhf.infer.mle.fit(
+            data,
+            model,
+            init_pars=init_pars,
+            par_bounds=fit_kwargs["par_bounds"],
+            fixed_params=fixed_params,
+        )
+    except Exception as e:
+        raise RuntimeError(
+            f"Impact fit failed for parameter \
+                {model.config.par_names[i_par]} at value {value}."
+        ) from e
+    return float(bestfit[model.config.poi_index])
+
+
+def _init_worker(
+    model_spec: dict,
+    poi_name: str,
+    data: list[float],
+    fit_kwargs: dict,
+    backend: Backend,
+) -> None:
+    pyhf.set_backend(
+        backend.name, backend.optimizer, precision=backend.precision
+    )
+    _worker_state["model"] = pyhf.pdf.Model(model_spec, poi_name=poi_name)
+    _worker_state["data"] = data
+    _worker_state["fit_kwargs"] = fit_kwargs
+
+
+def _worker_impact_fit(task: tuple[int, float]) -> float:
+    return _impact_fit(
+        task,
+        _worker_state["model"],
+        _worker_state["data"],
+        _worker_state["fit_kwargs"],
+    )
+
+
+def _fitted_impacts(
+    model: pyhf.pdf.Model,
+    data: list[float],
+    fit_results: cabinetry.fit.FitResults,
+    nps: list[int],
+    fix_pars: list[bool] | None,
+    par_bounds: list[tuple[float, float]] | None,
+    n_workers: int,
+) -> np.ndarray:
+    """
+    Calculate the impacts of the given parameters on the POI from fits
+    with each parameter held constant, distributing the fits over a pool
+    of worker processes.
+
+    Returns array of pre-fit up, pre-fit down, post-fit up and post-fit down
+    impact for each parameter in nps.
+    """
+    prefit_unc = cabinetry.model_utils.prefit_uncertainties(model)
+    init_pars = [float(par) for par in fit_results.bestfit]
+    if par_bounds is not None:
+        # best-fit parameters might lie outside of bounds used here
+        init_pars = [
+            min(max(par, bounds[0]), bounds[1])
+            for par, bounds in zip(init_pars, par_bounds)
+        ]
+    fit_kwargs = {
+        "init_pars": init_pars,
+        "fixed_params": fix_pars or model.config.suggested_fixed(),
+        "par_bounds": par_bounds,
+    }
+
+    # values of each parameter in the impact fits:
+    # pre-fit up, pre-fit down, post-fit up, post-fit down
+    values = {
+        i_par: [
+            fit_results.bestfit[i_par] + prefit_unc[i_par],
+            fit_results.bestfit[i_par] - prefit_unc[i_par],
+            fit_results.bestfit[i_par] + fit_results.uncertainty[i_par],
+            fit_results.bestfit[i_par] - fit_results.uncertainty[i_par],
+        ]
+        for i_par in nps
+    }
+    # parameters with zero uncertainty have no impact, e.g. fixed parameters
+    # or the pre-fit impact of unconstrained parameters
+    tasks = list(
+        dict.fromkeys(
+            (i_par, float(value))
+            for i_par in nps
+            for value in values[i_par]
+            if value != fit_results.bestfit[i_par]
+        )
+    )
+    logger.info(
+        f"Running {len(tasks)} fits for the ranking of {len(nps)} \
+            parameters using {n_workers} worker processes."
+    )
+
+    common.misc.instrumentation.count("ranking fits", len(tasks))
+    backend = _fit_backend()
+    if n_workers > 1 and len(tasks) > 1:
+        # workers are started from a fresh interpreter, as forking
+        # is unsafe once jax or the threads of the pipeline are running
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                model.spec,
+                model.config.poi_name,
+                [float(d) for d in data],
+                fit_kwargs,
+                backend,
+            ),
+        ) as executor:
+            chunksize = max(1, len(tasks) // (4 * n_workers))
+            try:
+                pois = list(
+                    executor.map(_worker_impact_fit, tasks, chunksize=chunksize)
+                )
+            except concurrent.futures.BrokenExecutor as e:
+                raise RuntimeError(
+                    "Worker process terminated while running ranking fits."
+                ) from e
+    else:
+        with backend.session():
+            pois = [
+                _impact_fit(task, model, data, fit_kwargs) for task in tasks
+            ]
+
+    nominal_poi = fit_results.bestfit[model.config.poi_index]
+    poi_values = dict(zip(tasks, pois))
+    return np.asarray(
+        [
+            [
+                poi_values.get((i_par, float(value)), nominal_poi)
+                - nominal_poi
+                for value in values[i_par]
+            ]
+            for i_par in nps
+        ]
+    ).reshape(len(nps), 4)
+
+
+def _approximate_impacts(
+    model: pyhf.pdf.Model, fit_results: cabinetry.fit.FitResults
+) -> np.ndarray:
+    """
+    Linearised impacts of all parameters but the POI on the POI.
+
+    Returns array of pre-fit up, pre-fit down, post-fit up and post-fit down
+    impact for each parameter but the POI.
+    """
+    poi_index = model.config.poi_index
+    prefit_unc = np.asarray(cabinetry.model_utils.prefit_uncertainties(model))
+    postfit_unc = np.asarray(fit_results.uncertainty)
+    # shifting a parameter by its post-fit uncertainty shifts the POI by
+    # its correlation with the POI times the uncertainty of the POI
+    postfit = fit_results.corr_mat[poi_index] * postfit_unc[poi_index]
+    # and by a shift proportional to it for the pre-fit uncertainty
+    prefit = np.divide(
+        postfit * prefit_unc,
+        postfit_unc,
+        out=np.zeros_like(postfit),
+        where=postfit_unc > 0,
+    )
+    impacts = np.stack([prefit, -prefit, postfit, -postfit], axis=1)
+    return np.delete(impacts, poi_index, axis=0)
+
+
+def _ranking_results(
+    fit_results: cabinetry.fit.FitResults,
+    poi_index: int,
+    impacts: np.ndarray,
+) -> cabinetry.fit.RankingResults:
+    return cabinetry.fit.RankingResults(
+        np.delete(fit_results.bestfit, poi_index),
+        np.delete(fit_results.uncertainty, poi_index),
+        np.delete(fit_results.labels, poi_index).tolist(),
+        *impacts.T,
+    )
+
+
+def _poi_index(model: pyhf.pdf.Model) -> int:
+    if model.config.poi_index is None:
+        raise RuntimeError("Could not retrieve POI index.")
+    return model.config.poi_index
+
+
+def ranking(
+    model: pyhf.pdf.Model,
+    data: list[float],
+    fit_results: cabinetry.fit.FitResults,
+    fix_pars: list[bool] | None = None,
+    par_bounds: list[tuple[float, float]] | None = None,
+    n_workers: int = 1,
+) -> cabinetry.fit.RankingResults:
+    """
+    Calculate the pre- and post-fit impact of all nuisance parameters on
+    the POI like cabinetry.fit.ranking, distributing the fits over a pool
+    of worker processes.
+
+    The impact is the difference between the POI of the nominal fit and
+    the POI of a fit with the nuisance parameter held constant at its
+    best-fit value plus or minus its pre- or post-fit uncertainty.
+    All fits start from the best-fit parameters of the nominal fit.
+
+    Arguments:
+        model (pyhf.pdf.Model): model to use in fits
+        data (list[float]): data (including auxdata) the model is fit to
+        fit_results (cabinetry.fit.FitResults): results of the nominal fit
+        fix_pars (Optional[list[bool]]):
+            parameters held constant in fits (default: None, pyhf suggestion)
+        par_bounds (Optional[list[tuple[float, float]]]):
+            parameter bounds for fits (default: None, pyhf suggestion)
+        n_workers (int):
+            number of worker processes
+            (default: 1, run fits in current process)
+
+    Returns cabinetry.fit.RankingResults.
+
+    Raises:
+        RuntimeError:
+            if the model has no POI, or if any of the fits fails
+    """
+    poi_index = _poi_index(model)
+    nps = [i for i in range(model.config.npars) if i != poi_index]
+    impacts = _fitted_impacts(
+        model, data, fit_results, nps, fix_pars, par_bounds, n_workers
+    )
+    return _ranking_results(fit_results, poi_index, impacts)
+
+
+def ranking_approx(
+    model: pyhf.pdf.Model, fit_results: cabinetry.fit.FitResults
+) -> cabinetry.fit.RankingResults:
+    """
+    Approximate the pre- and post-fit impact of all nuisance parameters
+    on the POI from the correlation matrix of the nominal fit,
+    without any further fits.
+
+    Linearising the likelihood around the best-fit point, holding a
+    nuisance parameter constant at its best-fit value plus or minus its
+    post-fit uncertainty shifts the POI by plus or minus the correlation of
+    the parameter with the POI times the uncertainty of the POI.
+    The pre-fit impact is scaled by the ratio of pre-fit to post-fit
+    uncertainty of the parameter.
+
+    Arguments:
+        model (pyhf.pdf.Model): model used in the nominal fit
+        fit_results (cabinetry.fit.FitResults): results of the nominal fit
+
+    Returns cabinetry.fit.RankingResults.
+
+    Raises:
+        RuntimeError: if the model has no POI
+    """
+    poi_index = _poi_index(model)
+    return _ranking_results(
+        fit_results, poi_index, _approximate_impacts(model, fit_results)
+    )
+
+
+def ranking_hybrid(
+    model: pyhf.pdf.Model,
+    data: list[float],
+    fit_results: cabinetry.fit.FitResults,
+    n_refit: int = 20,
+    fix_pars: list[bool] | None = None,
+    par_bounds: list[tuple[float, float]] | None = None,
+    n_workers: int = 1,
+) -> cabinetry.fit.RankingResults:
+    """
+    Calculate the impact of all nuisance parameters on the POI with
+    ranking_approx, and recalculate the impact of the n_refit parameters
+    with the largest approximate post-fit impact with fits like ranking.
+
+    Arguments:
+        model (pyhf.pdf.Model): model to use in fits
+        data (list[float]): data (including auxdata) the model is fit to
+        fit_results (cabinetry.fit.FitResults): results of the nominal fit
+        n_refit (int):
+            number of parameters for which the impact is calculated
+            with fits (default: 20)
+        fix_pars (Optional[list[bool]]):
+            parameters held constant in fits (default: None, pyhf suggestion)
+        par_bounds (Optional[list[tuple[float, float]]]):
+            parameter bounds for fits (default: None, pyhf suggestion)
+        n_workers (int):
+            number of worker processes
+            (default: 1, run fits in current process)
+
+    Returns cabinetry.fit.RankingResults.
+
+    Raises:
+        RuntimeError:
+            if the model has no POI, or if any of the fits fails
+    """
+    poi_index = _poi_index(model)
+    impacts = _approximate_impacts(model, fit_results)
+    nps = [i for i in range(model.config.npars) if i != poi_index]
+    # parameters are ordered like in the ranking plot,
+    # by the larger of the two post-fit impacts
+    order = np.argsort(-np.max(np.abs(impacts[:, 2:]), axis=1), kind="stable")
+    refit = sorted(order[:n_refit])
+    logger.info(
+        f"Recalculating impact of {len(refit)} of {len(nps)} \
+            parameters with fits."
+    )
+    impacts[refit] = _fitted_impacts(
+        model,
+        data,
+        fit_results,
+        [nps[i] for i in refit],
+        fix_pars,
+        par_bounds,
+        n_workers,
+    )
+    return _ranking_results(fit_results, poi_index, impacts)
@@ -1,5 +1,11 @@
+from common.workspaces.transformations import TransformationPlan
 from common.workspaces.workspacebase import WorkspaceBase
 from common.workspaces.workspace import Workspace
 from common.workspaces.combinedworkspace import CombinedWorkspace
 
-__all__ = ["WorkspaceBase", "Workspace", "CombinedWorkspace"]
+__all__ = [
+    "TransformationPlan",
+    "WorkspaceBase",
+    "Workspace",
+    "CombinedWorkspace",
+]
@@ -1,16 +1,120 @@
 import pyhf
 
+import common.misc.instrumentation
 from common.workspaces.workspacebase import WorkspaceBase
 from common.workspaces.workspace import Workspace
 
 from common.misc.logger import logger
 
 
+def combine_specs(specs: list[dict]) -> pyhf.Workspace:
+    """
+    Combine any number of workspace specifications in a single pass.
+
+    The result is identical to folding pyhf.Workspace.combine
+    with join="outer" and merge_channels=True over all specifications,
+    but the growing combined workspace is neither copied nor validated
+    at every step. The combined specification is validated once at the end.
+
+    Arguments:
+        specs (list[dict]):
+            workspace specifications, e.g. pyhf.Workspaces, to combine
+
+    Returns combined pyhf.Workspace.
+
+    Raises:
+        pyhf.exceptions.InvalidWorkspaceOperation:
+            if the workspaces have different versions, incompatible
+            observations, or measurements with incompatible POIs
+            or parameter configurations
+    """
+    versions = {spec["version"] for spec in specs}
+    if len(versions) > 1:
+        raise pyhf.exceptions.InvalidWorkspaceOperation(
+            f"Workspaces of different versions cannot be combined: {versions}"
+        )
+
+    # channels with the same name are merged,
+    # keeping the first sample of each name
+    channels: dict[str, dict] = {}
+    for spec in specs:
+        for channel in spec["channels"]:
+            if channel["name"] not in channels:
+                channels[channel["name"]] = dict(
+                    channel, samples=list(channel["samples"])
+                )
+                continue
+            samples = channels[channel["name"]]["samples"]
+            sample_names = {sample["name"] for sample in samples}
+            samples.extend(
+                sample
+                for sample in channel["samples"]
+                if sample["name"] not in sample_names
+            )
+
+    # observations with the same name have to be identical
+    observations: dict[str, dict] = {}
+    for spec in specs:
+        for observation in spec["observations"]:
+            existing = observations.setdefault(observation["name"], observation)
+            if existing != observation:
+                raise pyhf.exceptions.InvalidWorkspaceOperation(
+                    f"Workspaces cannot have observations in common \
+                        with incompatible structure: {observation['name']}."
+                )
+
+    # measurements with the same name are merged, their POIs have to be
+    # identical and parameters with the same name have to be identical
+    measurements: dict[str, dict] = {}
+    for spec in specs:
+        for measurement in spec["measurements"]:
+            name = measurement["name"]
+            if name not in measurements:
+                measurements[name] = {
+                    "name": name,
+                    "config": {
+                        "poi": measurement["config"]["poi"],
+                        "parameters": {
+                            parameter["name"]: parameter
+                            for parameter in measurement["config"]["parameters"]
+                        },
+                    },
+                }
+                continue
+            config = measurements[name]["config"]
+            if config["poi"] != measurement["config"]["poi"]:
+                raise pyhf.exceptions.InvalidWorkspaceOperation(
+                    f"Workspaces cannot have the same measurements \
+                        with incompatible POI: {name}."
+                )
+            for parameter in measurement["config"]["parameters"]:
+                existing = config["parameters"].setdefault(
+                    parameter["name"], parameter
+                )
+                if existing != parameter:
+                    raise pyhf.exceptions.InvalidWorkspaceOperation(
+                        f"Workspaces cannot have a measurement ({name}) \
+                            with incompatible parameter configs: \
+                            {parameter['name']}."
+                    )
+    for measurement in measurements.values():
+        measurement["config"]["parameters"] = list(
+            measurement["config"]["parameters"].values()
+        )
+
+    newspec = {
+        "channels": list(channels.values()),
+        "measurements": list(measurements.values()),
+        "observations": list(observations.values()),
+        "version": versions.pop(),
+    }
+    return pyhf.Workspace(newspec)
+
+
 class CombinedWorkspace(WorkspaceBase):
     def __init__(self, name: str, workspaces: list[Workspace]):
-        self.name = name
+        super().__init__(name, self._combine_workspaces(workspaces))
         self.workspaces = workspaces
-        self.ws = self._combine_workspaces(workspaces)
 
     @staticmethod
     def _combine_workspaces(workspaces: list[Workspace]):
@@ -18,9 +122,7 @@ class CombinedWorkspace(WorkspaceBase):
         if len(workspaces) == 1:
             logger.info("There is only one workspace. Nothing to combine.")
             return ws
-        for i_ws in range(1, len(workspaces)):
-            ws = pyhf.Workspace.combine(
-                ws, workspaces[i_ws].ws, join="outer", merge_channels=True
-            )
+        with common.misc.instrumentation.span("combine workspaces"):
+            ws = combine_specs([workspace.ws for workspace in workspaces])
         logger.info(f"Combined {len(workspaces)} workspaces.")
         return ws
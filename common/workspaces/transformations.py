@@ -0,0 +1,534 @@
+import re
+
+import pyhf
+
+import common.misc.utils
+
+from common.misc.logger import logger
+
+
+class _StepContext:
+    """
+    Names present in the workspace before a step of the plan is applied.
+    These are filled during the traversal of the specification.
+    """
+
+    def __init__(self):
+        self.poi: str | None = None
+        self.channels: set[str] = set()
+        self.samples: set[str] = set()
+        self.modifiers: set[str] = set()
+
+
+class _Step:
+    """
+    Base class of a single modification in a TransformationPlan.
+    By default, a step leaves all parts of the workspace unchanged.
+    """
+
+    def channel(self, name: str) -> str | None:
+        """
+        Return new name of channel, or None to remove the channel.
+        """
+        return name
+
+    def sample(self, name: str) -> str:
+        """
+        Return new name of sample.
+        """
+        return name
+
+    def keep_modifier(self, name: str, sample_name: str) -> bool:
+        """
+        Return whether modifier is kept in sample.
+        """
+        return True
+
+    def modifier(self, name: str, context: _StepContext) -> str:
+        """
+        Return new name of modifier.
+        """
+        return name
+
+    def measurement(
+        self, measurement: dict, index: int, context: _StepContext
+    ) -> None:
+        """
+        Modify (copy of) measurement in place.
+        Parameter settings and the POI of modifiers present in the workspace
+        are renamed consistently with the modifiers.
+        """
+        for parameter in measurement["config"]["parameters"]:
+            if parameter["name"] in context.modifiers:
+                parameter["name"] = self.modifier(parameter["name"], context)
+        poi = measurement["config"]["poi"]
+        if poi in context.modifiers:
+            measurement["config"]["poi"] = self.modifier(poi, context)
+
+    def finalise(self, context: _StepContext, workspace_name: str) -> None:
+        """
+        Check consistency of step with names found in the workspace.
+        """
+        pass
+
+
+class _RenameMeasurement(_Step):
+    def __init__(self, name: str):
+        self.name = name
+
+    def measurement(
+        self, measurement: dict, index: int, context: _StepContext
+    ) -> None:
+        # only the default measurement is renamed
+        if index == 0:
+            measurement["name"] = self.name
+
+
+class _RenamePOI(_Step):
+    def __init__(self, poi_name: str):
+        self.poi_name = poi_name
+
+    def modifier(self, name: str, context: _StepContext) -> str:
+        return self.poi_name if name == context.poi else name
+
+    def measurement(
+        self, measurement: dict, index: int, context: _StepContext
+    ) -> None:
+        super().measurement(measurement, index, context)
+        if index == 0:
+            measurement["config"]["poi"] = self.poi_name
+
+    def finalise(self, context: _StepContext, workspace_name: str) -> None:
+        if context.poi not in context.modifiers:
+            raise pyhf.exceptions.InvalidWorkspaceOperation(
+                f"{context.poi} is not one of the modifiers in this workspace."
+            )
+
+
+class _RenameModifiers(_Step):
+    def __init__(self, names: dict[str, str]):
+        self.names = dict(names)
+
+    def modifier(self, name: str, context: _StepContext) -> str:
+        return self.names.get(name, name)
+
+    def finalise(self, context: _StepContext, workspace_name: str) -> None:
+        for name in self.names:
+            if name not in context.modifiers:
+                raise pyhf.exceptions.InvalidWorkspaceOperation(
+                    f"{name} is not one of the modifiers in this workspace."
+                )
+
+
+class _RenameSamples(_Step):
+    def __init__(self, names: dict[str, str]):
+        self.names = dict(names)
+
+    def sample(self, name: str) -> str:
+        return self.names.get(name, name)
+
+    def finalise(self, context: _StepContext, workspace_name: str) -> None:
+        for name in self.names:
+            if name not in context.samples:
+                raise pyhf.exceptions.InvalidWorkspaceOperation(
+                    f"{name} is not one of the samples in this workspace."
+                )
+
+
+class _PruneModifiers(_Step):
+    def __init__(self, modifiers_to_prune: dict[str, list[str]]):
+        self.modifiers_to_prune = dict(modifiers_to_prune)
+        self._patterns = [
+            (re.compile(prune_sample), [re.compile(tag) for tag in prune_tags])
+            for prune_sample, prune_tags in self.modifiers_to_prune.items()
+        ]
+        # patterns of modifiers to prune, by sample name
+        self._sample_patterns: dict[str, list[re.Pattern]] = {}
+
+    def _modifier_patterns(self, sample_name: str) -> list[re.Pattern]:
+        if sample_name not in self._sample_patterns:
+            self._sample_patterns[sample_name] = [
+                tag
+                for sample_pattern, tags in self._patterns
+                if sample_pattern.match(sample_name)
+                for tag in tags
+            ]
+        return self._sample_patterns[sample_name]
+
+    def keep_modifier(self, name: str, sample_name: str) -> bool:
+        return not any(
+            tag.match(name) for tag in self._modifier_patterns(sample_name)
+        )
+
+
+class _PruneRegions(_Step):
+    def __init__(self, regions_to_keep: list[str]):
+        self.regions_to_keep = set(regions_to_keep)
+
+    def channel(self, name: str) -> str | None:
+        return name if name in self.regions_to_keep else None
+
+    def finalise(self, context: _StepContext, workspace_name: str) -> None:
+        logger.info(
+            f"Pruning {len(context.channels - self.regions_to_keep)} regions \
+                from workspace {workspace_name}."
+        )
+
+
+class _SetMeasurementParameters(_Step):
+    def __init__(self, parameters: dict):
+        self.parameters = parameters
+
+    def measurement(
+        self, measurement: dict, index: int, context: _StepContext
+    ) -> None:
+        # settings are only modified for the default measurement
+        if index != 0:
+            return
+        for parameter, settings in self.parameters.items():
+            i_param = common.misc.utils.get_parameter_index_in_measurement(
+                measurement, parameter
+            )
+            parameter_config = measurement["config"]["parameters"][i_param]
+            for setting, value in settings.items():
+                parameter_config[setting] = value
+            if parameter == "lumi" and "fixed" not in settings.keys():
+                parameter_config.pop("fixed", None)
+
+
+class _MarkRegions(_Step):
+    def __init__(self, suffix: str):
+        self.suffix = suffix
+
+    def channel(self, name: str) -> str | None:
+        return f"{name}{self.suffix}"
+
+
+class _MarkModifiers(_Step):
+    def __init__(self, suffix: str):
+        self.suffix = suffix
+
+    def modifier(self, name: str, context: _StepContext) -> str:
+        if name == "lumi":
+            # renaming the lumi modifier breaks assumptions of pyhf
+            return name
+        if name == context.poi:
+            return name  # do not rename POI
+        return f"{name}{self.suffix}"
+
+
+class _CorrelateNPs(_Step):
+    def __init__(self, names: dict[str, str]):
+        self.names = dict(names)
+
+    def modifier(self, name: str, context: _StepContext) -> str:
+        return self.names.get(name, name)
+
+    def finalise(self, context: _StepContext, workspace_name: str) -> None:
+        for old_name in self.names:
+            if old_name not in context.modifiers:
+                logger.warning(
+                    f"Cannot correlate NP {old_name}, \
+                               not found in list of model parameters for \
+                               analysis {workspace_name}."
+                )
+
+
+class TransformationPlan:
+    """
+    Collection of modifications of a workspace specification.
+
+    Modifications are recorded in order by the methods of this class
+    and are applied by apply() in a single traversal of the specification,
+    followed by a single schema validation. The result is identical
+    to applying the corresponding methods of Workspace one after another,
+    each of which would copy and validate the full specification.
+
+    All methods recording modifications return the plan itself,
+    so calls can be chained.
+    """
+
+    def __init__(self):
+        self._steps: list[_Step] = []
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def _add(self, step: _Step) -> "TransformationPlan":
+        self._steps.append(step)
+        return self
+
+    def rename_measurement(
+        self, name: str = "Measurement"
+    ) -> "TransformationPlan":
+        """
+        Rename the measurement to ensure consistency when combining workspaces.
+
+        Arguments:
+            name (str):
+                new name for the measurement (default: 'Measurement')
+        """
+        return self._add(_RenameMeasurement(name))
+
+    def rename_poi(
+        self, poi_name: str = "SigXsecOverSM"
+    ) -> "TransformationPlan":
+        """
+        Rename POI to ensure consistency when combining workspaces.
+
+        Arguments:
+            poi_name (str): new name for POI (default: 'SigXsecOverSM')
+        """
+        return self._add(_RenamePOI(poi_name))
+
+    def rename_modifiers(self, names: dict[str, str]) -> "TransformationPlan":
+        """
+        Arguments:
+            names (dict[str, str]):
+                dictionary mapping old modifier names to new modifier names
+        """
+        return self._add(_RenameModifiers(names))
+
+    def rename_samples(self, names: dict[str, str]) -> "TransformationPlan":
+        """
+        Rename sample names.
+
+        Arguments:
+            names (dict[str, str]):
+                dictionary with old sample names as key
+                and new samples names as value
+        """
+        return self._add(_RenameSamples(names))
+
+    def prune_modifiers(
+        self, modifiers_to_prune: dict[str, list[str]]
+    ) -> "TransformationPlan":
+        """
+        Remove modifiers from workspace for certain samples.
+
+        Arguments:
+            modifiers_to_prune (dict[str, list[str]]):
+                dictionary with sample name as key
+                and list of modifiers to prune as value
+        """
+        return self._add(_PruneModifiers(modifiers_to_prune))
+
+    def prune_regions(self, regions_to_keep: list[str]) -> "TransformationPlan":
+        """
+        Remove regions from workspace.
+
+        Arguments:
+            regions_to_keep (list[str]):
+                only regions with name matching one of the strings
+                provided in this list are kept
+        """
+        return self._add(_PruneRegions(regions_to_keep))
+
+    def set_measurement_parameters(
+        self, parameters: dict
+    ) -> "TransformationPlan":
+        """
+        Modify settings for measurement parameters.
+
+        Arguments:
+            parameters (dict):
+                dictionary with names of measurement parameters to modify
+                as keys and dictionary of settings as value
+        """
+        return self._add(_SetMeasurementParameters(parameters))
+
+    def mark_regions(self, analysis_name: str) -> "TransformationPlan":
+        """
+        Ensure names of regions are unique
+        by appending the name of the individual analysis.
+
+        Arguments:
+            analysis_name (str): name of the individual analysis
+        """
+        return self._add(_MarkRegions(f"_{analysis_name}"))
+
+    def mark_modifiers(self, analysis_name: str) -> "TransformationPlan":
+        """
+        Ensure names of modifiers are unique
+        by appending the name of the individual analysis.
+
+        Arguments:
+            analysis_name (str): name of the individual analysis
+        """
+        return self._add(_MarkModifiers("_" + analysis_name.replace(" ", "")))
+
+    def correlate_NPs(
+        self, correlated_NPs: dict[str, dict], analysis_name: str
+    ) -> "TransformationPlan":
+        """
+        Rename marked nuisance parameters of the individual analysis
+        to their common names in the combined workspace.
+
+        Arguments:
+            correlated_NPs (dict[str, dict]):
+                dictionary with names of the correlated NPs as keys
+                and dictionaries mapping analysis names to the names
+                of the NPs in the individual analyses as values
+            analysis_name (str): name of the individual analysis
+        """
+        names = {
+            f"{old_names[analysis_name]}_{analysis_name}": new_name
+            for new_name, old_names in correlated_NPs.items()
+            if analysis_name in old_names
+        }
+        return self._add(_CorrelateNPs(names))
+
+    @staticmethod
+    def _sample_names(
+        name: str, steps: list[_Step], contexts: list[_StepContext]
+    ) -> tuple[tuple[str, ...], str]:
+        """
+        Apply steps to the name of a sample.
+
+        Returns names of the sample before each step, and the final name.
+        """
+        sample_names = []
+        for step, context in zip(steps, contexts):
+            context.samples.add(name)
+            sample_names.append(name)
+            name = step.sample(name)
+        return tuple(sample_names), name
+
+    @staticmethod
+    def _modifier_name(
+        name: str,
+        sample_names: tuple[str, ...],
+        steps: list[_Step],
+        contexts: list[_StepContext],
+    ) -> str | None:
+        """
+        Apply steps to the name of a modifier in a sample, where
+        sample_names are the names of the sample before each step.
+
+        Returns final name of the modifier, None if it is pruned.
+        """
+        for step, context, sample_name in zip(steps, contexts, sample_names):
+            context.modifiers.add(name)
+            if not step.keep_modifier(name, sample_name):
+                return None
+            name = step.modifier(name, context)
+        return name
+
+    def apply(self, spec: dict, name: str = "") -> pyhf.Workspace:
+        """
+        Apply all recorded modifications to a workspace specification.
+
+        Arguments:
+            spec (dict):
+                workspace specification, e.g. a pyhf.Workspace,
+                which is not modified
+            name (str):
+                name of the workspace used in logging messages
+
+        Returns new pyhf.Workspace with all modifications applied.
+
+        Raises:
+            pyhf.exceptions.InvalidWorkspaceOperation:
+                if a sample or modifier to rename does not exist
+            ValueError:
+                if a measurement parameter to modify does not exist
+        """
+        steps = self._steps
+        n_steps = len(steps)
+        contexts = [_StepContext() for _ in steps]
+
+        # the POI at each step is needed to decide which modifiers to rename
+        poi = spec["measurements"][0]["config"]["poi"]
+        for step, context in zip(steps, contexts):
+            context.poi = poi
+            poi = step.modifier(poi, context)
+
+        # the names after all steps only depend on the names before the
+        # first step and on the number of steps which see the channel,
+        # so each step is applied once per unique sample name, and once
+        # per unique combination of modifier and sample name
+        sample_index: dict[tuple[str, int], tuple[tuple[str, ...], str]] = {}
+        modifier_index: dict[tuple[str, tuple[str, ...]], str | None] = {}
+
+        channels = []
+        channel_names: dict[str, str | None] = {}
+        for channel in spec["channels"]:
+            channel_name = channel["name"]
+            # number of steps which see this channel
+            n_seen = n_steps
+            kept = True
+            for i, step in enumerate(steps):
+                contexts[i].channels.add(channel_name)
+                new_name = step.channel(channel_name)
+                if new_name is None:
+                    n_seen = i + 1
+                    kept = False
+                    break
+                channel_name = new_name
+            channel_names[channel["name"]] = channel_name if kept else None
+
+            samples = []
+            for sample in channel["samples"]:
+                sample_key = (sample["name"], n_seen)
+                if sample_key not in sample_index:
+                    sample_index[sample_key] = self._sample_names(
+                        sample["name"], steps[:n_seen], contexts
+                    )
+                sample_names, sample_name = sample_index[sample_key]
+
+                modifiers = []
+                for modifier in sample["modifiers"]:
+                    modifier_key = (modifier["name"], sample_names)
+                    if modifier_key not in modifier_index:
+                        modifier_index[modifier_key] = self._modifier_name(
+                            modifier["name"], sample_names, steps, contexts
+                        )
+                    modifier_name = modifier_index[modifier_key]
+                    if modifier_name is not None:
+                        modifiers.append(dict(modifier, name=modifier_name))
+                samples.append(
+                    dict(sample, name=sample_name, modifiers=modifiers)
+                )
+            if kept:
+                channels.append(
+                    dict(channel, name=channel_name, samples=samples)
+                )
+
+        measurements = [
+            dict(
+                measurement,
+                config=dict(
+                    measurement["config"],
+                    parameters=[
+                        dict(parameter)
+                        for parameter in measurement["config"]["parameters"]
+                    ],
+                ),
+            )
+            for measurement in spec["measurements"]
+        ]
+        for step, context in zip(steps, contexts):
+            for index, measurement in enumerate(measurements):
+                step.measurement(measurement, index, context)
+            step.finalise(context, name)
+
+        # observations follow the channels they belong to
+        observations = []
+        for observation in spec["observations"]:
+            observation_name = channel_names.get(
+                observation["name"], observation["name"]
+            )
+            if observation_name is not None:
+                observations.append(dict(observation, name=observation_name))
+
+        newspec = {
+            "channels": channels,
+            "measurements": measurements,
+            "observations": observations,
+            "version": spec["version"],
+        }
+        logger.debug(
+            f"Applied {n_steps} modifications to workspace {name} \
+                in a single pass."
+        )
+        return pyhf.Workspace(newspec)
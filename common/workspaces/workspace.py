@@ -1,49 +1,38 @@
-import re
-
 import pyhf
 
-from common.workspaces.workspacebase import WorkspaceBase
-import common.misc.utils
-
-from common.misc.logger import logger
+from common.workspaces.workspacebase import WorkspaceBase, modifies_workspace
+from common.workspaces.transformations import TransformationPlan
 
 
 class Workspace(WorkspaceBase):
     """
     Class providing helper methods to modify pyhf.Workspaces.
+
+    Each method applies a single modification. To apply several
+    modifications at once, record them in a TransformationPlan
+    and pass it to apply() instead.
     """
 
     def __init__(self, name: str, ws: pyhf.Workspace):
-        self.name = name
-        self.ws: pyhf.Workspace = ws
+        super().__init__(name, ws)
 
+    @modifies_workspace
     def mark_regions(self) -> None:
         """
         Ensure names of regions are unique
         by appending the name of the individual analysis.
         """
-        self.ws = self.ws.rename(
-            channels={
-                channel: f"{channel}_{self.name}"
-                for channel in self.ws.model().config.channels
-            }
-        )
+        self.apply(TransformationPlan().mark_regions(self.name))
 
+    @modifies_workspace
     def mark_modifiers(self) -> None:
         """
         Ensure names of modifiers are unique
         by appending the name of the individual analysis.
         """
-        modifiers = {}
-        for modifier in self.ws.model().config.parameters:
-            if modifier == "lumi":
-                # renaming the lumi modifier breaks assumptions of pyhf
-                continue
-            if modifier == self.ws.get_measurement()["config"]["poi"]:
-                continue  # do not rename POI
-            modifiers[modifier] = modifier + "_" + self.name.replace(" ", "")
-        self.rename_modifiers(names=modifiers)
+        self.apply(TransformationPlan().mark_modifiers(self.name))
 
+    @modifies_workspace
     def prune_modifiers(self, modifiers_to_prune: dict[str, list[str]]) -> None:
         """
         Remove modifiers from workspace for certain samples.
@@ -53,31 +42,9 @@ class Workspace(WorkspaceBase):
                 dictionary with sample name as key
                 and list of modifiers to prune as value
         """
-        for i_channel, channel in enumerate(self.ws["channels"]):
-            for i_sample, sample in enumerate(channel["samples"]):
-                for prune_sample, prune_tags in modifiers_to_prune.items():
-                    if not re.match(prune_sample, sample["name"]):
-                        continue
-
-                    # position of modifier to prune is appended to list
-                    prune_modifiers: list[int] = []
-                    for i_modifier, modifier in enumerate(sample["modifiers"]):
-                        # skip if already added to list
-                        # when it matches multiple pruning tags
-                        if i_modifier in prune_modifiers:
-                            continue
-
-                        for prune_tag in prune_tags:
-                            if not re.match(prune_tag, modifier["name"]):
-                                continue
-                            prune_modifiers.append(i_modifier)
-
-                    # delete in reverse to avoid problems with indeces
-                    for i in sorted(prune_modifiers, reverse=True):
-                        del self.ws["channels"][i_channel]["samples"][i_sample][
-                            "modifiers"
-                        ][i]
+        self.apply(TransformationPlan().prune_modifiers(modifiers_to_prune))
 
+    @modifies_workspace
     def prune_regions(self, regions_to_keep: list[str]) -> None:
         """
         Remove regions from workspace.
@@ -87,16 +54,9 @@ class Workspace(WorkspaceBase):
                 only regions with name matching one of the strings
                 provided in this list are kept
         """
-        prune_regions = [
-            region["name"]
-            for region in self.ws["channels"]
-            if region["name"] not in regions_to_keep
-        ]
-        logger.info(
-            f"Pruning {len(prune_regions)} regions from workspace {self.name}."
-        )
-        self.ws = self.ws.prune(channels=prune_regions)
+        self.apply(TransformationPlan().prune_regions(regions_to_keep))
 
+    @modifies_workspace
     def rename_measurement(self, name: str = "Measurement") -> None:
         """
         Rename the measurement to ensure consistency when combining workspaces.
@@ -105,18 +65,18 @@ class Workspace(WorkspaceBase):
             name (str):
                 new name for the measurement (default: 'Measurement')
         """
-        self.ws = self.ws.rename(
-            measurements={self.ws.get_measurement()["name"]: name}
-        )
+        self.apply(TransformationPlan().rename_measurement(name))
 
+    @modifies_workspace
     def rename_modifiers(self, names: dict[str, str]) -> None:
         """
         Arguments:
             names (dict[str, str]):
                 dictionary mapping old modifier names to new modifier names
         """
-        self.ws = self.ws.rename(modifiers=names)
+        self.apply(TransformationPlan().rename_modifiers(names))
 
+    @modifies_workspace
     def rename_poi(self, poi_name: str = "SigXsecOverSM") -> None:
         """
         Rename POI to ensure consistency when combining workspaces.
@@ -124,10 +84,9 @@ class Workspace(WorkspaceBase):
         Arguments:
             poi_name (str): new name for POI (default: 'SigXsecOverSM')
         """
-        old_poi = self.ws["measurements"][0]["config"]["poi"]
-        self.ws["measurements"][0]["config"]["poi"] = poi_name
-        self.rename_modifiers({old_poi: poi_name})
+        self.apply(TransformationPlan().rename_poi(poi_name))
 
+    @modifies_workspace
     def rename_samples(self, names: dict[str, str]) -> None:
         """
         Rename sample names.
@@ -137,8 +96,9 @@ class Workspace(WorkspaceBase):
                 dictionary with old sample names as key
                 and new samples names as value
         """
-        self.ws = self.ws.rename(samples=names)
+        self.apply(TransformationPlan().rename_samples(names))
 
+    @modifies_workspace
     def set_measurement_parameters(self, parameters: dict) -> None:
         """
         Modify settings for measurement parameters.
@@ -148,15 +108,4 @@ class Workspace(WorkspaceBase):
                 dictionary with names of measurement parameters to modify
                 as keys and dictionary of settings as value
         """
-        for parameter, settings in parameters.items():
-            i_param = common.misc.utils.get_parameter_index_in_measurement(
-                self.ws.get_measurement(), parameter
-            )
-            for setting, value in settings.items():
-                self.ws["measurements"][0]["config"]["parameters"][i_param][
-                    setting
-                ] = value
-            if parameter == "lumi" and "fixed" not in settings.keys():
-                self.ws["measurements"][0]["config"]["parameters"][i_param].pop(
-                    "fixed", None
-                )
+        self.apply(TransformationPlan().set_measurement_parameters(parameters))
@@ -1,17 +1,91 @@
+import contextlib
 import functools
+import os
 
 import pyhf
 import cabinetry
 
 import common.limitsetting
+import common.misc.cache
+import common.misc.instrumentation
+import common.ranking
+from common.misc.backend import Backend
+from common.workspaces.transformations import TransformationPlan
 
 from common.misc.logger import logger
 
 
+def modifies_workspace(method):
+    """
+    Decorator for methods modifying the workspace.
+    Increases the version of the workspace after the method was called,
+    which invalidates the cached model, data and fit results.
+    The method is timed by common.misc.instrumentation if enabled.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            with common.misc.instrumentation.span(
+                f"{type(self).__name__}.{method.__name__}"
+            ):
+                return method(self, *args, **kwargs)
+        finally:
+            self._invalidate()
+
+    return wrapper
+
+
+def _parameter_types(model: pyhf.pdf.Model) -> list[str]:
+    """
+    Returns modifier type of each parameter of the model, in the order of
+    the labels of cabinetry.fit.FitResults, i.e. repeated for each bin of
+    parameters with several bins.
+    """
+    modifier_types = dict(model.config.modifiers)
+    return [
+        modifier_types[par]
+        for par in model.config.par_order
+        for _ in range(model.config.param_set(par).n_parameters)
+    ]
+
+
 class WorkspaceBase:
     def __init__(self, name: str, ws: pyhf.Workspace):
         self.name = name
         self.ws = ws
+        # quantities derived from the workspace are cached
+        # together with the version of the workspace they were built for
+        self._version = 0
+        self._cache: dict[str, tuple] = {}
+        # number of pyhf.pdf.Model instances built for this workspace
+        self.model_builds = 0
+        # backend used for fits and limit setting
+        self.backend = Backend()
+
+    def _invalidate(self) -> None:
+        self._version += 1
+
+    def _cached(self, key: str, build):
+        """
+        Return cached quantity for the current version of the workspace,
+        calling build() to obtain it if it is not cached yet.
+        """
+        version, value = self._cache.get(key, (None, None))
+        if version != self._version:
+            value = build()
+            self._cache[key] = (self._version, value)
+        return value
+
+    def _build_model(self) -> pyhf.pdf.Model:
+        self.model_builds += 1
+        common.misc.instrumentation.count("model builds")
+        logger.debug(
+            f"Building model for workspace {self.name} \
+                (build {self.model_builds})."
+        )
+        with common.misc.instrumentation.span("build model"):
+            return pyhf.pdf.Model(self._model_spec, poi_name="SigXsecOverSM")
 
     @property
     def _measurement(self):
@@ -25,50 +99,235 @@ class WorkspaceBase:
         }
 
     @property
-    def model(self):
-        return pyhf.pdf.Model(self._model_spec, poi_name="SigXsecOverSM")
+    def model(self) -> pyhf.pdf.Model:
+        return self._cached("model", self._build_model)
+
+    @property
+    def _data(self) -> list[float]:
+        return self._cached(
+            "data", lambda: self.ws.data(self.model, include_auxdata=True)
+        )
+
+    @property
+    def par_bounds(self) -> list[tuple[float, float]]:
+        """
+        Suggested parameter bounds of the model.
+        Returns a copy, which can be modified by the caller.
+        """
+        return list(
+            self._cached("par_bounds", self.model.config.suggested_bounds)
+        )
 
     @property
-    def _data(self):
-        return self.ws.data(self.model, include_auxdata=True)
+    def init_pars(self) -> list[float]:
+        """
+        Suggested initial parameter values of the model.
+        Returns a copy, which can be modified by the caller.
+        """
+        return list(self._cached("init_pars", self.model.config.suggested_init))
+
+    @contextlib.contextmanager
+    def _backend_session(self):
+        """
+        Context manager using the backend of the workspace,
+        compiling the likelihood of the model first if requested.
+        """
+        with self.backend.session():
+            self._cached(
+                f"warm_up_{self.backend}",
+                lambda: self.backend.warm_up(self.model, self._data),
+            )
+            yield
 
-    @functools.lru_cache
     def fit_results(self):
-        logger.debug(f"Starting fit for workspace {self.name}.")
-        return cabinetry.fit.fit(self.model, self._data)
+        def fit():
+            logger.debug(f"Starting fit for workspace {self.name}.")
+            with (
+                self._backend_session(),
+                common.misc.instrumentation.span("fit"),
+                common.misc.instrumentation.likelihood_evaluations(self.model),
+            ):
+                fit_results = cabinetry.fit.fit(self.model, self._data)
+            # cabinetry does not store the modifier types of the parameters
+            if not fit_results.types:
+                fit_results = fit_results._replace(
+                    types=_parameter_types(self.model)
+                )
+            return fit_results
 
-    def ranking_results(self):
-        logger.debug(f"Starting ranking for workspace {self.name}.")
-        return cabinetry.fit.ranking(
-            model=self.model, data=self._data, fit_results=self.fit_results()
+        return self._cached("fit_results", fit)
+
+    def ranking_results(
+        self,
+        mode: str = "full",
+        n_workers: int | None = None,
+        n_refit: int = 20,
+    ):
+        """
+        Calculate the impact of all nuisance parameters on the POI,
+        starting all fits from the best-fit parameters of fit_results.
+
+        Arguments:
+            mode (str):
+                'full' to calculate all impacts with fits, 'approx' to
+                approximate them from the correlation matrix of fit_results,
+                or 'hybrid' to recalculate the n_refit largest approximate
+                impacts with fits (default: 'full')
+            n_workers (Optional[int]):
+                number of worker processes running the fits
+                (default: None, number of CPUs)
+            n_refit (int):
+                number of parameters for which the impact is calculated
+                with fits in mode 'hybrid' (default: 20)
+
+        Returns cabinetry.fit.RankingResults.
+        """
+        mode = mode.lower()
+        if mode not in ["full", "approx", "hybrid"]:
+            raise ValueError(
+                f"Mode '{mode}' chosen for ranking is not valid. \
+                    Available modes are 'full', 'approx' and 'hybrid'."
+            )
+        logger.debug(
+            f"Starting ranking for workspace {self.name} \
+                using mode '{mode}'."
         )
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        with (
+            self._backend_session(),
+            common.misc.instrumentation.span(f"ranking ({mode})"),
+        ):
+            if mode == "approx":
+                return common.ranking.ranking_approx(
+                    self.model, self.fit_results()
+                )
+            if mode == "hybrid":
+                return common.ranking.ranking_hybrid(
+                    self.model,
+                    self._data,
+                    self.fit_results(),
+                    n_refit=n_refit,
+                    n_workers=n_workers,
+                )
+            return common.ranking.ranking(
+                self.model,
+                self._data,
+                self.fit_results(),
+                n_workers=n_workers,
+            )
+
+    def limit_results(
+        self,
+        method: str = "default",
+        n_workers: int | None = None,
+        warm_start: bool = True,
+        hypotest_cache: common.misc.cache.HypotestCache | None = None,
+    ):
+        """
+        Calculate observed and expected upper limits on the POI.
 
-    def limit_results(self, method: str = "default"):
+        Arguments:
+            method (str):
+                method to use for limit setting, one of
+                'default' (cabinetry.fit.limit), 'bisect', 'ksection',
+                'asimov' and 'brent' (default: 'default')
+            n_workers (Optional[int]):
+                number of worker processes for methods evaluating hypotests
+                in parallel (default: None, number of CPUs)
+            warm_start (bool):
+                for all methods but 'default', start the fits of each hypotest
+                from the fitted parameters of the closest POI value tested
+                before, and the first ones from the best-fit parameters
+                of fit_results (default: True)
+            hypotest_cache (Optional[common.misc.cache.HypotestCache]):
+                for all methods but 'default', on-disk cache for hypotest
+                results (default: None, no caching)
+
+        Returns cabinetry.fit.LimitResults.
+        """
         method = method.lower()
-        if method not in ["default", "bisect"]:
+        if method not in ["default", "bisect", "ksection", "asimov", "brent"]:
             raise ValueError(
                 f"Method '{method}' chosen for limit setting \
                              is not valid. \
-                             Available methods are 'default' and 'bisect'."
+                             Available methods are 'default', 'bisect', \
+                             'ksection', 'asimov' and 'brent'."
             )
         logger.debug(
             f"Starting limit setting for workspace {self.name} \
                 using method '{method}'."
         )
-        if method == "bisect":
-            return common.limitsetting.limit_customScan(self.model, self._data)
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        with (
+            self._backend_session(),
+            common.misc.instrumentation.span(f"limits ({method})"),
+        ):
+            return self._limit_results(
+                method, n_workers, warm_start, hypotest_cache
+            )
+
+    def _limit_results(
+        self,
+        method: str,
+        n_workers: int,
+        warm_start: bool,
+        hypotest_cache: common.misc.cache.HypotestCache | None,
+    ):
+        if method != "default":
+            init_pars = None
+            if warm_start:
+                try:
+                    init_pars = [
+                        float(par) for par in self.fit_results().bestfit
+                    ]
+                except pyhf.exceptions.FailedMinimization:
+                    logger.warning(
+                        f"Fit for workspace {self.name} failed, \
+                            hypotests start from the default \
+                            initial parameter values."
+                    )
+            if method == "brent":
+                return common.limitsetting.limit_brent(
+                    self.model,
+                    self._data,
+                    init_pars=init_pars,
+                    warm_start=warm_start,
+                    cache=hypotest_cache,
+                )
+            if method == "asimov":
+                return common.limitsetting.limit_asimov(
+                    self.model,
+                    self._data,
+                    init_pars=init_pars,
+                    warm_start=warm_start,
+                    cache=hypotest_cache,
+                )
+            return common.limitsetting.limit_customScan(
+                self.model,
+                self._data,
+                init_pars=init_pars,
+                obs_method=method,
+                n_workers=n_workers,
+                warm_start=warm_start,
+                cache=hypotest_cache,
+            )
         return cabinetry.fit.limit(model=self.model, data=self._data)
 
+    @modifies_workspace
+    def apply(self, plan: TransformationPlan) -> None:
+        """
+        Apply all modifications recorded in a TransformationPlan
+        in a single pass over the workspace.
+
+        Arguments:
+            plan (TransformationPlan): modifications to apply
+        """
+        self.ws = plan.apply(self.ws, name=self.name)
+
+    @modifies_workspace
     def correlate_NPs(self, correlated_NPs: dict[str, dict]) -> None:
-        for new_name, old_names in correlated_NPs.items():
-            if not self.name in old_names:
-                continue
-            old_name = f"{old_names[self.name]}_{self.name}"
-            if not old_name in self.ws.model().config.parameters:
-                logger.warning(
-                    f"Cannot correlate NP {old_name}, \
-                               not found in list of model parameters for \
-                               analysis {self.name}."
-                )
-                continue
-            self.ws = self.ws.rename({old_name: new_name})
+        self.apply(
+            TransformationPlan().correlate_NPs(correlated_NPs, self.name)
+        )
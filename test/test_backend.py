@@ -0,0 +1,26 @@
+import pyhf
+import pytest
+
+from common.misc.backend import *
+
+
+def test_session_restores_backend():
+    pyhf.set_backend("numpy")
+    with Backend("pytorch", "minuit").session():
+        assert pyhf.tensorlib.name == "pytorch"
+        assert pyhf.optimizer.name == "minuit"
+    assert pyhf.tensorlib.name == "numpy"
+    assert pyhf.optimizer.name == "scipy"
+
+
+def test_session_restores_backend_on_error():
+    pyhf.set_backend("numpy")
+    with pytest.raises(RuntimeError):
+        with Backend("pytorch").session():
+            raise RuntimeError
+    assert pyhf.tensorlib.name == "numpy"
+
+
+def test_invalid_backend_raises():
+    with pytest.raises(ValueError):
+        Backend("tensorflow")
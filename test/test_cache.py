@@ -0,0 +1,59 @@
+from common.limitsetting.evaluator import HypotestEvaluator
+from common.misc.backend import Backend
+from common.misc.cache import *
+from common.misc.helpers import get_analysis_workspace, get_combination
+
+
+def test_settings_hash_changes_with_settings():
+    assert settings_hash({"a": 1}) == settings_hash({"a": 1})
+    assert settings_hash({"a": 1}) != settings_hash({"a": 2})
+
+
+def test_load_workspace_spec_returns_None(tmp_path):
+    assert load_workspace_spec(tmp_path, "missing") is None
+
+
+def test_cached_workspace_is_identical(tmp_path):
+    combination = get_combination("combination1")
+    ws = get_analysis_workspace(
+        "analysis1", {"mass": "1300"}, combination, cache_dir=tmp_path
+    )
+    assert len(list((tmp_path / "workspaces").iterdir())) == 1
+    ws_cached = get_analysis_workspace(
+        "analysis1", {"mass": "1300"}, combination, cache_dir=tmp_path
+    )
+    assert ws_cached.ws == ws.ws
+
+
+
+def test_hypotest_cache_hits(tmp_path):
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    cache = HypotestCache(tmp_path)
+    with HypotestEvaluator(ws.model, ws._data, cache=cache) as evaluator:
+        results = evaluator([0.5, 1.0])
+    assert (cache.hits, cache.misses) == (0, 2)
+    with HypotestEvaluator(ws.model, ws._data, cache=cache) as evaluator:
+        results_cached = evaluator([1.0, 2.0, 0.5])
+        assert evaluator.n_hypotests == 1
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert results_cached[0] == results[1]
+    assert results_cached[2] == results[0]
+
+
+def test_hypotest_cache_depends_on_backend(tmp_path):
+    ws = get_analysis_workspace("analysis2", {"mass": "1300"}, None)
+    cache = HypotestCache(tmp_path)
+    with HypotestEvaluator(ws.model, ws._data, cache=cache) as evaluator:
+        evaluator([1.0])
+    with Backend("numpy", "minuit").session():
+        with HypotestEvaluator(ws.model, ws._data, cache=cache) as evaluator:
+            evaluator([1.0])
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_hypotest_cache_eviction(tmp_path):
+    cache = HypotestCache(tmp_path, max_size=0)
+    cache.store("key", [0.05, [0.05] * 5, None])
+    assert cache.load("key") is not None
+    cache.close()
+    assert cache.load("key") is None
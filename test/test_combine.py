@@ -0,0 +1,47 @@
+import argparse
+import pathlib
+import subprocess
+import sys
+import types
+
+import combine
+from common.misc.utils import STAGES
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    # parsing the command-line arguments should not need pyhf,
+    # cabinetry or matplotlib, they are imported by the stages using them
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, combine; "
+            "heavy = {'pyhf', 'cabinetry', 'matplotlib'}; "
+            "assert not heavy.intersection(sys.modules), "
+            "heavy.intersection(sys.modules)",
+        ],
+        check=True,
+    )
+
+
+def test_stages_match_command_line_options():
+    args = argparse.Namespace(
+        analysis_names=["analysis1"], jobs=1, fit_comparisons=False
+    )
+    combined_ws = types.SimpleNamespace(
+        name="Combined", fit_results=None, backend=None
+    )
+    stages = combine.get_stages(
+        args, combined_ws, [], pathlib.Path("output"), None, None
+    )
+    assert [stage.name for stage in stages] == STAGES
+
+
+def test_no_plots_skips_plotting_stages_and_ranking():
+    args = argparse.Namespace(
+        stages=None, fit_comparisons=True, ranking=True, no_plots=True
+    )
+    stages = combine.get_requested_stages(args)
+    assert "ranking" not in stages
+    assert not set(stages).intersection(combine.PLOT_STAGES)
+    assert "results" in stages
@@ -9,3 +9,17 @@ def test_get_combination_returns_None():
 def test_get_combination_returns_class():
     c = get_combination("combination1")
     assert isinstance(c, CombinationBase)
+
+
+def test_get_analysis_workspaces_in_parallel():
+    combination = get_combination("combination1")
+    analysis_names = ["analysis1", "analysis2"]
+    workspaces = get_analysis_workspaces(
+        analysis_names, {"mass": "1300"}, combination
+    )
+    workspaces_parallel = get_analysis_workspaces(
+        analysis_names, {"mass": "1300"}, combination, n_jobs=2
+    )
+    assert [ws.name for ws in workspaces_parallel] == analysis_names
+    for ws, ws_parallel in zip(workspaces, workspaces_parallel):
+        assert ws.ws == ws_parallel.ws
@@ -0,0 +1,25 @@
+import gzip
+import lzma
+
+import pytest
+
+from common.misc.inputs import *
+
+
+@pytest.mark.parametrize(
+    "suffix, opener", [(".gz", gzip.open), (".xz", lzma.open)]
+)
+def test_load_json_decompresses(tmp_path, suffix, opener):
+    filename = "test/analysis1_M1300GeV.json"
+    compressed = tmp_path / f"analysis1.json{suffix}"
+    with open(filename, "rb") as f_in, opener(compressed, "wb") as f_out:
+        f_out.write(f_in.read())
+    assert load_json(compressed) == load_json(filename)
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_load_json_parsers_agree(parser):
+    filename = "test/analysis1_M1300GeV.json"
+    assert load_json(filename, parser=parser) == load_json(
+        filename, parser="json"
+    )
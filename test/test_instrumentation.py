@@ -0,0 +1,100 @@
+import concurrent.futures
+import json
+import os
+import pickle
+import tracemalloc
+
+import pyhf
+
+import common.misc.instrumentation as instrumentation
+
+
+def test_nothing_is_recorded_when_disabled():
+    instrumentation.disable()
+    instrumentation.reset()
+    with instrumentation.span("fit"):
+        instrumentation.count("hypotests")
+    assert instrumentation.counters() == {}
+    assert "fit" not in instrumentation.summary()
+
+
+def test_spans_and_counters_are_recorded(tmp_path):
+    instrumentation.enable()
+    try:
+        for _ in range(2):
+            with instrumentation.span("fit"):
+                instrumentation.count("hypotests", 3)
+    finally:
+        instrumentation.disable()
+    assert instrumentation.counters() == {"hypotests": 6}
+    fit_line = instrumentation.summary().splitlines()[1]
+    assert fit_line.split()[:2] == ["fit", "2"]
+
+    instrumentation.write_trace(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)["traceEvents"]
+    assert [event["ph"] for event in events] == ["X", "X", "C", "C"]
+    assert events[-1]["args"] == {"hypotests": 6}
+
+
+def test_likelihood_evaluations_are_counted():
+    model = pyhf.simplemodels.uncorrelated_background([5.0], [10.0], [2.0])
+    data = [12.0] + model.config.auxdata
+    instrumentation.enable()
+    try:
+        with instrumentation.likelihood_evaluations(model):
+            pyhf.infer.mle.fit(data, model)
+            # models can be sent to other processes while counting
+            pickle.dumps(model)
+    finally:
+        instrumentation.disable()
+    assert instrumentation.counters()["likelihood evaluations"] > 0
+    assert "logpdf" not in model.__dict__
+
+
+def test_memory_peaks_are_recorded():
+    instrumentation.enable(memory=True)
+    try:
+        with instrumentation.span("outer"):
+            with instrumentation.span("allocate"):
+                data = bytearray(20 * 1024**2)
+                del data
+            with instrumentation.span("small"):
+                pass
+    finally:
+        instrumentation.disable()
+    assert not tracemalloc.is_tracing()
+    peaks = {
+        line.split()[0]: float(line.split()[2])
+        for line in instrumentation.memory_summary().splitlines()[1:4]
+    }
+    assert peaks["allocate"] >= 20
+    # the outer span includes the peak of the inner one
+    assert peaks["outer"] >= peaks["allocate"]
+    assert peaks["small"] < 20
+
+
+def _recorded_task(n):
+    with instrumentation.span("task"):
+        instrumentation.count("tasks", n)
+    return 2 * n
+
+
+def test_records_of_worker_processes_are_merged():
+    instrumentation.enable()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            result, records = executor.submit(
+                instrumentation.call_recorded,
+                instrumentation.settings(),
+                _recorded_task,
+                3,
+            ).result()
+        instrumentation.merge(records)
+    finally:
+        instrumentation.disable()
+    assert result == 6
+    assert instrumentation.counters() == {"tasks": 3}
+    [(name, _, _, pid, _, _)] = instrumentation._spans
+    assert name == "task"
+    assert pid != os.getpid()
@@ -0,0 +1,137 @@
+import pytest
+
+from common.limitsetting import GetLimitsBrent, GetObsLimitKSection
+from common.limitsetting.evaluator import HypotestEvaluator
+from common.misc.backend import Backend
+from common.misc.helpers import get_analysis_workspace
+
+
+def _linear_cls(pois):
+    # CLs falling linearly, crossing 0.05 at POI = 1.23
+    return [(0.05 - 0.1 * (poi - 1.23), [0.0] * 5) for poi in pois]
+
+
+@pytest.mark.parametrize("n_points", [1, 3, 7])
+def test_ksection_brackets_crossing(n_points):
+    results, pois = GetObsLimitKSection(
+        [0.0, 10.0], 0.01, 50, _linear_cls, n_points
+    )
+    assert len(results) == len(pois)
+    below = [poi for poi, res in zip(pois, results) if res[0] > 0.05]
+    above = [poi for poi, res in zip(pois, results) if res[0] < 0.05]
+    assert max(below) < 1.23 < min(above)
+    assert (min(above) - max(below)) / 1.23 < 0.02
+
+
+def test_ksection_needs_fewer_iterations_with_more_points():
+    evaluations = {}
+    for n_points in [1, 7]:
+        calls = []
+
+        def evaluator(pois):
+            calls.append(pois)
+            return _linear_cls(pois)
+
+        GetObsLimitKSection([0.0, 10.0], 0.01, 50, evaluator, n_points)
+        evaluations[n_points] = len(calls)
+    assert evaluations[7] < evaluations[1]
+
+
+def test_ksection_invalid_bracket():
+    with pytest.raises(ValueError, match="bracket inappropriate"):
+        GetObsLimitKSection([2.0, 10.0], 0.01, 50, _linear_cls, 3)
+
+
+def _flatten(results):
+    return [cls for cls_obs, cls_exp in results for cls in [cls_obs, *cls_exp]]
+
+
+def test_evaluator_parallel_matches_serial():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    pois = [0.5, 1.0, 2.0]
+    with HypotestEvaluator(ws.model, ws._data, warm_start=False) as evaluator:
+        serial = evaluator(pois)
+    with HypotestEvaluator(
+        ws.model, ws._data, n_workers=2, warm_start=False
+    ) as evaluator:
+        parallel = evaluator(pois)
+    assert _flatten(parallel) == pytest.approx(_flatten(serial))
+
+
+def test_evaluator_parallel_with_jax():
+    pytest.importorskip("jax")
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    ws.backend = Backend("jax")
+    # initialises jax in the current process before the workers are started
+    ws.fit_results()
+    pois = [0.5, 1.0, 2.0]
+    with ws.backend.session():
+        with HypotestEvaluator(ws.model, ws._data) as evaluator:
+            serial = evaluator(pois)
+        with HypotestEvaluator(ws.model, ws._data, n_workers=2) as evaluator:
+            parallel = evaluator(pois)
+    assert _flatten(parallel) == pytest.approx(_flatten(serial), rel=1e-3)
+
+
+def test_evaluator_warm_start():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    pois = [0.3, 0.4, 0.5, 0.6]
+    evaluators = {
+        warm_start: HypotestEvaluator(ws.model, ws._data, warm_start=warm_start)
+        for warm_start in [False, True]
+    }
+    results = {
+        warm_start: evaluator(pois)
+        for warm_start, evaluator in evaluators.items()
+    }
+    assert _flatten(results[True]) == pytest.approx(
+        _flatten(results[False]), rel=1e-3
+    )
+    assert evaluators[True].n_hypotests == len(pois)
+    assert evaluators[True].n_logpdf_calls < evaluators[False].n_logpdf_calls
+
+
+def test_evaluator_surfaces_worker_failure():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    with HypotestEvaluator(ws.model, ws._data, n_workers=2) as evaluator:
+        with pytest.raises(RuntimeError, match="POI value -5.0"):
+            evaluator([1.0, -5.0, 2.0])
+
+
+def test_asimov_expected_limit():
+    ws = get_analysis_workspace("analysis2", {"mass": "1300"}, None)
+    limit_results = ws.limit_results("asimov", warm_start=False)
+    assert list(limit_results.expected_limit) == sorted(
+        limit_results.expected_limit
+    )
+    # the median expected CLs is 0.05 at the median expected limit
+    with HypotestEvaluator(ws.model, ws._data, warm_start=False) as evaluator:
+        [(_, cls_exp)] = evaluator([limit_results.expected_limit[2]])
+    assert cls_exp[2] == pytest.approx(0.05, abs=0.002)
+
+
+def test_brent_reuses_cls_values():
+    calls = []
+
+    def evaluator(pois):
+        calls.extend(pois)
+        # observed and expected CLs crossing 0.05 at different POI values
+        return [
+            (
+                0.05 - 0.1 * (poi - 1.23),
+                [0.05 - 0.1 * (poi - crossing) for crossing in range(1, 6)],
+            )
+            for poi in pois
+        ]
+
+    limits, cls_values, pois = GetLimitsBrent([0.0, 10.0], 1e-4, 100, evaluator)
+    assert limits == pytest.approx([1.23, 1, 2, 3, 4, 5], rel=1e-4)
+    assert pois == sorted(calls)
+    assert len(cls_values) == len(pois)
+    # CLs is linear, so Brent's method converges in few steps
+    assert len(calls) < 20
+
+
+def test_brent_invalid_bracket():
+    with pytest.raises(ValueError, match="bracket inappropriate"):
+        GetLimitsBrent([2.0, 10.0], 0.01, 100, _linear_cls)
@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+import cabinetry
+import numpy as np
+import pytest
+
+from common.plotting.sink import PlotSink
+
+
+def test_plotting_modules_are_imported_lazily():
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, common.plotting; "
+            "assert 'common.plotting.limits' not in sys.modules; "
+            "assert 'cabinetry' not in sys.modules",
+        ],
+        check=True,
+    )
+
+
+def test_plot_sink_creates_figures(tmp_path):
+    limit_results = cabinetry.fit.LimitResults(
+        1.0,
+        np.asarray([0.5, 0.7, 1.0, 1.4, 1.9]),
+        np.asarray([0.1, 0.05]),
+        np.asarray([[0.1] * 5, [0.05] * 5]),
+        np.asarray([0.5, 1.0]),
+        0.95,
+    )
+    with PlotSink() as sink:
+        sink.submit(
+            "limit_comparison",
+            limit_results=[limit_results],
+            figure_folder=tmp_path,
+            model_names=["Combined"],
+        )
+    assert (tmp_path / "limit_comparison.pdf").exists()
+
+
+def test_plot_sink_raises_for_failed_figure(tmp_path):
+    sink = PlotSink()
+    sink.submit("limit_comparison", limit_results=[], figure_folder=tmp_path)
+    with pytest.raises(RuntimeError, match="limit_comparison"):
+        sink.close()
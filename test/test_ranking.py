@@ -0,0 +1,57 @@
+import cabinetry
+import numpy as np
+import pyhf
+import pytest
+
+import common.ranking
+
+
+@pytest.fixture
+def model_and_data():
+    model = pyhf.simplemodels.uncorrelated_background(
+        signal=[5.0, 10.0], bkg=[50.0, 60.0], bkg_uncertainty=[5.0, 12.0]
+    )
+    data = [55.0, 75.0] + model.config.auxdata
+    return model, data
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_ranking_matches_cabinetry(model_and_data, n_workers):
+    model, data = model_and_data
+    fit_results = cabinetry.fit.fit(model, data)
+    expected = cabinetry.fit.ranking(model, data, fit_results=fit_results)
+    ranking_results = common.ranking.ranking(
+        model, data, fit_results, n_workers=n_workers
+    )
+    assert ranking_results.labels == expected.labels
+    for impacts, expected_impacts in zip(ranking_results[3:], expected[3:]):
+        assert np.allclose(impacts, expected_impacts, rtol=0.02)
+
+
+def test_approximate_ranking_close_to_full(model_and_data):
+    model, data = model_and_data
+    fit_results = cabinetry.fit.fit(model, data)
+    full = common.ranking.ranking(model, data, fit_results)
+    approx = common.ranking.ranking_approx(model, fit_results)
+    assert approx.labels == full.labels
+    for impacts, full_impacts in zip(approx[3:], full[3:]):
+        assert np.allclose(impacts, full_impacts, rtol=0.2)
+
+
+@pytest.mark.parametrize("n_refit", [0, 1, 2])
+def test_hybrid_ranking_refits_largest_impacts(model_and_data, n_refit):
+    model, data = model_and_data
+    fit_results = cabinetry.fit.fit(model, data)
+    full = common.ranking.ranking(model, data, fit_results)
+    approx = common.ranking.ranking_approx(model, fit_results)
+    hybrid = common.ranking.ranking_hybrid(
+        model, data, fit_results, n_refit=n_refit
+    )
+    # the second parameter has the larger impact
+    refit = [False, True] if n_refit == 1 else [n_refit == 2] * 2
+    for impacts, full_impacts, approx_impacts in zip(
+        hybrid[3:], full[3:], approx[3:]
+    ):
+        assert impacts == pytest.approx(
+            np.where(refit, full_impacts, approx_impacts)
+        )
@@ -0,0 +1,93 @@
+import subprocess
+import sys
+
+import cabinetry
+import numpy as np
+import pyhf
+
+from common.limitsetting import limit_customScan
+from common.misc.helpers import get_analysis_workspace
+from common.misc.results import *
+
+
+def _fit_results():
+    return cabinetry.fit.FitResults(
+        np.asarray([1.2, 0.1]),
+        np.asarray([0.3, 0.9]),
+        ["SigXsecOverSM", "syst"],
+        np.asarray([[1.0, -0.2], [-0.2, 1.0]]),
+        12.5,
+        types=["normfactor", "normsys"],
+    )
+
+
+def _limit_results():
+    return cabinetry.fit.LimitResults(
+        1.0,
+        np.asarray([0.5, 0.7, 1.0, 1.4, 1.9]),
+        np.asarray([0.1, 0.05]),
+        np.asarray([[0.1] * 5, [0.05] * 5]),
+        np.asarray([0.5, 1.0]),
+        0.95,
+    )
+
+
+def test_results_round_trip(tmp_path):
+    fit_results = _fit_results()
+    limit_results = _limit_results()
+    write_results(
+        tmp_path,
+        {"Combined": fit_results, "analysis1": fit_results},
+        {"Combined": limit_results, "analysis1": None},
+    )
+    results = load_results(tmp_path)
+    assert list(results) == ["Combined", "analysis1"]
+    fit = results["Combined"]["fit"]
+    np.testing.assert_equal(fit["bestfit"], fit_results.bestfit)
+    np.testing.assert_equal(fit["corr_mat"], fit_results.corr_mat)
+    assert fit["labels"] == fit_results.labels
+    assert fit["types"] == fit_results.types
+    assert fit["best_twice_nll"] == fit_results.best_twice_nll
+    limit = results["Combined"]["limit"]
+    assert limit["observed_limit"] == limit_results.observed_limit
+    np.testing.assert_equal(limit["expected_CLs"], limit_results.expected_CLs)
+    assert results["analysis1"]["limit"] is None
+
+
+def test_results_are_loaded_without_pyhf(tmp_path):
+    write_results(tmp_path, {"Combined": _fit_results()}, {})
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from common.misc.results import load_results; "
+            f"load_results({str(tmp_path)!r}); "
+            "assert 'pyhf' not in sys.modules",
+        ],
+        check=True,
+    )
+
+
+def test_parameter_types_of_fit_are_written(tmp_path):
+    ws = get_analysis_workspace("analysis2", {"mass": "1300"}, None)
+    fit_results = ws.fit_results()
+    write_results(tmp_path, {"analysis2": fit_results}, {})
+    fit = load_results(tmp_path)["analysis2"]["fit"]
+    types = dict(zip(fit["labels"], fit["types"]))
+    assert len(types) == len(fit_results.labels)
+    assert types["SigXsecOverSM"] == "normfactor"
+    # parameters with several bins have a label and a type for each bin
+    assert types["staterror_SR_analysis2[1]"] == "staterror"
+
+
+def test_bisection_limit_results_are_written(tmp_path):
+    model = pyhf.simplemodels.uncorrelated_background(
+        [5.0, 8.0], [10.0, 12.0], [2.0, 3.0]
+    )
+    data = [12.0, 15.0] + model.config.auxdata
+    limit_results = limit_customScan(model, data, bracket=[0.1, 5.0])
+    write_results(tmp_path, {}, {"Combined": limit_results})
+    limit = load_results(tmp_path)["Combined"]["limit"]
+    n_pois = len(limit["poi_values"])
+    assert limit["observed_CLs"].shape == (n_pois,)
+    assert limit["expected_CLs"].shape == (n_pois, 5)
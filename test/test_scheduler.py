@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from common.misc.scheduler import *
+
+
+def test_resolve_adds_dependencies():
+    scheduler = Scheduler(
+        [
+            Stage("a", lambda: None),
+            Stage("b", lambda a: None, ("a",)),
+            Stage("c", lambda b: None, ("b",)),
+            Stage("d", lambda: None),
+        ]
+    )
+    assert scheduler.resolve(["c"]) == ["a", "b", "c"]
+    with pytest.raises(ValueError, match="not valid"):
+        scheduler.resolve(["e"])
+
+
+def test_cyclic_dependencies_raise():
+    scheduler = Scheduler(
+        [Stage("a", lambda b: None, ("b",)), Stage("b", lambda a: None, ("a",))]
+    )
+    with pytest.raises(ValueError, match="cyclic"):
+        scheduler.resolve()
+
+
+def test_run_passes_results_of_dependencies():
+    scheduler = Scheduler(
+        [
+            Stage("a", lambda: 2),
+            Stage("b", lambda: 3),
+            Stage("c", lambda a, b: a * b, ("a", "b")),
+        ]
+    )
+    assert scheduler.run(["c"]) == {"a": 2, "b": 3, "c": 6}
+
+
+def test_independent_stages_run_in_parallel():
+    # both stages have to run at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=10)
+    scheduler = Scheduler([Stage("a", barrier.wait), Stage("b", barrier.wait)])
+    scheduler.run()
+
+
+def test_stages_sharing_resource_do_not_overlap():
+    active = []
+    overlaps = []
+
+    def run():
+        active.append(1)
+        overlaps.append(len(active))
+        time.sleep(0.05)
+        active.pop()
+
+    scheduler = Scheduler(
+        [Stage(name, run, resources=("pyhf",)) for name in "abc"]
+    )
+    scheduler.run()
+    assert overlaps == [1, 1, 1]
+
+
+def test_failing_stage_stops_dependent_stages():
+    def fail():
+        raise RuntimeError("failed")
+
+    ran = []
+    scheduler = Scheduler(
+        [Stage("a", fail), Stage("b", lambda a: ran.append("b"), ("a",))]
+    )
+    with pytest.raises(RuntimeError, match="failed"):
+        scheduler.run()
+    assert ran == []
@@ -0,0 +1,43 @@
+import pyhf
+
+from benchmarks.suite import compare
+from benchmarks.synthetic import *
+from common.workspaces import CombinedWorkspace
+
+
+def test_synthetic_spec_has_requested_size():
+    spec = synthetic_spec(n_channels=2, n_bins=3, n_samples=2, n_modifiers=4)
+    model = pyhf.Workspace(spec).model()
+    assert model.config.channels == ["CR1", "SR"]
+    assert model.config.nmaindata == 2 * 3
+    assert model.config.samples == ["background0", "background1", "signal"]
+    # POI, lumi, normfactor, systematics and staterror of each bin
+    assert model.config.npars == 1 + 1 + 1 + 4 + 2 * 3
+    assert synthetic_spec(seed=1) == synthetic_spec(seed=1)
+    assert synthetic_spec(seed=1) != synthetic_spec(seed=2)
+
+
+def test_synthetic_analyses_are_combined(tmp_path):
+    filenames = write_synthetic_analyses(
+        tmp_path, 2, n_channels=1, n_bins=2, n_samples=1, n_modifiers=2
+    )
+    analysis_names = ["synthetic0", "synthetic1"]
+    combination = SyntheticCombination(
+        "synthetic", analysis_names=analysis_names, n_modifiers=2
+    )
+    workspaces = [
+        SyntheticAnalysis(name, {"filename": filename}).workspace(combination)
+        for name, filename in zip(analysis_names, filenames)
+    ]
+    combined_ws = CombinedWorkspace(name="Combined", workspaces=workspaces)
+    par_names = combined_ws.model.config.par_names
+    # systematics are correlated, the normfactors are not
+    assert "syst1" in par_names
+    assert "norm_bkg0_synthetic0" in par_names
+    assert "norm_bkg0_synthetic1" in par_names
+
+
+def test_compare_ignores_noise_of_fast_steps():
+    baseline = {"settings": {}, "timings": {"fit": 1.0, "ranking": 0.0002}}
+    results = {"settings": {}, "timings": {"fit": 2.0, "ranking": 0.0004}}
+    assert compare(results, baseline, 1.5, 0.01) == ["fit"]
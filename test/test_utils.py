@@ -1,3 +1,7 @@
+import argparse
+
+import pytest
+
 from common.misc.utils import *
 
 
@@ -11,3 +15,32 @@ def test_parse_parameters_returns_dict():
     args = parse_parameters(parameter_list=parameter_list)
     parameter_dict = {"a": "1", "f": "x"}
     assert args == parameter_dict
+
+
+def test_expand_parameter_values_range():
+    values = expand_parameter_values("1000:1300:100")
+    assert values == ["1000", "1100", "1200", "1300"]
+
+
+def test_expand_parameter_values_list():
+    values = expand_parameter_values("0.1,0.2")
+    assert values == ["0.1", "0.2"]
+
+
+def test_parse_parameter_scan_returns_all_points():
+    points = parse_parameter_scan(["mass=1000:1100:100", "f=x,y"])
+    assert points == [
+        {"mass": "1000", "f": "x"},
+        {"mass": "1000", "f": "y"},
+        {"mass": "1100", "f": "x"},
+        {"mass": "1100", "f": "y"},
+    ]
+
+
+def test_parse_stages():
+    assert parse_stages("fit,limits") == ["fit", "limits"]
+
+
+def test_parse_stages_unknown_stage_raises():
+    with pytest.raises(argparse.ArgumentTypeError, match="limts"):
+        parse_stages("fit,limts")
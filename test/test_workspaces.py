@@ -0,0 +1,84 @@
+import pyhf
+import pytest
+
+from common.misc.helpers import get_analysis_workspace, get_combination
+from common.workspaces import TransformationPlan
+from common.workspaces.combinedworkspace import combine_specs
+
+
+def test_model_is_cached():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    model = ws.model
+    assert ws.model is model
+    assert ws._data == ws._data
+    assert ws.model_builds == 1
+
+
+def test_model_cache_is_invalidated():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    model = ws.model
+    ws.rename_samples({"background1": "bkg1"})
+    assert ws.model is not model
+    assert "bkg1" in ws.model.config.samples
+    assert ws.model_builds == 2
+
+
+def test_transformation_plan_prunes_and_marks():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    plan = TransformationPlan().prune_modifiers({"background.*": ["normsys1"]})
+    plan.mark_modifiers("foo")
+    ws.apply(plan)
+    modifiers = {
+        modifier["name"]
+        for channel in ws.ws["channels"]
+        for sample in channel["samples"]
+        for modifier in sample["modifiers"]
+    }
+    assert "normsys1_analysis1_foo" not in modifiers
+    assert "normsys2_analysis1_foo" in modifiers
+    assert "SigXsecOverSM" in modifiers
+
+
+def test_transformation_plan_prunes_per_sample():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    # both patterns match normsys1 of background1, which is removed once
+    plan = TransformationPlan().prune_modifiers(
+        {"background1": ["normsys1"], "background[13]": ["normsys.*"]}
+    )
+    ws.apply(plan)
+    for channel in ws.ws["channels"]:
+        for sample in channel["samples"]:
+            types = [modifier["type"] for modifier in sample["modifiers"]]
+            if sample["name"] in ["background1", "background3"]:
+                assert "normsys" not in types
+            elif sample["name"] == "background2":
+                assert "normsys" in types
+
+
+def test_transformation_plan_raises_for_unknown_sample():
+    ws = get_analysis_workspace("analysis1", {"mass": "1300"}, None)
+    with pytest.raises(pyhf.exceptions.InvalidWorkspaceOperation):
+        ws.apply(TransformationPlan().rename_samples({"foo": "bar"}))
+
+
+def test_combine_specs_matches_pairwise_combination():
+    combination = get_combination("combination1")
+    specs = [
+        get_analysis_workspace(name, {"mass": "1300"}, combination).ws
+        for name in ["analysis1", "analysis2"]
+    ]
+    combined = pyhf.Workspace.combine(
+        specs[0], specs[1], join="outer", merge_channels=True
+    )
+    assert combine_specs(specs) == combined
+
+
+def test_combine_specs_raises_for_incompatible_measurements():
+    specs = [
+        get_analysis_workspace("analysis1", {"mass": "1300"}, None).ws,
+        get_analysis_workspace(
+            "analysis2", {"mass": "1300"}, get_combination("combination1")
+        ).ws,
+    ]
+    with pytest.raises(pyhf.exceptions.InvalidWorkspaceOperation):
+        combine_specs(specs)